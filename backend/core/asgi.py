@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up; serves /api/async/files/ and passes the rest to Django
+from files.asgi import FileTransferApp  # noqa: E402
+
+application = FileTransferApp(django_application)
@@ -79,10 +79,31 @@ WSGI_APPLICATION = "core.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# 'production' tunes SQLite for concurrent uploads (see core/sqlite/base.py): WAL so
+# reads never block the writer, write transactions that take the lock up front and
+# wait for it, and a larger page cache and mmap. 'default' is Django's stock setup.
+SQLITE_PROFILES = {
+  'default': {},
+  'production': {
+    'transaction_mode': 'IMMEDIATE',
+    'pragmas': {
+      'journal_mode': 'WAL',
+      # Durable at each checkpoint rather than each commit; safe from corruption in WAL mode
+      'synchronous': 'NORMAL',
+      'busy_timeout': 30000,
+      'mmap_size': 256 * 1024 * 1024,
+      # Negative: KiB rather than pages
+      'cache_size': -64 * 1024,
+      'temp_store': 'MEMORY',
+    },
+  },
+}
+
 DATABASES = {
   "default": {
-    "ENGINE": "django.db.backends.sqlite3",
-    "NAME": os.path.join(BASE_DIR, 'data', 'db.sqlite3'),
+    "ENGINE": "core.sqlite",
+    "NAME": os.environ.get('DJANGO_DB_PATH', os.path.join(BASE_DIR, 'data', 'db.sqlite3')),
+    "OPTIONS": SQLITE_PROFILES[os.environ.get('DJANGO_DB_PROFILE', 'production')],
   }
 }
 
@@ -129,6 +150,98 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Hash algorithm for new content (sha256 or blake2b) and the size of the
+# thread pool hashing runs on; see `manage.py rehash_content` to convert
+FILES_HASH_ALGORITHM = os.environ.get('FILES_HASH_ALGORITHM', 'sha256')
+FILES_HASH_WORKERS = int(os.environ.get('FILES_HASH_WORKERS', os.cpu_count() or 4))
+
+# Directory levels (two hex characters of the hash each) blobs are sharded into
+# under content/ and chunks/; `manage.py reshard_content` moves existing blobs
+FILES_CONTENT_SHARD_DEPTH = int(os.environ.get('FILES_CONTENT_SHARD_DEPTH', 2))
+
+# Content-defined chunking: new content at least FILES_CDC_MIN_FILE_SIZE bytes
+# is split into chunks that are deduplicated across files
+FILES_CDC_ENABLED = os.environ.get('FILES_CDC_ENABLED', 'False') == 'True'
+FILES_CDC_MIN_FILE_SIZE = 1024 * 1024
+FILES_CDC_MIN_CHUNK_SIZE = 16 * 1024
+FILES_CDC_AVG_CHUNK_SIZE = 64 * 1024
+FILES_CDC_MAX_CHUNK_SIZE = 256 * 1024
+
+# Compression of new single-file content: codec per MIME type prefix ('' matches
+# any type not listed); already-compressed formats are always stored raw
+FILES_COMPRESSION_ENABLED = os.environ.get('FILES_COMPRESSION_ENABLED', 'False') == 'True'
+FILES_COMPRESSION_MIN_SIZE = 4 * 1024
+# Keep the raw bytes unless compression saves at least this fraction
+FILES_COMPRESSION_MIN_SAVINGS = 0.1
+FILES_COMPRESSION_CODECS = {
+    'text/': 'gzip',
+    'application/json': 'gzip',
+    'application/xml': 'gzip',
+    'application/javascript': 'gzip',
+    '': 'gzip',
+}
+
+# Delta storage: new single-file content between the size bounds that is similar to
+# stored content (found through a MinHash index) is stored as a delta against it,
+# if that saves at least FILES_DELTA_MIN_SAVINGS of its size; reads apply at most
+# FILES_DELTA_MAX_CHAIN_DEPTH deltas. The uploads of one request are scanned for a
+# base up to FILES_DELTA_MAX_REQUEST_BYTES between them
+FILES_DELTA_ENABLED = os.environ.get('FILES_DELTA_ENABLED', 'False') == 'True'
+FILES_DELTA_MIN_FILE_SIZE = 16 * 1024
+FILES_DELTA_MAX_FILE_SIZE = 16 * 1024 * 1024
+FILES_DELTA_MIN_SAVINGS = 0.5
+FILES_DELTA_MAX_REQUEST_BYTES = 64 * 1024 * 1024
+FILES_DELTA_MAX_CHAIN_DEPTH = int(os.environ.get('FILES_DELTA_MAX_CHAIN_DEPTH', 4))
+
+# Pack files: new content of at most FILES_PACK_MAX_BLOB_SIZE bytes is appended
+# to shared packs of about FILES_PACK_TARGET_SIZE instead of a file of its own;
+# `manage.py compact_packs` reclaims the space of released content
+FILES_PACK_ENABLED = os.environ.get('FILES_PACK_ENABLED', 'False') == 'True'
+FILES_PACK_MAX_BLOB_SIZE = 4 * 1024
+FILES_PACK_TARGET_SIZE = 64 * 1024 * 1024
+
+# Presence filter: uploads skip the content lookup for hashes a shared Bloom
+# filter rules out; `manage.py rebuild_presence_filter` builds the filter file
+FILES_PRESENCE_FILTER_ENABLED = os.environ.get('FILES_PRESENCE_FILTER_ENABLED', 'False') == 'True'
+FILES_PRESENCE_FILTER_PATH = os.environ.get(
+    'FILES_PRESENCE_FILTER_PATH', os.path.join(BASE_DIR, 'data', 'presence.bloom')
+)
+FILES_PRESENCE_FILTER_CAPACITY = int(os.environ.get('FILES_PRESENCE_FILTER_CAPACITY', 10_000_000))
+FILES_PRESENCE_FILTER_FP_RATE = float(os.environ.get('FILES_PRESENCE_FILTER_FP_RATE', 0.01))
+
+# Hand raw blob downloads to the front-end server: 'nginx' (X-Accel-Redirect to
+# FILES_SENDFILE_URL_PREFIX, an internal location aliased to MEDIA_ROOT) or
+# 'apache' (X-Sendfile with the absolute path); unset serves them from Django
+FILES_SENDFILE_BACKEND = os.environ.get('FILES_SENDFILE_BACKEND') or None
+FILES_SENDFILE_URL_PREFIX = os.environ.get('FILES_SENDFILE_URL_PREFIX', '/protected-media/')
+
+# Per-worker memory cache for downloads of small content referenced by at least
+# FILES_HOT_CACHE_MIN_REFERENCES files; FILES_HOT_CACHE_SIZE bytes (0 disables)
+FILES_HOT_CACHE_SIZE = int(os.environ.get('FILES_HOT_CACHE_SIZE', 0))
+FILES_HOT_CACHE_MAX_BLOB_SIZE = 256 * 1024
+FILES_HOT_CACHE_MIN_REFERENCES = int(os.environ.get('FILES_HOT_CACHE_MIN_REFERENCES', 2))
+
+# Seconds a cached /api/summaries/ response is kept; changes invalidate it at once
+# in every worker through a version row in the database (see files/summary_cache.py)
+FILES_SUMMARY_CACHE_TTL = int(os.environ.get('FILES_SUMMARY_CACHE_TTL', 30))
+
+# Queue deduplication events and summary updates for `manage.py process_events`
+# instead of applying them during the upload request
+FILES_EVENT_QUEUE_ENABLED = os.environ.get('FILES_EVENT_QUEUE_ENABLED', 'False') == 'True'
+# Seconds before a job claimed by a worker that died can be claimed again
+FILES_EVENT_JOB_LEASE = 300
+FILES_EVENT_JOB_MAX_ATTEMPTS = 5
+
+# Files per page of GET /api/files/ (clients may ask for up to the maximum with ?page_size=)
+FILES_LIST_PAGE_SIZE = 100
+FILES_LIST_MAX_PAGE_SIZE = 1000
+
+# Upper bound on files per request, e.g. for /api/files/batch/
+DATA_UPLOAD_MAX_NUMBER_FILES = 1000
+
+# Concurrent ORM calls allowed from the async transfer endpoints (files/asgi.py)
+FILES_ASYNC_DB_CONCURRENCY = int(os.environ.get('FILES_ASYNC_DB_CONCURRENCY', 8))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -0,0 +1,32 @@
+"""
+SQLite backend for concurrent writers.
+
+Django's sqlite3 backend plus two OPTIONS:
+
+- ``pragmas``: PRAGMA name to value, applied to every new connection
+- ``transaction_mode``: e.g. 'IMMEDIATE' to open atomic() blocks with
+  BEGIN IMMEDIATE. A deferred BEGIN takes the write lock at its first write,
+  and if another connection wrote in the meantime SQLite fails it at once
+  with "database is locked" instead of waiting for busy_timeout. Taking the
+  lock up front makes concurrent writers queue instead.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # Ours, not sqlite3.connect()'s
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
@@ -1,13 +1,17 @@
 from django.contrib import admin
-from .models import FileContent, File, DeduplicationEvent, StorageSavingsSummary
+from .models import FileContent, File, DeduplicationEvent, StorageSavingsSummary, ChunkedUpload, ContentChunk
+from .search import search_filenames
 
 
 @admin.register(FileContent)
 class FileContentAdmin(admin.ModelAdmin):
-    list_display = ['content_hash_short', 'size_mb', 'reference_count', 'created_at']
+    list_display = ['content_hash_short', 'size_mb', 'reference_count', 'storage_format', 'codec', 'created_at']
     search_fields = ['content_hash']
-    list_filter = ['created_at']
-    readonly_fields = ['content_hash', 'size', 'reference_count', 'created_at']
+    list_filter = ['storage_format', 'codec', 'created_at']
+    readonly_fields = [
+        'content_hash', 'size', 'reference_count', 'storage_format', 'chunk_bytes_saved',
+        'codec', 'stored_size', 'pack', 'pack_offset', 'delta_base', 'delta_depth', 'created_at'
+    ]
 
     def content_hash_short(self, obj):
         return f"{obj.content_hash[:16]}..."
@@ -21,9 +25,15 @@ class FileContentAdmin(admin.ModelAdmin):
 @admin.register(File)
 class FileAdmin(admin.ModelAdmin):
     list_display = ['original_filename', 'file_type', 'size_display', 'uploaded_at']
-    search_fields = ['original_filename', 'file_type']
+    search_fields = ['original_filename']
     list_filter = ['file_type', 'uploaded_at']
-    readonly_fields = ['id', 'uploaded_at']
+    readonly_fields = ['id', 'size', 'uploaded_at']
+
+    def get_search_results(self, request, queryset, search_term):
+        """Search filenames through the trigram index instead of a LIKE scan"""
+        if not search_term:
+            return queryset, False
+        return search_filenames(queryset, search_term), False
 
     def size_display(self, obj):
         return f"{obj.size / (1024 * 1024):.2f} MB"
@@ -60,6 +70,9 @@ class StorageSavingsSummaryAdmin(admin.ModelAdmin):
         'period_end',
         'total_duplicates_detected',
         'total_storage_saved_bytes',
+        'total_chunk_bytes_saved',
+        'total_compression_bytes_saved',
+        'total_delta_bytes_saved',
         'storage_saved_mb',
         'storage_saved_gb',
         'unique_files_shared',
@@ -90,3 +103,17 @@ class StorageSavingsSummaryAdmin(admin.ModelAdmin):
             summary.recalculate()
         self.message_user(request, f"Recalculated {queryset.count()} summaries.")
     recalculate_summaries.short_description = "Recalculate selected summaries"
+
+
+@admin.register(ChunkedUpload)
+class ChunkedUploadAdmin(admin.ModelAdmin):
+    list_display = ['upload_id', 'original_filename', 'received_chunks', 'total_chunks', 'updated_at']
+    search_fields = ['upload_id', 'original_filename']
+    readonly_fields = ['upload_id', 'received_chunks', 'received_bytes', 'created_at', 'updated_at']
+
+
+@admin.register(ContentChunk)
+class ContentChunkAdmin(admin.ModelAdmin):
+    list_display = ['chunk_hash', 'size', 'reference_count', 'created_at']
+    search_fields = ['chunk_hash']
+    readonly_fields = ['chunk_hash', 'file', 'size', 'reference_count', 'created_at']
@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class FilesConfig(AppConfig):
   default_auto_field = "django.db.models.BigAutoField"
   name = "files"
+
+  def ready(self):
+    # Table rebuilds in later migrations drop the filename index triggers
+    post_migrate.connect(_reinstall_filename_index, sender=self)
+
+
+def _reinstall_filename_index(using, **kwargs):
+  from django.db import connections
+  from .search import ensure_filename_index
+
+  ensure_filename_index(connections[using])
@@ -0,0 +1,372 @@
+"""
+Async upload, chunk-upload and download endpoints served directly over ASGI.
+
+Django's ASGI handler buffers the whole request body before a view runs, and
+DRF views are synchronous, so they are bypassed for the transfer endpoints
+under ``/api/async/``. Request bodies are streamed straight into the content
+store as they arrive: each piece is hashed and written on an I/O thread
+while the event loop keeps serving other connections, so a slow client costs
+a coroutine rather than a worker. ORM work runs on worker threads behind a
+semaphore, so a burst of completing uploads cannot open more database
+connections than FILES_ASYNC_DB_CONCURRENCY.
+
+Bypassing Django also bypasses its middleware, so the request checks and
+response headers the endpoints need from it are applied here: the
+ALLOWED_HOSTS check, and EDGE_MIDDLEWARE (CORS for the frontend's origin,
+the security headers) run over a body-less copy of the request.
+
+Endpoints (query parameters in brackets):
+
+    POST /api/async/files/                 [filename]  body: raw file bytes
+    PUT  /api/async/files/upload-chunk/    [upload_id, chunk_index, total_chunks,
+                                            filename, file_type]  body: raw chunk
+    GET  /api/async/files/<uuid>/download/   (If-None-Match answered with 304)
+"""
+import asyncio
+import io
+import json
+import re
+import tempfile
+import uuid
+from urllib.parse import parse_qs, quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import DisallowedHost
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+ASYNC_PREFIX = '/api/async/files/'
+DOWNLOAD_PATH = re.compile(r'^/api/async/files/(?P<pk>[0-9a-f-]{36})/download/$')
+DOWNLOAD_BLOCK_SIZE = 256 * 1024
+
+# Middleware from settings.MIDDLEWARE that the endpoints run as Django's views
+# would: they may answer a request themselves (a CORS preflight, an HTTPS
+# redirect), and the headers they add are added to the endpoint's response
+EDGE_MIDDLEWARE = (
+    'django.middleware.security.SecurityMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+)
+
+_db_semaphore = None
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+def _db_slots():
+    global _db_semaphore
+    if _db_semaphore is None:
+        _db_semaphore = asyncio.Semaphore(settings.FILES_ASYNC_DB_CONCURRENCY)
+    return _db_semaphore
+
+
+async def run_db(func, *args, **kwargs):
+    """Run ORM work on a worker thread, bounded by FILES_ASYNC_DB_CONCURRENCY."""
+    def _call():
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    async with _db_slots():
+        return await sync_to_async(_call, thread_sensitive=False)()
+
+
+async def run_io(func, *args):
+    """Run blocking file I/O or hashing on the event loop's executor."""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+class FileTransferApp:
+    """
+    ASGI application serving the async transfer endpoints.
+
+    Any other request is passed through to ``django_app``.
+    """
+
+    def __init__(self, django_app):
+        self.django_app = django_app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith(ASYNC_PREFIX):
+            return await self.django_app(scope, receive, send)
+
+        try:
+            response, extra_headers = run_edge_middleware(scope)
+        except DisallowedHost:
+            return await self.send_json(send, 400, {'error': 'Invalid host'})
+        if response is not None:
+            return await self.send_response(send, response)
+
+        async def send_with_headers(message):
+            if message['type'] == 'http.response.start':
+                message = {**message, 'headers': list(message.get('headers', [])) + extra_headers}
+            await send(message)
+
+        await self.handle(scope, receive, send_with_headers)
+
+    async def handle(self, scope, receive, send):
+        try:
+            await self.dispatch(scope, receive, send)
+        except HttpError as exc:
+            await self.send_json(send, exc.status, {'error': exc.message})
+        except ClientDisconnected:
+            pass
+
+    async def dispatch(self, scope, receive, send):
+        path, method = scope['path'], scope['method']
+        params = {key: values[-1] for key, values in parse_qs(scope['query_string'].decode()).items()}
+
+        if path == ASYNC_PREFIX and method == 'POST':
+            return await self.upload(scope, receive, send, params)
+        if path == ASYNC_PREFIX + 'upload-chunk/' and method in ('POST', 'PUT'):
+            return await self.upload_chunk(scope, receive, send, params)
+        match = DOWNLOAD_PATH.match(path)
+        if match and method == 'GET':
+            return await self.download(scope, send, match['pk'])
+        raise HttpError(404, 'Not found')
+
+    async def receive_body(self, receive, destination, hasher=None):
+        """Stream the request body into destination; return the byte count."""
+        def _consume(data):
+            if hasher is not None:
+                hasher.update(data)
+            destination.write(data)
+
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise ClientDisconnected()
+            data = message.get('body', b'')
+            if data:
+                await run_io(_consume, data)
+                size += len(data)
+            if not message.get('more_body', False):
+                return size
+
+    async def upload(self, scope, receive, send, params):
+        from .serializers import FileSerializer
+        from .services import store_upload
+        from .upload_handlers import HashedTemporaryUploadedFile
+        from .utils import hash_algorithm, new_hasher
+
+        filename = params.get('filename')
+        if not filename:
+            raise HttpError(400, 'No filename provided')
+        file_type = _header(scope, b'content-type') or 'application/octet-stream'
+
+        uploaded = await run_io(HashedTemporaryUploadedFile, filename, file_type, 0, None)
+        try:
+            # Already on an I/O thread, so hash inline rather than via the hashing pool
+            algorithm = hash_algorithm()
+            hasher = new_hasher(algorithm)
+            uploaded.size = await self.receive_body(receive, uploaded, hasher)
+            uploaded.content_hash = hasher.hexdigest()
+            uploaded.hash_algorithm = algorithm
+            await run_io(uploaded.seek, 0)
+
+            def _store():
+                file_record, created = store_upload(uploaded, uploaded.content_hash, filename, file_type)
+                data = FileSerializer(file_record).data
+                data['is_duplicate'] = not created
+                return data
+
+            data = await run_db(_store)
+        finally:
+            await run_io(uploaded.close)
+        await self.send_json(send, 201, data)
+
+    async def upload_chunk(self, scope, receive, send, params):
+        from . import chunk_store
+        from .models import ChunkedUpload
+        from .serializers import FileSerializer
+        from .services import store_upload
+        from .utils import hash_algorithm
+
+        upload_id = params.get('upload_id')
+        try:
+            chunk_index = int(params.get('chunk_index', 0))
+            total_chunks = int(params.get('total_chunks', 1))
+        except ValueError:
+            raise HttpError(400, 'chunk_index and total_chunks must be integers')
+        if not chunk_store.is_valid_upload_id(upload_id):
+            raise HttpError(400, 'Invalid upload_id')
+        if not 0 <= chunk_index < total_chunks:
+            raise HttpError(400, 'chunk_index out of range')
+
+        chunk = await run_io(tempfile.SpooledTemporaryFile, chunk_store.COPY_BUFFER_SIZE)
+        try:
+            await self.receive_body(receive, chunk)
+
+            def _receive():
+                upload, _ = ChunkedUpload.objects.get_or_create(
+                    upload_id=upload_id,
+                    defaults={
+                        'original_filename': params.get('filename') or upload_id,
+                        'file_type': params.get('file_type', 'application/octet-stream'),
+                        'total_chunks': total_chunks,
+                        'hash_algorithm': hash_algorithm(),
+                    }
+                )
+                chunk_store.receive_chunk(upload, chunk_index, chunk)
+
+                # Only one request may assemble the upload once every chunk is in
+                if not (upload.next_chunk_index >= upload.total_chunks and ChunkedUpload.objects.filter(
+                    pk=upload_id, is_assembling=False
+                ).update(is_assembling=True)):
+                    return 200, {
+                        'complete': False,
+                        'received_chunks': upload.received_chunks,
+                        'total_chunks': upload.total_chunks,
+                    }
+
+                try:
+                    with chunk_store.finish(upload) as assembled:
+                        file_record, created = store_upload(
+                            assembled,
+                            assembled.content_hash,
+                            filename=upload.original_filename,
+                            file_type=upload.file_type
+                        )
+                except Exception:
+                    # Let a retried chunk attempt the assembly again
+                    ChunkedUpload.objects.filter(pk=upload_id).update(is_assembling=False)
+                    raise
+                chunk_store.discard(upload_id)
+                upload.delete()
+                return 201, {
+                    'complete': True,
+                    'is_duplicate': not created,
+                    'file': FileSerializer(file_record).data,
+                }
+
+            status, data = await run_db(_receive)
+        finally:
+            await run_io(chunk.close)
+        await self.send_json(send, status, data)
+
+    async def download(self, scope, send, pk):
+        from django.utils.http import parse_etags
+
+        from . import hot_cache
+        from .downloads import CACHE_CONTROL, content_etag
+        from .models import File
+
+        file_record = await run_db(
+            lambda: File.objects.select_related('file_content').filter(pk=uuid.UUID(pk)).first()
+        )
+        if file_record is None:
+            raise HttpError(404, 'Not found')
+
+        file_content = file_record.file_content
+        etag = content_etag(file_content)
+        cache_headers = [(b'etag', etag.encode()), (b'cache-control', CACHE_CONTROL.encode())]
+        # Content never changes under its hash, so a matching ETag needs no read at all
+        if_none_match = _header(scope, b'if-none-match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+            await send({'type': 'http.response.start', 'status': 304, 'headers': cache_headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        # Chunked content queries its manifest while reading, packed content if its pack moved,
+        # and delta content loads its base
+        run_read = run_db if file_content.is_chunked or file_content.is_packed or file_content.is_delta else run_io
+        stream = await run_read(hot_cache.open_stream, file_content)
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': cache_headers + [
+                    (b'content-type', file_record.file_type.encode('latin-1', 'replace')),
+                    (b'content-length', str(file_record.file_content.size).encode()),
+                    (
+                        b'content-disposition',
+                        f"attachment; filename*=utf-8''{quote(file_record.original_filename)}".encode(),
+                    ),
+                ],
+            })
+            while True:
+                data = await run_read(stream.read, DOWNLOAD_BLOCK_SIZE)
+                await send({'type': 'http.response.body', 'body': data, 'more_body': bool(data)})
+                if not data:
+                    break
+        finally:
+            await run_io(stream.close)
+
+    async def send_response(self, send, response):
+        """Send a Django HttpResponse."""
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': _encode_headers(response.items()),
+        })
+        await send({'type': 'http.response.body', 'body': response.content})
+
+    async def send_json(self, send, status, data):
+        body = json.dumps(data).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def run_edge_middleware(scope):
+    """
+    Check a transfer request's host and run EDGE_MIDDLEWARE over it.
+
+    Returns:
+        Tuple of (response, headers): the response a middleware answered with
+        instead of passing the request on, or None and the headers to add to
+        the endpoint's response
+
+    Raises:
+        DisallowedHost: The Host header is not in ALLOWED_HOSTS
+    """
+    # The body stays unread: nothing in EDGE_MIDDLEWARE looks at it
+    request = ASGIRequest(scope, io.BytesIO())
+    request.get_host()
+
+    def passed_on(request):
+        response = HttpResponse()
+        response.passed_on = True
+        return response
+
+    handler = passed_on
+    for path in reversed(EDGE_MIDDLEWARE):
+        if path in settings.MIDDLEWARE:
+            handler = import_string(path)(handler)
+    response = handler(request)
+    if not getattr(response, 'passed_on', False):
+        return response, []
+    # The endpoint sets its own content headers
+    return None, _encode_headers(
+        (name, value) for name, value in response.items() if name.lower() not in ('content-type', 'content-length')
+    )
+
+
+def _encode_headers(headers):
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+
+def _header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
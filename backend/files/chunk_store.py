@@ -0,0 +1,241 @@
+"""
+Disk staging for chunked uploads.
+
+Each upload gets a directory under the content store's temporary directory.
+Chunks that arrive in order are appended straight to an ``assembled`` file
+and fed to a running hash, so when the last chunk lands the file is
+already complete and usually hashed. Chunks that arrive early are parked as
+``<index>.part`` files and drained into the assembled file once the gap
+before them is filled. Memory use is bounded by the copy buffer size rather
+than the upload size.
+"""
+import fcntl
+import os
+import re
+import shutil
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models import F
+
+from .models import ChunkedUpload
+from .storage import content_temp_dir
+from .utils import new_hasher
+
+# Upload IDs become directory names, so only allow a conservative alphabet
+UPLOAD_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,100}$')
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Running hashers for uploads this process has been appending to, keyed by
+# upload ID. hashlib state cannot be stored with the upload, so when a chunk
+# lands on a worker without it the upload is hashed once when it is finished
+# instead (ChunkedUpload.hash_deferred); re-reading the assembled prefix for
+# every such chunk would cost O(n^2) over a many-chunk upload.
+MAX_CACHED_HASHERS = 256
+_hashers = OrderedDict()
+
+
+class AssembledUpload(UploadedFile):
+    """A fully assembled chunked upload, still in the staging directory."""
+
+    def __init__(self, path, name, content_type, size, content_hash, hash_algorithm):
+        super().__init__(open(path, 'rb'), name, content_type, size)
+        self.content_hash = content_hash
+        self.hash_algorithm = hash_algorithm
+        self.in_content_store = content_temp_dir() is not None
+        self._path = path
+
+    def temporary_file_path(self):
+        return self._path
+
+
+def is_valid_upload_id(upload_id):
+    """Check that a client-supplied upload ID is safe to use as a directory name."""
+    return bool(upload_id) and UPLOAD_ID_PATTERN.match(upload_id) is not None
+
+
+def staging_root():
+    """Return the directory holding per-upload chunk directories."""
+    root = content_temp_dir() or settings.FILE_UPLOAD_TEMP_DIR or tempfile.gettempdir()
+    return os.path.join(root, 'chunks')
+
+
+def upload_dir(upload_id):
+    return os.path.join(staging_root(), upload_id)
+
+
+def chunk_path(upload_id, chunk_index):
+    return os.path.join(upload_dir(upload_id), f'{chunk_index}.part')
+
+
+def assembled_path(upload_id):
+    return os.path.join(upload_dir(upload_id), 'assembled')
+
+
+@contextmanager
+def _upload_lock(upload_id):
+    """Serialize appends to one upload across threads and worker processes."""
+    os.makedirs(upload_dir(upload_id), exist_ok=True)
+    with open(os.path.join(upload_dir(upload_id), 'lock'), 'wb') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _resume_hasher(upload):
+    """
+    Return a hasher holding the state for the first hashed_bytes of the upload.
+
+    Returns None if hashing is deferred to finish, or this process does not
+    hold the state.
+    """
+    if upload.hash_deferred:
+        return None
+    cached = _hashers.pop(upload.upload_id, None)
+    if cached is not None and cached[0] == upload.hashed_bytes:
+        return cached[1]
+    if not upload.hashed_bytes:
+        return new_hasher(upload.hash_algorithm)
+    return None
+
+
+def _hash_assembled(upload):
+    """Hash the whole assembled file, for uploads whose running hash was lost."""
+    hasher = new_hasher(upload.hash_algorithm)
+    with open(assembled_path(upload.upload_id), 'rb') as assembled:
+        remaining = upload.hashed_bytes
+        while remaining:
+            data = assembled.read(min(COPY_BUFFER_SIZE, remaining))
+            if not data:
+                break
+            hasher.update(data)
+            remaining -= len(data)
+    return hasher
+
+
+def _park_hasher(upload_id, hashed_bytes, hasher):
+    _hashers[upload_id] = (hashed_bytes, hasher)
+    while len(_hashers) > MAX_CACHED_HASHERS:
+        _hashers.popitem(last=False)
+
+
+def _append(source, destination, hasher):
+    """Copy source to destination through the hasher, if any; return bytes copied."""
+    copied = 0
+    while True:
+        data = source.read(COPY_BUFFER_SIZE)
+        if not data:
+            return copied
+        if hasher is not None:
+            hasher.update(data)
+        destination.write(data)
+        copied += len(data)
+
+
+def _write_part(upload_id, chunk_index, chunk_file):
+    """Park an out-of-order chunk in its part file; return (size, is_new)."""
+    path = chunk_path(upload_id, chunk_index)
+    is_new = not os.path.exists(path)
+
+    # Write under a temporary name so a retried chunk never leaves a half-written part
+    partial_path = f'{path}.{os.getpid()}.tmp'
+    with open(partial_path, 'wb') as part:
+        shutil.copyfileobj(chunk_file, part, COPY_BUFFER_SIZE)
+        size = part.tell()
+    os.replace(partial_path, path)
+    return size, is_new
+
+
+def receive_chunk(upload, chunk_index, chunk_file):
+    """
+    Stage one chunk of an upload.
+
+    If chunk_index is the next chunk the assembled file is waiting for, it is
+    appended and hashed immediately, followed by any parked chunks that now
+    follow on. If another process holds the running hash, the upload's
+    hashing is deferred to finish. Otherwise it is parked until the gap before it is filled.
+    The upload's counters are updated in the database and on ``upload``.
+
+    Returns:
+        Bool: False if the chunk had already been received
+    """
+    chunk_file.seek(0)
+    with _upload_lock(upload.upload_id):
+        upload.refresh_from_db()
+
+        if chunk_index < upload.next_chunk_index:
+            # Retried chunk that is already part of the assembled file
+            return False
+
+        if chunk_index > upload.next_chunk_index:
+            size, is_new = _write_part(upload.upload_id, chunk_index, chunk_file)
+            if is_new:
+                ChunkedUpload.objects.filter(pk=upload.upload_id).update(
+                    received_chunks=F('received_chunks') + 1,
+                    received_bytes=F('received_bytes') + size
+                )
+            upload.refresh_from_db()
+            return is_new
+
+        hasher = _resume_hasher(upload)
+        next_index = chunk_index + 1
+        drained = []
+        with open(assembled_path(upload.upload_id), 'ab') as assembled:
+            # Drop bytes from an append that was never recorded (e.g. a crashed request)
+            assembled.truncate(upload.hashed_bytes)
+            size = _append(chunk_file, assembled, hasher)
+            appended = size
+            while os.path.exists(chunk_path(upload.upload_id, next_index)):
+                with open(chunk_path(upload.upload_id, next_index), 'rb') as part:
+                    appended += _append(part, assembled, hasher)
+                drained.append(chunk_path(upload.upload_id, next_index))
+                next_index += 1
+
+        ChunkedUpload.objects.filter(pk=upload.upload_id).update(
+            next_chunk_index=next_index,
+            hashed_bytes=F('hashed_bytes') + appended,
+            received_chunks=F('received_chunks') + 1,
+            received_bytes=F('received_bytes') + size,
+            hash_deferred=hasher is None,
+        )
+        # Parts are only removed once the database records them as appended
+        for path in drained:
+            os.remove(path)
+
+        upload.refresh_from_db()
+        if hasher is not None:
+            _park_hasher(upload.upload_id, upload.hashed_bytes, hasher)
+        return True
+
+
+def finish(upload):
+    """
+    Return the assembled upload once every chunk has been appended.
+
+    The hash was usually computed as chunks were appended, so this only
+    finalizes it; uploads whose hashing was deferred are hashed in one pass.
+
+    Returns:
+        AssembledUpload positioned at the start, with content_hash set
+    """
+    hasher = _resume_hasher(upload) or _hash_assembled(upload)
+    return AssembledUpload(
+        assembled_path(upload.upload_id),
+        upload.original_filename,
+        upload.file_type,
+        upload.hashed_bytes,
+        hasher.hexdigest(),
+        upload.hash_algorithm,
+    )
+
+
+def discard(upload_id):
+    """Remove every staged chunk of an upload."""
+    _hashers.pop(upload_id, None)
+    shutil.rmtree(upload_dir(upload_id), ignore_errors=True)
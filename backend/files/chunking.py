@@ -0,0 +1,358 @@
+"""
+Content-defined chunking for sub-file deduplication.
+
+Content is split with FastCDC (the compiled ``fastcdc`` package): a boundary
+is declared where the masked bits of a rolling gear hash are zero, using a
+stricter mask before the target average size and a looser one after it
+(normalized chunking), so boundaries follow the content and survive
+insertions earlier in the file.
+Chunks are stored once under ``chunks/<shards>/<chunk_hash>`` and a chunked
+FileContent is a manifest of ContentChunkRef rows.
+"""
+import hashlib
+import io
+import os
+import tempfile
+from collections import Counter, deque
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Subquery, Value, When
+from fastcdc import fastcdc
+
+from .storage import content_temp_dir, layout_names, open_blob, touch_blob
+
+READ_SIZE = 4 * 1024 * 1024
+LOOKUP_BATCH_SIZE = 500
+
+
+def should_chunk(size):
+    """Check whether new content of this size is stored in chunked mode."""
+    return settings.FILES_CDC_ENABLED and size >= settings.FILES_CDC_MIN_FILE_SIZE
+
+
+def iter_chunks(file_obj, min_size=None, avg_size=None, max_size=None):
+    """
+    Yield the content-defined chunks of a file as bytes.
+
+    Reads the file in READ_SIZE blocks, so memory stays bounded by the
+    read size plus one maximum-size chunk. Boundaries are found by fastcdc's
+    compiled gear hash, which runs at several hundred MB/s.
+    """
+    min_size = min_size or settings.FILES_CDC_MIN_CHUNK_SIZE
+    avg_size = avg_size or settings.FILES_CDC_AVG_CHUNK_SIZE
+    max_size = max_size or settings.FILES_CDC_MAX_CHUNK_SIZE
+
+    buffer = b''
+    eof = False
+    while not eof:
+        data = file_obj.read(READ_SIZE)
+        eof = not data
+        buffer += data
+        view = memoryview(buffer)
+        consumed = 0
+        for chunk in fastcdc(view, min_size, avg_size, max_size):
+            # A boundary depends on at most max_size bytes after the chunk
+            # start, so only chunks that could not reach past the buffer are final
+            if not eof and chunk.offset + max_size > len(buffer):
+                break
+            yield bytes(view[chunk.offset:chunk.offset + chunk.length])
+            consumed = chunk.offset + chunk.length
+        view.release()
+        buffer = buffer[consumed:]
+
+
+def write_chunks(uploaded_file):
+    """
+    Split an upload into chunks and write the chunks not yet in the store.
+
+    Nothing is written to the database; pass the result to save_manifest once
+    the FileContent row exists.
+
+    Returns:
+        Tuple of (manifest, bytes_saved): manifest is a list of
+        (chunk_hash, size) in file order and bytes_saved is the size of the
+        chunks that were already stored
+    """
+    from .models import ContentChunk
+
+    manifest = []
+    bytes_saved = 0
+    known = set()
+    pending = []
+    pending_bytes = 0
+
+    def flush():
+        nonlocal bytes_saved, pending_bytes
+        stored = ContentChunk.objects.in_bulk([chunk_hash for chunk_hash, _ in pending])
+        for chunk_hash, data in pending:
+            if chunk_hash in stored or chunk_hash in known:
+                bytes_saved += len(data)
+            else:
+                _write_chunk_blob(ContentChunk(chunk_hash=chunk_hash, size=len(data)), data)
+            known.add(chunk_hash)
+        pending.clear()
+        pending_bytes = 0
+
+    uploaded_file.seek(0)
+    for data in iter_chunks(uploaded_file):
+        chunk_hash = hashlib.sha256(data).hexdigest()
+        manifest.append((chunk_hash, len(data)))
+        pending.append((chunk_hash, data))
+        pending_bytes += len(data)
+        if pending_bytes >= READ_SIZE or len(pending) >= LOOKUP_BATCH_SIZE:
+            flush()
+    flush()
+    return manifest, bytes_saved
+
+
+def _write_chunk_blob(chunk, data):
+    """Atomically write a chunk blob to its hash path."""
+    storage = chunk.file.storage
+    name = chunk.file.field.generate_filename(chunk, chunk.chunk_hash)
+    temp_dir = content_temp_dir(storage)
+    if temp_dir is None:
+        if not storage.exists(name):
+            storage.save(name, ContentFile(data))
+        return
+    destination = storage.path(name)
+    if os.path.exists(destination):
+        touch_blob(destination)
+        return
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=temp_dir, delete=False) as temp:
+        temp.write(data)
+    os.replace(temp.name, destination)
+    if storage.file_permissions_mode is not None:
+        os.chmod(destination, storage.file_permissions_mode)
+
+
+def save_manifest(file_content, manifest, source=None):
+    """
+    Record the chunk references of a chunked FileContent.
+
+    Creates missing ContentChunk rows and adds this content's references to
+    every chunk's reference count with one grouped UPDATE. With source, the
+    file the manifest was cut from, blobs gone since write_chunks found them
+    stored are rewritten (see _restore_missing_blobs).
+    """
+    from .models import ContentChunk, ContentChunkRef, chunk_upload_path
+
+    references = Counter(chunk_hash for chunk_hash, _ in manifest)
+    sizes = dict(manifest)
+    with transaction.atomic():
+        ContentChunk.objects.bulk_create(
+            [
+                ContentChunk(
+                    chunk_hash=chunk_hash,
+                    file=chunk_upload_path(ContentChunk(chunk_hash=chunk_hash), chunk_hash),
+                    size=sizes[chunk_hash],
+                )
+                for chunk_hash in references
+            ],
+            ignore_conflicts=True,
+            batch_size=LOOKUP_BATCH_SIZE,
+        )
+        _apply_reference_deltas(references)
+
+        refs = []
+        offset = 0
+        for position, (chunk_hash, size) in enumerate(manifest):
+            refs.append(ContentChunkRef(
+                file_content=file_content,
+                chunk_id=chunk_hash,
+                position=position,
+                offset=offset,
+            ))
+            offset += size
+        ContentChunkRef.objects.bulk_create(refs, batch_size=LOOKUP_BATCH_SIZE)
+        if source is not None:
+            _restore_missing_blobs(manifest, source)
+
+
+def _restore_missing_blobs(manifest, source):
+    """
+    Rewrite the blobs of manifest's chunks that are missing from the store.
+
+    write_chunks skips chunks that are already stored, and a release can
+    delete such a chunk's blob before this content's references are taken.
+    Called in the transaction that takes them: release_chunks_for deletes a
+    blob only after checking, under the same write lock, that no row came
+    back for it, so a blob found here stays.
+    """
+    from .models import ContentChunk
+
+    storage = ContentChunk._meta.get_field('file').storage
+    spans = {}
+    offset = 0
+    for chunk_hash, size in manifest:
+        spans.setdefault(chunk_hash, (offset, size))
+        offset += size
+    hashes = list(spans)
+    for start in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+        batch = hashes[start:start + LOOKUP_BATCH_SIZE]
+        for chunk_hash, name in ContentChunk.objects.filter(pk__in=batch).values_list('chunk_hash', 'file'):
+            if storage.exists(name) or any(storage.exists(candidate) for candidate in layout_names(name)):
+                continue
+            offset, size = spans[chunk_hash]
+            source.seek(offset)
+            _write_chunk_blob(ContentChunk(chunk_hash=chunk_hash, size=size), source.read(size))
+
+
+def release_chunks(file_content):
+    """
+    Drop a chunked FileContent's references to its chunks.
+
+    Chunks left without references are deleted, their blobs after commit.
+    """
+    release_chunks_for([file_content.pk])
+
+
+def release_chunks_for(content_hashes):
+    """Drop the chunk references of many chunked FileContents at once (see release_chunks)."""
+    from .models import ContentChunk, ContentChunkRef
+
+    refs = ContentChunkRef.objects.filter(file_content__in=content_hashes)
+    references = dict(
+        refs.order_by().values('chunk_id').annotate(count=Count('id')).values_list('chunk_id', 'count')
+    )
+    with transaction.atomic():
+        refs.delete()
+        _apply_reference_deltas({chunk_hash: -count for chunk_hash, count in references.items()})
+
+        unreferenced = list(
+            ContentChunk.objects.filter(pk__in=list(references), reference_count__lte=0)
+            .values_list('chunk_hash', 'file')
+        )
+        ContentChunk.objects.filter(pk__in=[chunk_hash for chunk_hash, _ in unreferenced]).delete()
+
+        def _delete_blobs():
+            storage = ContentChunk._meta.get_field('file').storage
+            for start in range(0, len(unreferenced), LOOKUP_BATCH_SIZE):
+                batch = unreferenced[start:start + LOOKUP_BATCH_SIZE]
+                # Under the write lock, so an upload that took these chunks up again
+                # since the release either keeps its blob or rewrites it (see save_manifest)
+                with transaction.atomic():
+                    revived = set(
+                        ContentChunk.objects.filter(pk__in=[chunk_hash for chunk_hash, _ in batch])
+                        .values_list('chunk_hash', flat=True)
+                    )
+                    for chunk_hash, name in batch:
+                        if chunk_hash in revived:
+                            continue
+                        try:
+                            storage.delete(name)
+                        except Exception:
+                            # swallow storage errors here; cleanup command can be used later
+                            pass
+
+        transaction.on_commit(_delete_blobs)
+
+
+def _apply_reference_deltas(deltas):
+    from .models import ContentChunk
+
+    hashes = list(deltas)
+    for start in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+        batch = hashes[start:start + LOOKUP_BATCH_SIZE]
+        ContentChunk.objects.filter(pk__in=batch).update(
+            reference_count=F('reference_count') + Case(
+                *[When(pk=chunk_hash, then=Value(deltas[chunk_hash])) for chunk_hash in batch],
+                default=Value(0),
+                output_field=IntegerField()
+            )
+        )
+
+
+class ChunkedContentReader(io.RawIOBase):
+    """
+    Read-only, seekable stream over a chunked FileContent.
+
+    Chunk references are fetched from the manifest in windows and chunks are
+    opened one at a time, so memory use is bounded by the window and the
+    caller's read size.
+    """
+
+    WINDOW_SIZE = 256
+
+    def __init__(self, file_content):
+        super().__init__()
+        self.file_content = file_content
+        self.size = file_content.size
+        self._position = 0
+        self._window = deque()
+        self._chunk = None
+        self._chunk_end = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError('negative seek position')
+        if offset != self._position:
+            self._close_chunk()
+            self._position = offset
+        return self._position
+
+    def _load_window(self):
+        """Fetch the manifest entries starting at the chunk holding the current position."""
+        from .models import ContentChunkRef
+
+        refs = ContentChunkRef.objects.filter(file_content=self.file_content)
+        first = refs.filter(offset__lte=self._position).order_by('-offset').values('position')[:1]
+        self._window = deque(
+            refs.filter(position__gte=Subquery(first))
+            .order_by('position')
+            .values_list('offset', 'chunk__size', 'chunk__file')[:self.WINDOW_SIZE]
+        )
+
+    def _open_chunk(self):
+        """Open the chunk containing the current position."""
+        from .models import ContentChunk
+
+        while self._window and self._window[0][0] + self._window[0][1] <= self._position:
+            self._window.popleft()
+        if not self._window or self._window[0][0] > self._position:
+            self._load_window()
+            if not self._window:
+                return False
+
+        offset, size, name = self._window.popleft()
+        self._chunk = open_blob(ContentChunk._meta.get_field('file').storage, name)
+        self._chunk.seek(self._position - offset)
+        self._chunk_end = offset + size
+        return True
+
+    def _close_chunk(self):
+        if self._chunk is not None:
+            self._chunk.close()
+            self._chunk = None
+
+    def readinto(self, buffer):
+        if self._position >= self.size:
+            return 0
+        if self._chunk is None or self._position >= self._chunk_end:
+            self._close_chunk()
+            if not self._open_chunk():
+                return 0
+        want = min(len(buffer), self._chunk_end - self._position)
+        data = self._chunk.read(want)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def close(self):
+        self._close_chunk()
+        super().close()
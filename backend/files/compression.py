@@ -0,0 +1,170 @@
+"""
+Transparent compression of content blobs.
+
+When FILES_COMPRESSION_ENABLED is set, new single-file content is compressed
+with a codec picked from its MIME type (FILES_COMPRESSION_CODECS). Formats
+that are already compressed are stored raw, as is anything whose compressed
+size would not save at least FILES_COMPRESSION_MIN_SAVINGS of the original.
+Compressed blobs carry a codec suffix (``<hash>.gz``, ``<hash>.xz``), so the
+blob at a given path is always in the format that path names.
+
+Downloads decompress as a stream through gzip/lzma file objects, which read
+the blob in small blocks, so memory use does not depend on the file size.
+"""
+import gzip
+import io
+import lzma
+import shutil
+
+from django.conf import settings
+
+CODEC_NONE = ''
+CODEC_GZIP = 'gzip'
+CODEC_XZ = 'xz'
+
+CODEC_SUFFIXES = {
+    CODEC_NONE: '',
+    CODEC_GZIP: '.gz',
+    CODEC_XZ: '.xz',
+}
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# MIME types whose content is already compressed; recompressing them wastes CPU
+COMPRESSED_TYPES = {
+    'application/gzip',
+    'application/x-gzip',
+    'application/zip',
+    'application/x-zip-compressed',
+    'application/x-7z-compressed',
+    'application/x-rar-compressed',
+    'application/vnd.rar',
+    'application/x-bzip2',
+    'application/x-xz',
+    'application/zstd',
+    'application/pdf',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'image/jpeg',
+    'image/png',
+    'image/gif',
+    'image/webp',
+    'image/avif',
+    'image/heic',
+}
+COMPRESSED_TYPE_PREFIXES = ('video/', 'audio/')
+UNCOMPRESSED_AUDIO_TYPES = {'audio/wav', 'audio/x-wav', 'audio/wave'}
+
+
+def codec_suffix(codec):
+    return CODEC_SUFFIXES[codec or CODEC_NONE]
+
+
+def choose_codec(file_type, size):
+    """
+    Return the codec to store new content of this type and size with.
+
+    Returns CODEC_NONE when compression is disabled, the content is small,
+    or the type is already compressed.
+    """
+    if not settings.FILES_COMPRESSION_ENABLED or size < settings.FILES_COMPRESSION_MIN_SIZE:
+        return CODEC_NONE
+    file_type = (file_type or '').split(';')[0].strip().lower()
+    if file_type in COMPRESSED_TYPES or (
+        file_type.startswith(COMPRESSED_TYPE_PREFIXES) and file_type not in UNCOMPRESSED_AUDIO_TYPES
+    ):
+        return CODEC_NONE
+
+    # Most specific prefix wins; '' is the fallback for every other type
+    codecs = settings.FILES_COMPRESSION_CODECS
+    for prefix in sorted(codecs, key=len, reverse=True):
+        if file_type.startswith(prefix):
+            return codecs[prefix]
+    return CODEC_NONE
+
+
+def compress_file(source, destination, codec):
+    """
+    Compress the readable file object source into the binary file destination.
+
+    Returns:
+        Int: Number of compressed bytes written
+    """
+    start = destination.tell()
+    if codec == CODEC_GZIP:
+        # mtime=0 keeps the output identical for identical content
+        writer = gzip.GzipFile(fileobj=destination, mode='wb', compresslevel=6, mtime=0)
+    elif codec == CODEC_XZ:
+        writer = lzma.LZMAFile(destination, 'wb', preset=6)
+    else:
+        raise ValueError(f'Unsupported codec: {codec}')
+    with writer:
+        shutil.copyfileobj(source, writer, COPY_BUFFER_SIZE)
+    destination.flush()
+    return destination.tell() - start
+
+
+def is_worth_storing(size, stored_size):
+    """Check whether a compressed copy saves enough to keep it over the raw bytes."""
+    return stored_size <= size * (1 - settings.FILES_COMPRESSION_MIN_SAVINGS)
+
+
+def _open_reader(raw, codec):
+    if codec == CODEC_GZIP:
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    if codec == CODEC_XZ:
+        return lzma.LZMAFile(raw, 'rb')
+    raise ValueError(f'Unsupported codec: {codec}')
+
+
+class DecompressedStream(io.RawIOBase):
+    """
+    Read-only stream of the original bytes of a compressed blob.
+
+    The uncompressed size is known from the FileContent row, so seeks only
+    record the new position; the decompressor catches up on the next read.
+    That keeps ``seek(0, SEEK_END)``/``tell()`` (used to size responses) from
+    decompressing the whole blob. Backward seeks restart decompression.
+    """
+
+    def __init__(self, raw, codec, size):
+        super().__init__()
+        self._raw = raw
+        self._reader = _open_reader(raw, codec)
+        self.size = size
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError('negative seek position')
+        self._position = offset
+        return self._position
+
+    def readinto(self, buffer):
+        if self._position >= self.size:
+            return 0
+        if self._reader.tell() != self._position:
+            self._reader.seek(self._position)
+        count = self._reader.readinto(buffer)
+        self._position += count
+        return count
+
+    def close(self):
+        if not self.closed:
+            self._reader.close()
+            self._raw.close()
+        super().close()
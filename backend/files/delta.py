@@ -0,0 +1,445 @@
+"""
+Delta storage for near-duplicate content.
+
+With FILES_DELTA_ENABLED, new single-file content between
+FILES_DELTA_MIN_FILE_SIZE and FILES_DELTA_MAX_FILE_SIZE is split into small
+content-defined chunks (the chunker of chunking.py, at finer sizes) and
+sketched: a MinHash of its chunk set, cut into LSH bands. Each band is a
+SimilarityFeature row, so content sharing any band with a stored sketch, i.e.
+content likely to share most of its chunks, is found with one indexed query.
+
+Indexed content also keeps a ChunkSignature, the digest and length of each
+of its chunks, so candidates are matched against their signatures and never
+read or chunked again. The upload is stored as a delta against the first
+candidate that saves at least FILES_DELTA_MIN_SAVINGS: chunks found in the
+base become COPY ops pointing into it, the rest INSERT ops carrying literal
+bytes. The uploads of one request scan at most FILES_DELTA_MAX_REQUEST_BYTES
+between them (see request_budget); the rest are stored without a search.
+
+A delta blob (``<hash>.delta``) holds the literals, then the op table, then a
+footer naming the base:
+
+    literals | op * count | MAGIC, base hash, op table offset, count
+
+Reads stream: DeltaReader maps a position to its op with a binary search and
+reads from the literals or from the base's own stream, so memory does not
+depend on the content size. Deltas may have deltas as bases, up to
+FILES_DELTA_MAX_CHAIN_DEPTH deep, which bounds how many blobs a read opens.
+
+A delta holds one reference on its base (FileContent.delta_base), taken
+before the delta blob is linked into place, so a base is never released
+under its deltas; releasing a delta gives the reference back.
+"""
+import bisect
+import contextvars
+import hashlib
+import io
+import os
+import struct
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.models import Count, F, Q
+
+from .chunking import iter_chunks
+from .storage import content_temp_dir, open_blob, touch_blob
+
+# Chunk sizes for matching: finer than FILES_CDC_* so that an edit costs
+# about a kilobyte of literals
+MIN_CHUNK_SIZE = 256
+AVG_CHUNK_SIZE = 1024
+MAX_CHUNK_SIZE = 4096
+
+NUM_BANDS = 8
+ROWS_PER_BAND = 4
+_MASK64 = (1 << 64) - 1
+# Fixed MinHash permutations (multiply-add on 64-bit chunk digests) so every
+# process sketches the same content identically
+PERMUTATIONS = tuple(
+    (
+        int.from_bytes(hashlib.sha256(b'minhash-a-%d' % i).digest()[:8], 'big') | 1,
+        int.from_bytes(hashlib.sha256(b'minhash-b-%d' % i).digest()[:8], 'big'),
+    )
+    for i in range(NUM_BANDS * ROWS_PER_BAND)
+)
+
+# Candidate bases tried per upload, best match first
+MAX_CANDIDATES = 2
+
+MAGIC = b'FCDELTA1'
+COPY = b'C'
+INSERT = b'I'
+# Kind, offset (in the base for COPY, in the literals for INSERT), length
+OP = struct.Struct('<cQQ')
+# Magic, base content hash, offset of the op table, number of ops
+FOOTER = struct.Struct('<8s64sQQ')
+# Digest and length of one chunk in a ChunkSignature
+SIGNATURE_ENTRY = struct.Struct('<16sI')
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Bytes the current request may still scan for delta bases, in a one-item
+# list so nested code can spend it; None outside request_budget
+_request_budget = contextvars.ContextVar('delta_request_budget', default=None)
+
+
+def should_delta(size):
+    """Check whether new content of this size is considered for delta storage."""
+    return (
+        settings.FILES_DELTA_ENABLED
+        and settings.FILES_DELTA_MIN_FILE_SIZE <= size <= settings.FILES_DELTA_MAX_FILE_SIZE
+    )
+
+
+@contextmanager
+def request_budget():
+    """Cap the uploads stored within at FILES_DELTA_MAX_REQUEST_BYTES of delta work between them."""
+    token = _request_budget.set([settings.FILES_DELTA_MAX_REQUEST_BYTES])
+    try:
+        yield
+    finally:
+        _request_budget.reset(token)
+
+
+def _spend_budget(size):
+    """Take size bytes from the current request's delta budget; False if too little is left."""
+    budget = _request_budget.get()
+    if budget is None:
+        return size <= settings.FILES_DELTA_MAX_REQUEST_BYTES
+    if budget[0] < size:
+        return False
+    budget[0] -= size
+    return True
+
+
+def _chunk_digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def scan_chunks(file_obj):
+    """
+    Chunk a file for matching.
+
+    Returns:
+        List of (digest, offset, length) in file order
+    """
+    chunks = []
+    offset = 0
+    for data in iter_chunks(file_obj, MIN_CHUNK_SIZE, AVG_CHUNK_SIZE, MAX_CHUNK_SIZE):
+        chunks.append((_chunk_digest(data), offset, len(data)))
+        offset += len(data)
+    return chunks
+
+
+def sketch(chunks):
+    """
+    Return the LSH band values of a MinHash over the chunk set.
+
+    Two contents whose chunk sets have Jaccard similarity s share at least
+    one band with probability 1 - (1 - s**ROWS_PER_BAND)**NUM_BANDS: about
+    0.99 at s=0.8 and 0.4 at s=0.5.
+
+    Returns:
+        List of NUM_BANDS signed 64-bit ints, empty for empty content
+    """
+    values = {int.from_bytes(digest[:8], 'little') for digest, _, _ in chunks}
+    if not values:
+        return []
+    minimums = [min(((a * value + b) & _MASK64) for value in values) for a, b in PERMUTATIONS]
+    bands = []
+    for band in range(NUM_BANDS):
+        rows = minimums[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack(f'<{ROWS_PER_BAND}Q', *rows), digest_size=8).digest()
+        bands.append(int.from_bytes(digest, 'little', signed=True))
+    return bands
+
+
+def encode_signature(chunks):
+    """Pack scan_chunks output into ChunkSignature.chunks."""
+    return b''.join(SIGNATURE_ENTRY.pack(digest, length) for digest, _, length in chunks)
+
+
+def decode_signature(data):
+    """
+    Returns:
+        Dict of chunk digest to its first offset in the content
+    """
+    offsets = {}
+    offset = 0
+    for digest, length in SIGNATURE_ENTRY.iter_unpack(data):
+        offsets.setdefault(digest, offset)
+        offset += length
+    return offsets
+
+
+def find_bases(bands, exclude=None):
+    """
+    Return stored contents sharing a band with a sketch, most bands first.
+
+    Only contents that can take another delta on top are returned.
+
+    Returns:
+        List of (FileContent, ChunkSignature.chunks)
+    """
+    from .models import ChunkSignature, FileContent, SimilarityFeature
+
+    if not bands:
+        return []
+    match = Q()
+    for band, value in enumerate(bands):
+        match |= Q(band=band, value=value)
+    ranked = list(
+        SimilarityFeature.objects.filter(match).exclude(file_content=exclude)
+        .values('file_content').annotate(matches=Count('pk')).order_by('-matches')
+        .values_list('file_content', flat=True)[:MAX_CANDIDATES]
+    )
+    bases = FileContent.objects.in_bulk(ranked)
+    signatures = dict(ChunkSignature.objects.filter(file_content__in=ranked).values_list('file_content', 'chunks'))
+    return [
+        (bases[content_hash], bytes(signatures[content_hash])) for content_hash in ranked
+        if content_hash in bases and content_hash in signatures
+        and bases[content_hash].delta_depth < settings.FILES_DELTA_MAX_CHAIN_DEPTH
+        and bases[content_hash].reference_count > 0
+    ]
+
+
+def diff(chunks, signature):
+    """
+    Express chunked content as ops against the base whose ChunkSignature is signature.
+
+    Returns:
+        List of [kind, offset, length]; INSERT offsets are still offsets into
+        the new content (write_delta turns them into literal offsets)
+    """
+    base_offsets = decode_signature(signature)
+    ops = []
+    for digest, target_offset, length in chunks:
+        source = base_offsets.get(digest)
+        kind = COPY if source is not None else INSERT
+        if source is None:
+            source = target_offset
+        if ops and ops[-1][0] == kind and ops[-1][1] + ops[-1][2] == source:
+            ops[-1][2] += length
+        else:
+            ops.append([kind, source, length])
+    return ops
+
+
+def delta_size(ops):
+    """Size in bytes of the delta blob write_delta would produce for ops."""
+    literals = sum(length for kind, _, length in ops if kind == INSERT)
+    return literals + len(ops) * OP.size + FOOTER.size
+
+
+def write_delta(file_obj, ops, base_hash, out):
+    """Write the delta blob for ops computed by diff over file_obj's content."""
+    table = []
+    literal_offset = 0
+    for kind, source, length in ops:
+        if kind == INSERT:
+            file_obj.seek(source)
+            remaining = length
+            while remaining:
+                data = file_obj.read(min(remaining, COPY_BUFFER_SIZE))
+                if not data:
+                    raise ValueError('content is shorter than its chunks')
+                out.write(data)
+                remaining -= len(data)
+            source = literal_offset
+            literal_offset += length
+        table.append(OP.pack(kind, source, length))
+    out.write(b''.join(table))
+    out.write(FOOTER.pack(MAGIC, base_hash.encode(), literal_offset, len(ops)))
+
+
+def read_footer(blob):
+    """
+    Returns:
+        Tuple of (base content hash, op table offset, number of ops)
+
+    Raises:
+        ValueError: blob is not a delta
+    """
+    blob.seek(-FOOTER.size, io.SEEK_END)
+    magic, base_hash, table_offset, count = FOOTER.unpack(blob.read(FOOTER.size))
+    if magic != MAGIC:
+        raise ValueError('not a delta blob')
+    return base_hash.decode(), table_offset, count
+
+
+def place_as_delta(file_content, uploaded_file):
+    """
+    Store an upload as a delta against similar stored content, if that pays.
+
+    The upload's sketch and chunks are kept on ``file_content.similarity_bands``
+    and ``similarity_chunks`` for save_features, delta or not, so later uploads
+    can find it. Uploads over the request's budget are not scanned. On success
+    sets ``storage_format``, ``delta_base``, ``delta_depth``, ``stored_size``
+    and the blob name, and holds a reference on the base; the row is not saved.
+
+    Returns:
+        True if the upload was stored as a delta
+    """
+    storage = file_content.file.storage
+    temp_dir = content_temp_dir(storage)
+    if temp_dir is None or not _spend_budget(uploaded_file.size):
+        return False
+    uploaded_file.seek(0)
+    chunks = scan_chunks(uploaded_file)
+    file_content.similarity_bands = sketch(chunks)
+    file_content.similarity_chunks = chunks
+    max_delta_size = uploaded_file.size * (1 - settings.FILES_DELTA_MIN_SAVINGS)
+    for base, signature in find_bases(file_content.similarity_bands, exclude=file_content.content_hash):
+        ops = diff(chunks, signature)
+        if delta_size(ops) <= max_delta_size and _place(file_content, uploaded_file, base, ops, temp_dir):
+            return True
+    uploaded_file.seek(0)
+    return False
+
+
+def _place(file_content, uploaded_file, base, ops, temp_dir):
+    from .models import FileContent
+
+    # Take the base's reference first: once it is held, the base cannot be released
+    if not FileContent.objects.filter(pk=base.pk, reference_count__gt=0).update(
+            reference_count=F('reference_count') + 1):
+        return False
+    storage = file_content.file.storage
+    file_content.storage_format = FileContent.FORMAT_DELTA
+    name = file_content.file.field.generate_filename(file_content, file_content.content_hash)
+    destination = storage.path(name)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=temp_dir, delete=False) as temp:
+        write_delta(uploaded_file, ops, base.pk, temp)
+    try:
+        # A link fails rather than replace a delta another upload of this content placed
+        os.link(temp.name, destination)
+    except FileExistsError:
+        # Left by an earlier attempt or placed concurrently: the same bytes only against the same base
+        try:
+            with open(destination, 'rb') as existing:
+                existing_base = read_footer(existing)[0]
+        except (OSError, ValueError, struct.error):
+            existing_base = None
+        if existing_base != base.pk:
+            file_content.storage_format = FileContent.FORMAT_FILE
+            release_base(base.pk)
+            return False
+        touch_blob(destination)
+    finally:
+        os.remove(temp.name)
+    if storage.file_permissions_mode is not None:
+        os.chmod(destination, storage.file_permissions_mode)
+
+    if getattr(uploaded_file, 'in_content_store', False):
+        # The raw upload is no longer needed
+        os.remove(uploaded_file.temporary_file_path())
+    file_content.file.name = name
+    file_content.delta_base = base
+    file_content.delta_depth = base.delta_depth + 1
+    file_content.stored_size = os.path.getsize(destination)
+    return True
+
+
+def release_base(base_hash):
+    """
+    Give back a base reference taken for a delta whose row was never saved.
+
+    The base is released if that was its last reference.
+    """
+    from .models import FileContent
+    from .services import release_contents
+
+    FileContent.objects.filter(pk=base_hash).update(reference_count=F('reference_count') - 1)
+    release_contents(FileContent.objects.filter(pk=base_hash, reference_count__lte=0))
+
+
+def save_features(file_content):
+    """Index the sketch and chunk signature of newly saved content, if it can serve as a base."""
+    from .models import ChunkSignature, SimilarityFeature
+
+    bands = getattr(file_content, 'similarity_bands', None)
+    if not bands or file_content.delta_depth >= settings.FILES_DELTA_MAX_CHAIN_DEPTH:
+        return
+    ChunkSignature.objects.create(
+        file_content=file_content, chunks=encode_signature(file_content.similarity_chunks)
+    )
+    SimilarityFeature.objects.bulk_create([
+        SimilarityFeature(file_content=file_content, band=band, value=value)
+        for band, value in enumerate(bands)
+    ])
+
+
+class DeltaReader(io.RawIOBase):
+    """
+    Read-only, seekable stream over delta content.
+
+    The op table is loaded when the stream opens; the base is opened on the
+    first COPY and read through its own stream.
+    """
+
+    def __init__(self, file_content):
+        super().__init__()
+        self.file_content = file_content
+        self.size = file_content.size
+        self._blob = open_blob(file_content.file.storage, file_content.file.name)
+        # The footer names the base as it was keyed when the delta was written;
+        # rehash_content may have re-keyed it since, so the row is what counts
+        _, table_offset, count = read_footer(self._blob)
+        self._blob.seek(table_offset)
+        table = self._blob.read(count * OP.size)
+        self._ops = [OP.unpack_from(table, i * OP.size) for i in range(count)]
+        # Offset of each op's first byte in the content, for seeks
+        self._starts = []
+        position = 0
+        for _, _, length in self._ops:
+            self._starts.append(position)
+            position += length
+        self._base = None
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError('negative seek position')
+        self._position = offset
+        return self._position
+
+    def readinto(self, buffer):
+        if self._position >= self.size:
+            return 0
+        index = bisect.bisect_right(self._starts, self._position) - 1
+        kind, source, length = self._ops[index]
+        within = self._position - self._starts[index]
+        want = min(len(buffer), length - within)
+        if kind == COPY:
+            if self._base is None:
+                self._base = self.file_content.delta_base.open_stream()
+            source_stream = self._base
+        else:
+            source_stream = self._blob
+        if source_stream.tell() != source + within:
+            source_stream.seek(source + within)
+        data = source_stream.read(want)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def close(self):
+        self._blob.close()
+        if self._base is not None:
+            self._base.close()
+        super().close()
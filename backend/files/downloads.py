@@ -0,0 +1,178 @@
+"""
+Serving stored content over HTTP.
+
+Content is immutable and addressed by its hash, so every response carries a
+strong ETag of the hash and a long-lived immutable Cache-Control. Single
+byte ranges are honoured (multi-range requests get the whole body, which
+RFC 9110 allows).
+
+Raw blobs are handed to the front-end server when FILES_SENDFILE_BACKEND is
+set ('nginx' for X-Accel-Redirect, 'apache' for X-Sendfile). Otherwise they
+are returned as a FileResponse whose file object exposes ``fileno()`` with
+the OS file offset at the start of the range, so a WSGI server with
+``wsgi.file_wrapper`` sendfile support (e.g. gunicorn) sends the bytes from
+the kernel without a Python copy loop. Chunked and compressed content has
+no raw blob and is streamed from ``FileContent.open_stream()``. Small,
+heavily referenced content may be served from memory instead (see
+hot_cache.py).
+"""
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header
+
+from . import hot_cache
+
+CACHE_CONTROL = 'max-age=31536000, immutable'
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class RangeFile:
+    """
+    File-like view of ``length`` bytes of file_obj from its current position.
+
+    ``fileno()`` is passed through so sendfile-capable servers can send the
+    range straight from the file; they start at the file's OS offset and
+    stop after Content-Length bytes.
+    """
+
+    def __init__(self, file_obj, length):
+        self._file = file_obj
+        self._remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size) if size else b''
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+
+def content_etag(file_content):
+    return f'"{file_content.content_hash}"'
+
+
+def parse_range(header, size):
+    """
+    Parse a Range header against content of the given size.
+
+    Returns:
+        Tuple of (start, end) inclusive, or None to serve the whole content
+        (no header, unsupported unit or multiple ranges)
+
+    Raises:
+        RangeNotSatisfiable: If the range lies outside the content
+    """
+    match = RANGE_PATTERN.match((header or '').replace(' ', ''))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def _sendfile_path(file_content):
+    """Return the path to hand to the front-end server, or None to serve from Django."""
+    backend = settings.FILES_SENDFILE_BACKEND
+    storage = file_content.file.storage
+    if not backend or file_content.storage_format != file_content.FORMAT_FILE or file_content.is_compressed:
+        return None
+    if not isinstance(storage, FileSystemStorage):
+        return None
+    if backend == 'nginx':
+        return settings.FILES_SENDFILE_URL_PREFIX.rstrip('/') + '/' + quote(file_content.file.name)
+    if backend == 'apache':
+        return storage.path(file_content.file.name)
+    raise ValueError(f'Unsupported FILES_SENDFILE_BACKEND: {backend}')
+
+
+def serve_content(request, file_content, filename, content_type):
+    """
+    Build the response for a GET of file_content.
+
+    Args:
+        request: The HttpRequest
+        file_content: FileContent to serve
+        filename: Download filename for Content-Disposition
+        content_type: MIME type of the response
+    """
+    etag = content_etag(file_content)
+    # Handles If-None-Match (304) and If-Match (412)
+    conditional = get_conditional_response(request, etag=etag)
+    if conditional is not None:
+        _set_cache_headers(conditional, etag)
+        return conditional
+
+    sendfile_path = _sendfile_path(file_content)
+    if sendfile_path is not None:
+        # The front-end server answers Range requests itself
+        response = HttpResponse(content_type=content_type)
+        header = 'X-Accel-Redirect' if settings.FILES_SENDFILE_BACKEND == 'nginx' else 'X-Sendfile'
+        response[header] = sendfile_path
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        _set_cache_headers(response, etag)
+        return response
+
+    size = file_content.size
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    # A stale If-Range (including any date) means: send the whole content
+    if if_range is None or if_range == etag:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            _set_cache_headers(response, etag)
+            return response
+
+    stream = hot_cache.open_stream(file_content)
+    if byte_range is None:
+        response = FileResponse(stream, as_attachment=True, filename=filename, content_type=content_type)
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        stream.seek(start)
+        response = FileResponse(
+            RangeFile(stream, end - start + 1),
+            status=206,
+            as_attachment=True,
+            filename=filename,
+            content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    _set_cache_headers(response, etag)
+    return response
+
+
+def _set_cache_headers(response, etag):
+    response['ETag'] = etag
+    response['Cache-Control'] = CACHE_CONTROL
+    response['Accept-Ranges'] = 'bytes'
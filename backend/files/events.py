@@ -0,0 +1,139 @@
+"""
+Deduplication bookkeeping, applied inline or by a background worker.
+
+With FILES_EVENT_QUEUE_ENABLED, duplicate uploads only write an EventJob row
+in their own transaction (an outbox) instead of inserting the
+DeduplicationEvent and updating the summaries before responding.
+``manage.py process_events`` claims jobs in batches and applies each batch
+and deletes its jobs in one transaction.
+
+Claims are leases: jobs claimed by a worker that died are claimed again once
+FILES_EVENT_JOB_LEASE seconds have passed. Because applying and deleting
+commit together, every job takes effect exactly once and the summaries
+converge after a restart.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Min, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import DeduplicationEvent, EventJob, File, StorageSavingsSummary
+
+
+def record_duplicates(events):
+    """
+    Record unsaved DeduplicationEvents, or queue them for the worker.
+
+    Call inside the transaction that creates the events' File rows so that
+    queued jobs commit (or roll back) with them.
+    """
+    if settings.FILES_EVENT_QUEUE_ENABLED:
+        EventJob.objects.bulk_create([EventJob(payload=_to_payload(event)) for event in events])
+    else:
+        apply_events(events)
+
+
+def apply_events(events):
+    """Insert DeduplicationEvents and add them to the summaries and rollups."""
+    DeduplicationEvent.objects.bulk_create(events)
+    StorageSavingsSummary.record_events(events)
+
+
+def _to_payload(event):
+    return {
+        'file_content': event.file_content_id,
+        'file_reference': str(event.file_reference_id),
+        'original_filename': event.original_filename,
+        'file_size': event.file_size,
+        'file_type': event.file_type,
+        'detected_at': event.detected_at.isoformat(),
+    }
+
+
+def _from_payload(payload):
+    return DeduplicationEvent(
+        file_content_id=payload['file_content'],
+        file_reference_id=uuid.UUID(payload['file_reference']),
+        original_filename=payload['original_filename'],
+        file_size=payload['file_size'],
+        file_type=payload['file_type'],
+        detected_at=parse_datetime(payload['detected_at']),
+    )
+
+
+def _claimable():
+    stale = timezone.now() - timedelta(seconds=settings.FILES_EVENT_JOB_LEASE)
+    return EventJob.objects.filter(
+        Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale),
+        attempts__lt=settings.FILES_EVENT_JOB_MAX_ATTEMPTS,
+    )
+
+
+def claim_jobs(batch_size):
+    """
+    Lease up to batch_size of the oldest claimable jobs.
+
+    Returns:
+        Tuple of (claim token, list of EventJob)
+    """
+    token = uuid.uuid4().hex
+    ids = list(_claimable().order_by('id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return token, []
+    # Re-check claimability in the UPDATE so two workers never lease the same job
+    _claimable().filter(id__in=ids).update(
+        claimed_by=token,
+        claimed_at=timezone.now(),
+        attempts=F('attempts') + 1
+    )
+    return token, list(EventJob.objects.filter(claimed_by=token).order_by('id'))
+
+
+def process_batch(batch_size):
+    """
+    Apply one batch of queued events.
+
+    Returns:
+        Int: Number of jobs applied
+    """
+    token, jobs = claim_jobs(batch_size)
+    if not jobs:
+        return 0
+    try:
+        with transaction.atomic():
+            events = [_from_payload(job.payload) for job in jobs]
+            # Files deleted before their job ran still count towards the savings, but
+            # their events are not stored (the inline path would have cascaded them away)
+            live = set(
+                File.objects.filter(pk__in=[event.file_reference_id for event in events])
+                .values_list('pk', flat=True)
+            )
+            DeduplicationEvent.objects.bulk_create([event for event in events if event.file_reference_id in live])
+            StorageSavingsSummary.record_events(events)
+            EventJob.objects.filter(claimed_by=token).delete()
+    except Exception as exc:
+        EventJob.objects.filter(claimed_by=token).update(claimed_by=None, claimed_at=None, last_error=repr(exc))
+        raise
+    return len(jobs)
+
+
+def queue_metrics():
+    """
+    Return the queue's depth and lag.
+
+    Returns:
+        Dict with pending (jobs awaiting a worker), failed (jobs that used
+        up FILES_EVENT_JOB_MAX_ATTEMPTS) and lag_seconds (age of the oldest
+        pending job, 0 when the queue is empty)
+    """
+    pending = EventJob.objects.filter(attempts__lt=settings.FILES_EVENT_JOB_MAX_ATTEMPTS)
+    oldest = pending.aggregate(oldest=Min('created_at'))['oldest']
+    return {
+        'pending': pending.count(),
+        'failed': EventJob.objects.filter(attempts__gte=settings.FILES_EVENT_JOB_MAX_ATTEMPTS).count(),
+        'lag_seconds': (timezone.now() - oldest).total_seconds() if oldest else 0.0,
+    }
@@ -0,0 +1,115 @@
+"""
+Consistency checks of stored reference counts and blobs.
+
+FileContent.reference_count and ContentChunk.reference_count are counters
+kept alongside the rows they count (File and delta FileContent rows, and
+ContentChunkRef). check_counts walks a table in primary key ranges and
+compares each counter with GROUP BY aggregates over the range, optionally
+checking that every blob exists with the expected size and repairing
+drifted counters in the same transaction as the count, so concurrent uploads
+cannot slip between them.
+"""
+import os
+from collections import Counter
+from contextlib import nullcontext
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from .models import ContentChunk, ContentChunkRef, File, FileContent
+
+FSCK_BATCH_SIZE = 1000
+
+# (name, model, ((referencing model, its foreign key), ...), fields giving the blob's
+#  stored size, whether rows may live in a pack instead)
+CHECKS = [
+    ('content', FileContent, ((File, 'file_content'), (FileContent, 'delta_base')), ('size', 'stored_size'), True),
+    ('chunks', ContentChunk, ((ContentChunkRef, 'chunk'),), ('size',), False),
+]
+
+
+def check_counts(model, references, size_fields, packed=False, after=None, batch_size=FSCK_BATCH_SIZE,
+                 verify_blobs=False, repair=False):
+    """
+    Check a table's reference counts one primary key range at a time.
+
+    Args:
+        model: FileContent or ContentChunk
+        references: (model, foreign key) pairs of the rows reference_count should count
+        size_fields: Fields holding the blob size; the last non-null one wins
+        packed: Rows have pack and pack_offset fields (see files.packs)
+        after: Primary key to resume after, or None to start from the beginning
+        batch_size: Rows per range
+        verify_blobs: Also stat each row's blob
+        repair: Set drifted reference counts to the actual count
+
+    Yields:
+        Dict per range with the 'last' primary key checked, the number of rows
+        'checked', 'drift' as (pk, stored, actual) tuples, 'repaired',
+        'missing' blob names and 'size_mismatch' as (name, expected, actual);
+        packed content is named '<pack>@<offset>' and expected to fit in its pack
+    """
+    storage = default_storage
+    location_fields = ('file', 'pack', 'pack_offset') if packed else ('file',)
+    while True:
+        # Counting and repairing in one write transaction keeps uploads from landing in between
+        with transaction.atomic() if repair else nullcontext():
+            queryset = model.objects.order_by('pk')
+            if after is not None:
+                queryset = queryset.filter(pk__gt=after)
+            rows = list(
+                queryset.values_list('pk', 'reference_count', *location_fields, *size_fields)[:batch_size]
+            )
+            if not rows:
+                return
+            # One aggregate per reference over the range's slice of its foreign key index, rather than a join
+            actual = Counter()
+            for referencing_model, foreign_key in references:
+                actual.update(dict(
+                    referencing_model.objects.filter(**{
+                        f'{foreign_key}__gte': rows[0][0],
+                        f'{foreign_key}__lte': rows[-1][0],
+                    }).order_by().values(foreign_key).annotate(count=Count('pk')).values_list(foreign_key, 'count')
+                ))
+            drift = [(pk, stored, actual.get(pk, 0)) for pk, stored, *_ in rows if stored != actual.get(pk, 0)]
+            repaired = 0
+            if repair and drift:
+                repaired = model.objects.filter(pk__in=[pk for pk, _, _ in drift]).update(
+                    reference_count=Case(
+                        *[When(pk=pk, then=Value(actual)) for pk, _, actual in drift],
+                        output_field=IntegerField()
+                    )
+                )
+        result = {
+            'last': rows[-1][0],
+            'checked': len(rows),
+            'drift': drift,
+            'repaired': repaired,
+            'missing': [],
+            'size_mismatch': [],
+        }
+        if verify_blobs:
+            for row in rows:
+                location = row[2:2 + len(location_fields)]
+                sizes = row[2 + len(location_fields):]
+                expected = [size for size in sizes if size is not None][-1]
+                name, path = location[0], location[0]
+                if not name and packed and location[1]:
+                    # Packed: the pack must reach past the content's end
+                    name, path = f'{location[1]}@{location[2]}', location[1]
+                    expected += location[2]
+                if not name:
+                    # Chunked content has no blob of its own
+                    continue
+                try:
+                    actual_size = os.stat(storage.path(path)).st_size
+                except FileNotFoundError:
+                    result['missing'].append(name)
+                    continue
+                if actual_size != expected and not (path != name and actual_size > expected):
+                    result['size_mismatch'].append((name, expected, actual_size))
+        yield result
+        if len(rows) < batch_size:
+            return
+        after = rows[-1][0]
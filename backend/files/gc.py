@@ -0,0 +1,314 @@
+"""
+Mark-and-sweep garbage collection for the content and chunk stores.
+
+Both sides are streamed in hash order and merged in one pass: the blobs on
+disk by walking the shard directories (shard names are hash prefixes, so a
+depth-first walk of sorted listings comes out in hash order), and the rows by
+keyset-paginating on the primary key. Memory is bounded by one directory
+listing per shard level, one page of rows and the deletion batches in flight,
+however many blobs there are.
+
+The merge finds:
+
+- orphan blobs: files under a store directory with no row naming them, left
+  behind when a blob was placed but its transaction never committed. They are
+  removed by a thread pool once older than the grace period, after checking
+  the database again, so uploads in flight are not swept. An upload that
+  reuses an existing blob refreshes its mtime (storage.touch_blob) for the
+  same reason, as does reshard_content for a blob it is moving.
+- orphan contents: FileContent rows no File or delta references, older than
+  the grace period. They are released through services.release_contents.
+- missing blobs: rows naming a blob that is not on disk. These are only
+  counted; nothing here can recover them.
+"""
+import heapq
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import chain
+
+from django.core.files.storage import default_storage
+from django.db.models import BooleanField, Exists, ExpressionWrapper, OuterRef, Q
+from django.utils import timezone
+
+from .models import ContentChunk, File, FileContent
+from .storage import CONTENT_TEMP_DIR
+
+GC_BATCH_SIZE = 1000
+GC_WORKERS = 4
+# Blobs and rows younger than this may belong to an upload still in flight
+GC_GRACE_SECONDS = 3600
+
+HEX_PATTERN = re.compile(r'^[0-9a-f]+$')
+SHARD_PATTERN = re.compile(r'^[0-9a-f]{2}$')
+
+
+def blob_hash(name):
+    """Return the hash a blob file name is stored under, without codec suffix."""
+    return name.split('.', 1)[0]
+
+
+def iter_blobs(root, directory, prefix=''):
+    """
+    Yield (hash, name) for every blob under a store directory, in hash order.
+
+    Args:
+        root: Absolute path of the storage root (MEDIA_ROOT)
+        directory: Store directory relative to root, e.g. 'content'
+        prefix: Hash prefix the shard directories down to directory stand for
+
+    Yields:
+        Tuples of (hash, storage name relative to root)
+    """
+    path = os.path.join(root, directory)
+    try:
+        with os.scandir(path) as entries:
+            listing = [(entry.name, entry.is_dir(follow_symlinks=False)) for entry in entries]
+    except FileNotFoundError:
+        return
+    blobs = sorted(
+        (blob_hash(name), f'{directory}/{name}') for name, is_dir in listing
+        # A blob outside the shard its hash belongs in would break the ordering
+        if not is_dir and HEX_PATTERN.match(blob_hash(name)) and name.startswith(prefix)
+    )
+    # Anything not named like a shard (e.g. content/tmp) is not part of the store
+    shards = sorted(name for name, is_dir in listing if is_dir and SHARD_PATTERN.match(name))
+    # Sibling shards cover disjoint hash ranges, so they are walked one at a time.
+    # Blobs beside them are only there mid-reshard, when layouts of two depths overlap.
+    nested = chain.from_iterable(iter_blobs(root, f'{directory}/{shard}', prefix + shard) for shard in shards)
+    yield from heapq.merge(blobs, nested)
+
+
+def iter_rows(queryset, fields, batch_size=GC_BATCH_SIZE):
+    """
+    Yield values_list rows of queryset in primary key order, one page at a time.
+
+    Keyset pages rather than one long .iterator() read, so the GC never holds
+    a read transaction open across the whole table and rows it deletes
+    behind itself do not disturb the scan.
+    """
+    last = None
+    while True:
+        page = queryset.order_by('pk')
+        if last is not None:
+            page = page.filter(pk__gt=last)
+        rows = list(page.values_list('pk', *fields)[:batch_size])
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        last = rows[-1][0]
+
+
+def merge(blobs, rows):
+    """
+    Merge hash-ordered blobs and rows.
+
+    Args:
+        blobs: Iterable of (hash, name) as from iter_blobs
+        rows: Iterable of rows whose first item is the hash, in hash order
+
+    Yields:
+        Tuples of (hash, names, row): names lists the blobs stored under the
+        hash (possibly empty) and row is None when there is no row
+    """
+    blobs = iter(blobs)
+    rows = iter(rows)
+    blob = next(blobs, None)
+    row = next(rows, None)
+    while blob is not None or row is not None:
+        if row is None or (blob is not None and blob[0] < row[0]):
+            key = blob[0]
+        else:
+            key = row[0]
+        names = []
+        while blob is not None and blob[0] == key:
+            names.append(blob[1])
+            blob = next(blobs, None)
+        if row is not None and row[0] == key:
+            yield key, names, row
+            row = next(rows, None)
+        else:
+            yield key, names, None
+
+
+def _remove_blobs(root, names, cutoff):
+    """Unlink blobs not modified since cutoff; returns (removed, bytes removed)."""
+    removed = removed_bytes = 0
+    for name in names:
+        path = os.path.join(root, name)
+        try:
+            stat = os.stat(path)
+            if stat.st_mtime >= cutoff:
+                # Reused by an upload since it was marked
+                continue
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        removed += 1
+        removed_bytes += stat.st_size
+    return removed, removed_bytes
+
+
+class GarbageCollector:
+    """
+    One mark-and-sweep pass over the content and chunk stores.
+
+    Args:
+        grace_seconds: Minimum age of a blob or row before it is collected
+        batch_size: Rows per page and blobs per deletion batch
+        workers: Threads unlinking orphan blobs
+        dry_run: Count what would be collected without deleting anything
+        progress: Optional callable receiving the stats dict periodically
+        progress_interval: Seconds between progress calls
+    """
+
+    def __init__(self, grace_seconds=GC_GRACE_SECONDS, batch_size=GC_BATCH_SIZE, workers=GC_WORKERS,
+                 dry_run=False, progress=None, progress_interval=10):
+        self.storage = default_storage
+        self.root = self.storage.path('')
+        self.grace_seconds = grace_seconds
+        self.batch_size = batch_size
+        self.workers = workers
+        self.dry_run = dry_run
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.stats = {
+            'blobs_scanned': 0,
+            'rows_scanned': 0,
+            'orphan_blobs': 0,
+            'blobs_deleted': 0,
+            'bytes_deleted': 0,
+            'orphan_contents': 0,
+            'contents_deleted': 0,
+            'missing_blobs': 0,
+            'temp_files_deleted': 0,
+            'elapsed': 0.0,
+        }
+
+    def run(self):
+        """
+        Collect garbage from every store.
+
+        Returns:
+            Dict of counters (see self.stats)
+        """
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.cutoff = time.time() - self.grace_seconds
+        self.row_cutoff = timezone.now() - timedelta(seconds=self.grace_seconds)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            self.pool = pool
+            self.pending = deque()
+            self.collect_store(
+                'content',
+                FileContent.objects.annotate(in_use=ExpressionWrapper(
+                    Q(Exists(File.objects.filter(file_content=OuterRef('pk'))))
+                    | Q(Exists(FileContent.objects.filter(delta_base=OuterRef('pk')))),
+                    output_field=BooleanField()
+                )),
+                ('file', 'in_use', 'created_at'),
+                self.sweep_contents,
+            )
+            self.collect_store('chunks', ContentChunk.objects.all(), ('file',), None)
+            while self.pending:
+                self._finish(self.pending.popleft())
+        self.sweep_temp_files()
+        self.stats['elapsed'] = time.monotonic() - self.started
+        return self.stats
+
+    def collect_store(self, directory, queryset, fields, sweep_rows):
+        """Merge one store's blobs with its rows and sweep both kinds of orphan."""
+        model = queryset.model
+        orphan_blobs = []
+        orphan_rows = []
+        for key, names, row in merge(iter_blobs(self.root, directory), iter_rows(queryset, fields, self.batch_size)):
+            self.stats['blobs_scanned'] += len(names)
+            if row is None:
+                orphan_blobs.extend(names)
+            else:
+                self.stats['rows_scanned'] += 1
+                stored_name = row[1]
+                # Any other blob under this hash is a leftover, e.g. from another codec
+                orphan_blobs.extend(name for name in names if name != stored_name)
+                if stored_name and stored_name not in names:
+                    self.stats['missing_blobs'] += 1
+                if sweep_rows is not None and not row[2] and row[3] < self.row_cutoff:
+                    orphan_rows.append(key)
+            if len(orphan_blobs) >= self.batch_size:
+                self.sweep_blobs(model, orphan_blobs)
+                orphan_blobs = []
+            if len(orphan_rows) >= self.batch_size:
+                sweep_rows(orphan_rows)
+                orphan_rows = []
+            self._report()
+        if orphan_blobs:
+            self.sweep_blobs(model, orphan_blobs)
+        if orphan_rows:
+            sweep_rows(orphan_rows)
+
+    def sweep_blobs(self, model, names):
+        """Hand a batch of orphan blobs to the deletion pool after re-checking the database."""
+        names = [name for name in names if self._is_old(os.path.join(self.root, name))]
+        if not names:
+            return
+        # A row may have been committed for one of them since the scan passed it
+        claimed = set(
+            model.objects.filter(pk__in={blob_hash(os.path.basename(name)) for name in names})
+            .values_list('file', flat=True)
+        )
+        names = [name for name in names if name not in claimed]
+        self.stats['orphan_blobs'] += len(names)
+        if self.dry_run or not names:
+            return
+        # Bound the work queued behind the pool
+        while len(self.pending) >= self.workers * 2:
+            self._finish(self.pending.popleft())
+        self.pending.append(self.pool.submit(_remove_blobs, self.root, names, self.cutoff))
+
+    def sweep_contents(self, content_hashes):
+        """Release a batch of FileContent rows no File references."""
+        from .services import release_contents
+
+        self.stats['orphan_contents'] += len(content_hashes)
+        if not self.dry_run:
+            self.stats['contents_deleted'] += release_contents(
+                FileContent.objects.filter(pk__in=content_hashes, created_at__lt=self.row_cutoff)
+            )
+
+    def sweep_temp_files(self):
+        """Remove stale staging files from the content store's temporary directory."""
+        path = os.path.join(self.root, CONTENT_TEMP_DIR)
+        try:
+            entries = os.scandir(path)
+        except FileNotFoundError:
+            return
+        with entries:
+            # Directories belong to chunked uploads (see cleanup_stale_uploads)
+            stale = [entry.name for entry in entries
+                     if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < self.cutoff]
+        if self.dry_run:
+            self.stats['temp_files_deleted'] = len(stale)
+            return
+        removed, _ = _remove_blobs(path, stale, self.cutoff)
+        self.stats['temp_files_deleted'] = removed
+
+    def _is_old(self, path):
+        try:
+            return os.stat(path).st_mtime < self.cutoff
+        except FileNotFoundError:
+            return False
+
+    def _finish(self, future):
+        removed, removed_bytes = future.result()
+        self.stats['blobs_deleted'] += removed
+        self.stats['bytes_deleted'] += removed_bytes
+
+    def _report(self):
+        now = time.monotonic()
+        if self.progress is not None and now - self.last_report >= self.progress_interval:
+            self.last_report = now
+            self.stats['elapsed'] = now - self.started
+            self.progress(self.stats)
@@ -0,0 +1,125 @@
+"""
+In-process cache of hot content for downloads.
+
+A few heavily deduplicated contents get most of the reads. With
+FILES_HOT_CACHE_SIZE set, each worker keeps up to that many bytes of small
+content (at most FILES_HOT_CACHE_MAX_BLOB_SIZE each) in memory, least
+recently used first out. Only content referenced by at least
+FILES_HOT_CACHE_MIN_REFERENCES files is admitted, so one-off downloads of
+unique files do not push the popular ones out.
+
+Content is immutable and addressed by its hash, so entries never go stale
+and need no invalidation: content deleted and uploaded again has the same
+bytes.
+"""
+import io
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class HotContentCache:
+    """A byte-bounded LRU of content keyed by hash, with hit, miss and eviction counts."""
+
+    def __init__(self, max_bytes, max_blob_size, min_references):
+        self.max_bytes = max_bytes
+        self.max_blob_size = max_blob_size
+        self.min_references = min_references
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = self.misses = self.evictions = self.rejections = 0
+
+    def admits(self, file_content):
+        """Whether file_content may be served from and admitted to the cache."""
+        if file_content.size > min(self.max_blob_size, self.max_bytes):
+            return False
+        if file_content.reference_count < self.min_references:
+            with self._lock:
+                self.rejections += 1
+            return False
+        return True
+
+    def get(self, content_hash):
+        with self._lock:
+            data = self._entries.get(content_hash)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(content_hash)
+            self.hits += 1
+            return data
+
+    def put(self, content_hash, data):
+        with self._lock:
+            if content_hash in self._entries:
+                return
+            self._entries[content_hash] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def metrics(self):
+        """
+        Returns:
+            Dict with entries, bytes, max_bytes, hits, misses, hit_ratio,
+            evictions and rejections (downloads of small content not admitted
+            for too few references)
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'rejections': self.rejections,
+            }
+
+
+_cache = {'key': None, 'cache': None}
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return this process's cache, or None when FILES_HOT_CACHE_SIZE is 0."""
+    key = (
+        settings.FILES_HOT_CACHE_SIZE, settings.FILES_HOT_CACHE_MAX_BLOB_SIZE, settings.FILES_HOT_CACHE_MIN_REFERENCES
+    )
+    if _cache['key'] != key:
+        with _cache_lock:
+            if _cache['key'] != key:
+                _cache['cache'] = HotContentCache(*key) if key[0] > 0 else None
+                _cache['key'] = key
+    return _cache['cache']
+
+
+def open_stream(file_content):
+    """
+    Open file_content for reading, from the cache when it is hot.
+
+    Returns:
+        Seekable binary stream of the content
+    """
+    cache = get_cache()
+    if cache is None or not cache.admits(file_content):
+        return file_content.open_stream()
+
+    data = cache.get(file_content.content_hash)
+    if data is None:
+        with file_content.open_stream() as stream:
+            data = stream.read()
+        cache.put(file_content.content_hash, data)
+    return io.BytesIO(data)
+
+
+def metrics():
+    """Metrics of this process's cache, or None when it is disabled."""
+    cache = get_cache()
+    return cache.metrics() if cache is not None else None
@@ -0,0 +1,37 @@
+"""Resumable progress for the management commands that walk every blob in hash order."""
+import json
+import os
+
+from django.core.management.base import CommandError
+
+
+class CheckpointMixin:
+    """
+    Record a command's position in a JSON file given with --checkpoint.
+
+    A run interrupted part way leaves the file behind; the next run given the
+    same file loads the position and resumes after it. Every method is a no-op
+    when no path was given.
+    """
+
+    def load_checkpoint(self, path):
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path) as checkpoint:
+                return json.load(checkpoint)
+        except ValueError:
+            raise CommandError(f'{path} is not a checkpoint file')
+
+    def save_checkpoint(self, path, position):
+        if not path:
+            return
+        # Replace rather than rewrite in place, so an interrupted run never leaves half a file
+        with open(f'{path}.tmp', 'w') as checkpoint:
+            json.dump(position, checkpoint)
+        os.replace(f'{path}.tmp', path)
+
+    def clear_checkpoint(self, path):
+        """Remove the checkpoint of a run that finished."""
+        if path and os.path.exists(path):
+            os.remove(path)
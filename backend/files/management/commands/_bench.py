@@ -0,0 +1,54 @@
+"""Shared helpers for the benchmark management commands."""
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+
+@contextmanager
+def isolated_environment():
+    """
+    Run a benchmark against a throwaway database and media root.
+
+    Benchmarks write real rows and blobs, so they never touch the
+    configured database or MEDIA_ROOT.
+    """
+    media_root = tempfile.mkdtemp(prefix='bench-media-')
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with override_settings(MEDIA_ROOT=media_root, ALLOWED_HOSTS=['*']):
+            yield media_root
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+def read_proc_io():
+    """
+    Return (bytes read, bytes written) by this process so far.
+
+    Uses the rchar/wchar counters from /proc/self/io, which count every
+    read()/write() call whether or not it was served from the page cache.
+    """
+    counters = {}
+    with open('/proc/self/io') as io_stats:
+        for line in io_stats:
+            key, _, value = line.partition(':')
+            counters[key] = int(value)
+    return counters['rchar'], counters['wchar']
+
+
+class Timer:
+    """Context manager recording wall-clock seconds in ``elapsed``."""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
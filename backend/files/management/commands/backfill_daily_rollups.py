@@ -0,0 +1,58 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from files.models import DailySavingsRollup, DeduplicationEvent
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily savings rollups from DeduplicationEvent records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild, YYYY-MM-DD (default: first event)')
+        parser.add_argument('--end', help='Last day to rebuild, YYYY-MM-DD (default: today)')
+        parser.add_argument(
+            '--days-per-batch',
+            type=int,
+            default=31,
+            help='Days rebuilt per transaction (default: 31)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show the range that would be rebuilt without changing anything',
+        )
+
+    def handle(self, *args, **options):
+        bounds = DeduplicationEvent.objects.aggregate(first=Min('detected_at'), last=Max('detected_at'))
+        if bounds['first'] is None and not options['start']:
+            self.stdout.write(self.style.SUCCESS('No deduplication events to roll up.'))
+            return
+
+        start = self._parse_day(options['start']) if options['start'] else timezone.localdate(bounds['first'])
+        end = self._parse_day(options['end']) if options['end'] else timezone.localdate()
+        if start > end:
+            raise CommandError('--start must not be after --end')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'DRY RUN: Would rebuild daily rollups from {start} to {end}.'))
+            return
+
+        total = 0
+        batch_start = start
+        while batch_start <= end:
+            batch_end = min(end, batch_start + timedelta(days=options['days_per_batch'] - 1))
+            written = DailySavingsRollup.rebuild(batch_start, batch_end)
+            total += written
+            self.stdout.write(f'  {batch_start} to {batch_end}: {written} rollup rows')
+            batch_start = batch_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} daily rollup rows from {start} to {end}.'))
+
+    def _parse_day(self, value):
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f'Invalid date: {value}')
@@ -0,0 +1,59 @@
+import os
+import statistics
+import uuid
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIClient
+
+from ._bench import Timer, isolated_environment
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = 'Measure per-chunk and final-chunk latency of chunked uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=64, help='Upload size in MB (default: 64)')
+        parser.add_argument('--chunk-size', type=int, default=1, help='Chunk size in MB (default: 1)')
+        parser.add_argument('--repeat', type=int, default=10, help='Number of uploads (default: 10)')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size'] * 1024 * 1024
+        total_chunks = max(1, options['size'] // options['chunk_size'])
+
+        chunk_latencies = []
+        final_latencies = []
+        with isolated_environment():
+            client = APIClient()
+            for _ in range(options['repeat']):
+                upload_id = uuid.uuid4().hex
+                for index in range(total_chunks):
+                    data = {
+                        'chunk': SimpleUploadedFile('chunk', os.urandom(chunk_size)),
+                        'chunk_index': index,
+                        'total_chunks': total_chunks,
+                        'upload_id': upload_id,
+                        'filename': 'bench.bin',
+                    }
+                    with Timer() as timer:
+                        resp = client.post('/api/files/upload-chunk/', data, format='multipart')
+                    if resp.status_code not in (200, 201):
+                        raise CommandError(f'Chunk upload failed with HTTP {resp.status_code}')
+                    if index == total_chunks - 1:
+                        final_latencies.append(timer.elapsed)
+                    else:
+                        chunk_latencies.append(timer.elapsed)
+
+        self.stdout.write(f"{options['repeat']} uploads of {total_chunks} x {options['chunk_size']}MB chunks")
+        for label, samples in (('intermediate chunk', chunk_latencies), ('final chunk', final_latencies)):
+            if not samples:
+                continue
+            self.stdout.write(
+                f'{label:<20} p50 {statistics.median(samples) * 1000:8.1f} ms   '
+                f'p99 {percentile(samples, 99) * 1000:8.1f} ms'
+            )
@@ -0,0 +1,33 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from files.chunking import iter_chunks
+from ._bench import Timer
+
+
+class Command(BaseCommand):
+    help = 'Measure content-defined chunking throughput (MB/s) at the configured chunk sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=64, help='Data chunked per run in MB (default: 64)')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of runs (default: 3)')
+
+    def handle(self, *args, **options):
+        if options['size'] < 1 or options['repeat'] < 1:
+            raise CommandError('--size and --repeat must be at least 1')
+        data = os.urandom(options['size'] * 1024 * 1024)
+        self.stdout.write(
+            f'Chunk sizes: min {settings.FILES_CDC_MIN_CHUNK_SIZE}, avg {settings.FILES_CDC_AVG_CHUNK_SIZE}, '
+            f'max {settings.FILES_CDC_MAX_CHUNK_SIZE} bytes'
+        )
+
+        rates = []
+        for run in range(options['repeat']):
+            with Timer() as timer:
+                chunks = sum(1 for _ in iter_chunks(BytesIO(data)))
+            rates.append(options['size'] / timer.elapsed)
+            self.stdout.write(f'  run {run + 1}: {chunks} chunks in {timer.elapsed:.2f}s ({rates[-1]:.1f} MB/s)')
+        self.stdout.write(self.style.SUCCESS(f'Best: {max(rates):.1f} MB/s'))
@@ -0,0 +1,72 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from files.utils import HASH_ALGORITHMS, hash_path, new_hasher
+from ._bench import Timer
+
+
+def hash_read_loop(path, algorithm, buffer_size):
+    hasher = new_hasher(algorithm)
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(buffer_size)
+            if not data:
+                break
+            hasher.update(data)
+    return hasher.hexdigest()
+
+
+class Command(BaseCommand):
+    help = 'Compare hashing throughput (MB/s) across algorithms, read strategies and file sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='1,16,256',
+            help='Comma-separated file sizes in MB (default: 1,16,256)',
+        )
+        parser.add_argument(
+            '--parallel',
+            type=int,
+            default=4,
+            help='Number of files hashed concurrently in the parallel run (default: 4)',
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        strategies = [
+            ('read 8KB', lambda path, algorithm: hash_read_loop(path, algorithm, 8 * 1024)),
+            ('read 1MB', lambda path, algorithm: hash_read_loop(path, algorithm, 1024 * 1024)),
+            ('mmap', hash_path),
+        ]
+
+        self.stdout.write(f"{'algorithm':<10} {'strategy':<10} {'size':>8} {'MB/s':>9}")
+        with tempfile.TemporaryDirectory(prefix='bench-hash-') as temp_dir:
+            for size_mb in sizes:
+                path = os.path.join(temp_dir, f'{size_mb}.bin')
+                with open(path, 'wb') as f:
+                    for _ in range(size_mb):
+                        f.write(os.urandom(1024 * 1024))
+
+                for algorithm in sorted(HASH_ALGORITHMS):
+                    for label, strategy in strategies:
+                        # Warm the page cache so every strategy reads from memory
+                        strategy(path, algorithm)
+                        with Timer() as timer:
+                            strategy(path, algorithm)
+                        self.stdout.write(
+                            f'{algorithm:<10} {label:<10} {size_mb:>6}MB {size_mb / timer.elapsed:>9.1f}'
+                        )
+
+                    # Several uploads hashed at once on a thread pool
+                    parallel = options['parallel']
+                    with ThreadPoolExecutor(max_workers=parallel) as pool:
+                        with Timer() as timer:
+                            list(pool.map(lambda _: hash_path(path, algorithm), range(parallel)))
+                    self.stdout.write(
+                        f'{algorithm:<10} {f"mmap x{parallel}":<10} {size_mb:>6}MB '
+                        f'{size_mb * parallel / timer.elapsed:>9.1f}'
+                    )
@@ -0,0 +1,74 @@
+import hashlib
+import os
+import random
+
+from django.core.management.base import BaseCommand
+
+from files.models import FileContent
+from files.presence import build_filter
+from ._bench import Timer, isolated_environment
+
+
+def synthetic_hash(index):
+    return hashlib.sha256(str(index).encode()).hexdigest()
+
+
+class Command(BaseCommand):
+    help = 'Compare the cost of a content lookup in the database and in the presence filter as the table grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='10000,100000,1000000',
+            help='Comma-separated numbers of stored contents (default: 10000,100000,1000000)',
+        )
+        parser.add_argument(
+            '--lookups',
+            type=int,
+            default=20000,
+            help='Lookups timed per size and kind (default: 20000)',
+        )
+        parser.add_argument(
+            '--fp-rate',
+            type=float,
+            default=0.01,
+            help='False-positive rate the filter is sized for (default: 0.01)',
+        )
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        lookups = options['lookups']
+        rng = random.Random(0)
+
+        self.stdout.write(
+            f"{'rows':>10} {'filter':>10} {'db hit us':>10} {'db miss us':>11} {'filter us':>10} {'false pos':>10}"
+        )
+        with isolated_environment() as media_root:
+            path = os.path.join(media_root, 'presence.bloom')
+            stored = 0
+            for size in sizes:
+                while stored < size:
+                    batch = range(stored, min(size, stored + 5000))
+                    FileContent.objects.bulk_create(
+                        FileContent(content_hash=synthetic_hash(i), size=1, reference_count=1) for i in batch
+                    )
+                    stored = batch[-1] + 1
+                presence, _ = build_filter(path, (synthetic_hash(i) for i in range(size)), size, options['fp_rate'])
+
+                hits = [synthetic_hash(rng.randrange(size)) for _ in range(lookups)]
+                # Indexes past every size ever stored are guaranteed misses
+                misses = [synthetic_hash(sizes[-1] + rng.randrange(10 ** 9)) for _ in range(lookups)]
+                with Timer() as db_hit:
+                    for content_hash in hits:
+                        FileContent.objects.filter(content_hash=content_hash).first()
+                with Timer() as db_miss:
+                    for content_hash in misses:
+                        FileContent.objects.filter(content_hash=content_hash).first()
+                with Timer() as bloom:
+                    false_positives = sum(presence.might_contain(content_hash) for content_hash in misses)
+
+                self.stdout.write(
+                    f'{size:>10} {presence.num_bits // 8 // 1024:>8}KB '
+                    f'{db_hit.elapsed / lookups * 1e6:>10.1f} {db_miss.elapsed / lookups * 1e6:>11.1f} '
+                    f'{bloom.elapsed / lookups * 1e6:>10.1f} {false_positives / lookups:>10.2%}'
+                )
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure sustained writes/s with parallel writer processes on a scratch SQLite '
+        'database, for each database profile in SQLITE_PROFILES'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Parallel uploading processes (default: 8)')
+        parser.add_argument('--readers', type=int, default=2, help='Parallel listing processes (default: 2)')
+        parser.add_argument('--seconds', type=float, default=10, help='Duration of each run (default: 10)')
+        parser.add_argument('--size-kb', type=int, default=4, help='Upload size in KB (default: 4)')
+        parser.add_argument(
+            '--duplicate-ratio',
+            type=float,
+            default=0.5,
+            help='Fraction of uploads repeating earlier content (default: 0.5)',
+        )
+        parser.add_argument(
+            '--delete-ratio',
+            type=float,
+            default=0.2,
+            help='Fraction of writer operations deleting an earlier upload instead (default: 0.2)',
+        )
+        parser.add_argument(
+            '--profiles',
+            default='default,production',
+            help='Comma-separated SQLITE_PROFILES to compare (default: default,production)',
+        )
+        # Internal: run one writer or reader against an already migrated database
+        parser.add_argument('--worker', choices=['writer', 'reader'], help='Internal')
+        parser.add_argument('--media-root', help='Internal')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self.run_worker(options)
+            return
+
+        profiles = options['profiles'].split(',')
+        unknown = [profile for profile in profiles if profile not in settings.SQLITE_PROFILES]
+        if unknown:
+            raise CommandError(f"Unknown profile(s): {', '.join(unknown)}")
+
+        self.stdout.write(
+            f"{options['writers']} writers, {options['readers']} readers, {options['seconds']:.0f}s, "
+            f"{options['size_kb']}KB uploads, {options['duplicate_ratio']:.0%} duplicates, "
+            f"{options['delete_ratio']:.0%} deletes"
+        )
+        self.stdout.write(f"{'profile':<12} {'writes/s':>10} {'locked':>8} {'reads/s':>9} {'locked':>8}")
+        for profile in profiles:
+            totals = self.run_profile(profile, options)
+            seconds = options['seconds']
+            self.stdout.write(
+                f"{profile:<12} {totals['writer']['ok'] / seconds:>10.1f} {totals['writer']['locked']:>8} "
+                f"{totals['reader']['ok'] / seconds:>9.1f} {totals['reader']['locked']:>8}"
+            )
+
+    def run_profile(self, profile, options):
+        workdir = tempfile.mkdtemp(prefix='bench-sqlite-')
+        env = dict(os.environ, DJANGO_DB_PROFILE=profile, DJANGO_DB_PATH=os.path.join(workdir, 'db.sqlite3'))
+        manage = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py')]
+        try:
+            subprocess.run(manage + ['migrate', '-v', '0'], env=env, check=True)
+            base = manage + [
+                'bench_sqlite_writers',
+                '--seconds', str(options['seconds']),
+                '--size-kb', str(options['size_kb']),
+                '--duplicate-ratio', str(options['duplicate_ratio']),
+                '--delete-ratio', str(options['delete_ratio']),
+                '--media-root', os.path.join(workdir, 'media'),
+            ]
+            workers = [
+                subprocess.Popen(base + ['--worker', role], env=env, stdout=subprocess.PIPE, text=True)
+                for role, count in (('writer', options['writers']), ('reader', options['readers']))
+                for _ in range(count)
+            ]
+            totals = {'writer': {'ok': 0, 'locked': 0}, 'reader': {'ok': 0, 'locked': 0}}
+            for worker in workers:
+                out, _ = worker.communicate()
+                if worker.returncode:
+                    raise CommandError(f'A benchmark worker failed with exit code {worker.returncode}')
+                result = json.loads(out.strip().splitlines()[-1])
+                totals[result['role']]['ok'] += result['ok']
+                totals[result['role']]['locked'] += result['locked']
+            return totals
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def run_worker(self, options):
+        from files.models import File
+        from files.services import delete_files, store_upload
+
+        size = options['size_kb'] * 1024
+        deadline = time.monotonic() + options['seconds']
+        ok = locked = 0
+        seen = []
+        mine = []
+        with override_settings(MEDIA_ROOT=options['media_root']):
+            while time.monotonic() < deadline:
+                try:
+                    if options['worker'] == 'reader':
+                        list(File.objects.order_by('-uploaded_at', '-id')[:100])
+                    elif mine and random.random() < options['delete_ratio']:
+                        # As FileViewSet.destroy
+                        file_record = mine.pop(random.randrange(len(mine)))
+                        delete_files(File.objects.filter(pk=file_record.pk))
+                    else:
+                        if seen and random.random() < options['duplicate_ratio']:
+                            data = random.choice(seen)
+                        else:
+                            data = os.urandom(size)
+                            seen.append(data)
+                        upload = SimpleUploadedFile('bench.bin', data, content_type='application/octet-stream')
+                        file_record, _ = store_upload(
+                            upload, hashlib.sha256(data).hexdigest(), 'bench.bin', upload.content_type
+                        )
+                        mine.append(file_record)
+                    ok += 1
+                except OperationalError as exc:
+                    if 'locked' not in str(exc):
+                        raise
+                    locked += 1
+                    connection.close()
+        self.stdout.write(json.dumps({'role': options['worker'], 'ok': ok, 'locked': locked}))
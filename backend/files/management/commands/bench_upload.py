@@ -0,0 +1,56 @@
+import os
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIClient
+
+from files.views import FileViewSet
+from ._bench import Timer, isolated_environment, read_proc_io
+
+
+class Command(BaseCommand):
+    help = 'Measure disk bytes read and written per uploaded byte for the upload paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='1,16,64',
+            help='Comma-separated upload sizes in MB (default: 1,16,64)',
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.exists('/proc/self/io'):
+            raise CommandError('This benchmark needs /proc/self/io (Linux).')
+
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        modes = [
+            # Django's disk spooling followed by a hashing pass and a storage copy
+            ('legacy', [TemporaryFileUploadHandler]),
+            # Hash while spooling into the content store, then rename
+            ('streaming', FileViewSet.upload_handler_classes),
+        ]
+
+        self.stdout.write(f"{'mode':<10} {'size':>8} {'read/byte':>10} {'write/byte':>11} {'MB/s':>8}")
+        with isolated_environment():
+            client = APIClient()
+            for size_mb in sizes:
+                size = size_mb * 1024 * 1024
+                for mode, handlers in modes:
+                    # Fresh random content so every upload takes the new-content path
+                    upload = SimpleUploadedFile('bench.bin', os.urandom(size))
+                    with mock.patch.object(FileViewSet, 'upload_handler_classes', handlers):
+                        read_before, written_before = read_proc_io()
+                        with Timer() as timer:
+                            resp = client.post('/api/files/', {'file': upload}, format='multipart')
+                        read_after, written_after = read_proc_io()
+                    if resp.status_code != 201:
+                        raise CommandError(f'Upload failed with HTTP {resp.status_code}')
+
+                    self.stdout.write(
+                        f'{mode:<10} {size_mb:>6}MB '
+                        f'{(read_after - read_before) / size:>10.2f} '
+                        f'{(written_after - written_before) / size:>11.2f} '
+                        f'{size_mb / timer.elapsed:>8.1f}'
+                    )
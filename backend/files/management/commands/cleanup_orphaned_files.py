@@ -1,9 +1,13 @@
-from django.core.management.base import BaseCommand
-from files.models import FileContent
+from django.core.management.base import BaseCommand, CommandError
+
+from files.gc import GC_BATCH_SIZE, GC_GRACE_SECONDS, GC_WORKERS, GarbageCollector
 
 
 class Command(BaseCommand):
-    help = 'Clean up orphaned FileContent records with no references'
+    help = (
+        'Mark-and-sweep the content and chunk stores: delete blobs no row refers to '
+        'and FileContent records no file refers to'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -11,55 +15,75 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be deleted without actually deleting',
         )
+        parser.add_argument(
+            '--grace-minutes',
+            type=float,
+            default=GC_GRACE_SECONDS / 60,
+            help=f'Leave blobs and records younger than this alone (default: {GC_GRACE_SECONDS // 60})',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=GC_BATCH_SIZE,
+            help=f'Records per query and blobs per deletion batch (default: {GC_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=GC_WORKERS,
+            help=f'Threads deleting blobs (default: {GC_WORKERS})',
+        )
+        parser.add_argument(
+            '--progress-interval',
+            type=float,
+            default=10,
+            help='Seconds between progress lines (default: 10)',
+        )
 
     def handle(self, *args, **options):
-        dry_run = options['dry_run']
-
-        # Find FileContent records with reference_count = 0 or no File references
-        orphaned_by_count = FileContent.objects.filter(reference_count=0)
-        orphaned_by_relation = FileContent.objects.filter(files__isnull=True)
-
-        # Combine and get distinct records
-        orphaned = (orphaned_by_count | orphaned_by_relation).distinct()
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be at least 1')
+        try:
+            collector = GarbageCollector(
+                grace_seconds=options['grace_minutes'] * 60,
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                dry_run=options['dry_run'],
+                progress=self.report_progress,
+                progress_interval=options['progress_interval'],
+            )
+        except NotImplementedError:
+            raise CommandError('Garbage collection needs a storage backend with local paths')
 
-        count = orphaned.count()
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('DRY RUN: nothing will be deleted'))
+        stats = collector.run()
+        self.report_progress(stats)
 
-        if count == 0:
+        found = stats['orphan_blobs'] + stats['orphan_contents'] + stats['temp_files_deleted']
+        if stats['missing_blobs']:
+            self.stdout.write(self.style.WARNING(
+                f"{stats['missing_blobs']} records refer to blobs that are not on disk"
+            ))
+        if not found:
             self.stdout.write(self.style.SUCCESS('No orphaned files found.'))
-            return
-
-        if dry_run:
-            self.stdout.write(
-                self.style.WARNING(
-                    f'DRY RUN: Would delete {count} orphaned FileContent records:'
-                )
-            )
-            for fc in orphaned:
-                self.stdout.write(f'  - {fc.content_hash[:16]}... ({fc.size} bytes, refs: {fc.reference_count})')
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f"DRY RUN: Would delete {stats['orphan_blobs']} orphaned blobs, "
+                f"{stats['orphan_contents']} orphaned FileContent records and "
+                f"{stats['temp_files_deleted']} stale temporary files"
+            ))
         else:
-            self.stdout.write(
-                self.style.WARNING(
-                    f'Deleting {count} orphaned FileContent records...'
-                )
-            )
-
-            deleted_count = 0
-            for fc in orphaned:
-                hash_preview = fc.content_hash[:16]
-                size = fc.size
+            self.stdout.write(self.style.SUCCESS(
+                f"Successfully deleted {stats['blobs_deleted']} orphaned blobs "
+                f"({stats['bytes_deleted']} bytes), {stats['contents_deleted']} orphaned FileContent "
+                f"records and {stats['temp_files_deleted']} stale temporary files"
+            ))
 
-                # Delete physical file
-                if fc.file:
-                    fc.file.delete(save=False)
-
-                # Delete database record
-                fc.delete()
-                deleted_count += 1
-
-                self.stdout.write(f'  Deleted {hash_preview}... ({size} bytes)')
-
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'Successfully cleaned up {deleted_count} orphaned files.'
-                )
-            )
+    def report_progress(self, stats):
+        elapsed = max(stats['elapsed'], 1e-9)
+        self.stdout.write(
+            f"  {stats['blobs_scanned']} blobs and {stats['rows_scanned']} records scanned "
+            f"in {stats['elapsed']:.1f}s ({(stats['blobs_scanned'] + stats['rows_scanned']) / elapsed:.0f}/s), "
+            f"{stats['blobs_deleted']} blobs deleted"
+        )
@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from files import chunk_store
+from files.models import ChunkedUpload
+
+
+class Command(BaseCommand):
+    help = 'Remove chunked uploads that have not received a chunk recently'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=24,
+            help='Age in hours after which an idle upload is abandoned (default: 24)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be deleted without actually deleting',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        stale = ChunkedUpload.objects.filter(updated_at__lt=cutoff)
+
+        count = stale.count()
+        if count == 0:
+            self.stdout.write(self.style.SUCCESS('No stale uploads found.'))
+            return
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'DRY RUN: Would remove {count} stale uploads:'))
+            for upload in stale:
+                self.stdout.write(f'  - {upload.upload_id} ({upload.received_bytes} bytes staged)')
+            return
+
+        for upload in stale:
+            chunk_store.discard(upload.upload_id)
+            upload.delete()
+            self.stdout.write(f'  Removed {upload.upload_id} ({upload.received_bytes} bytes staged)')
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully removed {count} stale uploads.'))
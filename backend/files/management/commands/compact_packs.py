@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from files.packs import compact_pack, current_pack, pack_usage
+
+
+class Command(BaseCommand):
+    help = 'Rewrite pack files whose content has mostly been released, reclaiming the dead bytes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-dead-ratio',
+            type=float,
+            default=0.5,
+            help='Compact packs with at least this fraction of dead bytes (default: 0.5)',
+        )
+        parser.add_argument(
+            '--grace-minutes',
+            type=float,
+            default=60,
+            help='Leave packs written to more recently than this alone (default: 60)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be compacted without actually compacting',
+        )
+
+    def handle(self, *args, **options):
+        grace_seconds = options['grace_minutes'] * 60
+        cutoff = time.time() - grace_seconds
+        current = current_pack()
+        candidates = [
+            pack for pack in pack_usage()
+            if pack['name'] != current and pack['mtime'] < cutoff
+            and pack['size'] and (pack['size'] - pack['live']) / pack['size'] >= options['min_dead_ratio']
+        ]
+        if not candidates:
+            self.stdout.write(self.style.SUCCESS('No packs need compacting.'))
+            return
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'DRY RUN: Would compact {len(candidates)} packs:'))
+            for pack in candidates:
+                self.stdout.write(
+                    f"  - {pack['name']} ({pack['size']} bytes, {pack['live']} live in {pack['count']} blobs)"
+                )
+            return
+
+        compacted = moved = reclaimed = 0
+        for pack in candidates:
+            result = compact_pack(pack['name'], grace_seconds)
+            if result is None:
+                continue
+            compacted += 1
+            moved += result[0]
+            reclaimed += result[1]
+            self.stdout.write(f"  Compacted {pack['name']}: moved {result[0]} blobs, reclaimed {result[1]} bytes")
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully compacted {compacted} packs, moving {moved} blobs and reclaiming {reclaimed} bytes.'
+        ))
@@ -0,0 +1,92 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from files.fsck import CHECKS, FSCK_BATCH_SIZE, check_counts
+from files.management.checkpoint import CheckpointMixin
+
+
+class Command(CheckpointMixin, BaseCommand):
+    help = (
+        'Compare stored reference counts of contents and chunks with the actual number of '
+        'references, optionally verifying blobs and repairing drift'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Set drifted reference counts to the actual count',
+        )
+        parser.add_argument(
+            '--verify-blobs',
+            action='store_true',
+            help='Also check that every blob exists and has the recorded size',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=FSCK_BATCH_SIZE,
+            help=f'Rows per hash range (default: {FSCK_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording progress; an interrupted run given the same file resumes where it stopped',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        checkpoint = options['checkpoint']
+        position = self.load_checkpoint(checkpoint)
+        if position:
+            self.stdout.write(f"Resuming {position['check']} after {position['after']}")
+
+        totals = {'checked': 0, 'drift': 0, 'repaired': 0, 'missing': 0, 'size_mismatch': 0}
+        started = time.monotonic()
+        names = [name for name, *_ in CHECKS]
+        for name, model, references, size_fields, packed in CHECKS:
+            after = None
+            if position:
+                if names.index(name) < names.index(position['check']):
+                    continue
+                if name == position['check']:
+                    after = position['after']
+            for result in check_counts(
+                model, references, size_fields, packed,
+                after=after,
+                batch_size=options['batch_size'],
+                verify_blobs=options['verify_blobs'],
+                repair=options['repair'],
+            ):
+                self.report(name, result)
+                for key in totals:
+                    totals[key] += result[key] if key in ('checked', 'repaired') else len(result[key])
+                self.save_checkpoint(checkpoint, {'check': name, 'after': result['last']})
+        self.clear_checkpoint(checkpoint)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"Checked {totals['checked']} records in {elapsed:.1f}s "
+            f"({totals['checked'] / max(elapsed, 1e-9):.0f}/s)"
+        )
+        problems = totals['drift'] + totals['missing'] + totals['size_mismatch']
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('No problems found.'))
+            return
+        summary = (
+            f"{totals['drift']} drifted reference counts ({totals['repaired']} repaired), "
+            f"{totals['missing']} missing blobs, {totals['size_mismatch']} blobs of the wrong size"
+        )
+        if totals['drift'] == totals['repaired'] and not totals['missing'] and not totals['size_mismatch']:
+            self.stdout.write(self.style.SUCCESS(summary))
+        else:
+            self.stdout.write(self.style.WARNING(summary))
+
+    def report(self, name, result):
+        for pk, stored, actual in result['drift']:
+            self.stdout.write(f'  {name} {pk[:16]}... reference_count {stored}, actually {actual}')
+        for blob in result['missing']:
+            self.stdout.write(f'  {name} {blob} is missing')
+        for blob, expected, actual in result['size_mismatch']:
+            self.stdout.write(f'  {name} {blob} is {actual} bytes, expected {expected}')
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import statistics
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Upload from many concurrent, optionally slow, clients against a running server '
+        'to compare the WSGI and async upload paths'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Server base URL')
+        parser.add_argument(
+            '--mode',
+            choices=['async', 'wsgi'],
+            default='async',
+            help='async: raw body to /api/async/files/; wsgi: multipart to /api/files/',
+        )
+        parser.add_argument('--clients', type=int, default=100, help='Concurrent clients (default: 100)')
+        parser.add_argument('--size-kb', type=int, default=256, help='Upload size per client in KB (default: 256)')
+        parser.add_argument(
+            '--rate-kbps',
+            type=int,
+            default=0,
+            help='Throttle each client to this many KB/s to simulate slow links (default: unthrottled)',
+        )
+        parser.add_argument('--timeout', type=float, default=120, help='Per-request timeout in seconds')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('--url must be a plain http:// URL')
+
+        results = asyncio.run(self.run_clients(url.hostname, url.port or 80, options))
+        latencies = sorted(latency for ok, latency in results['requests'] if ok)
+        failed = sum(1 for ok, _ in results['requests'] if not ok)
+
+        self.stdout.write(f"mode:        {options['mode']}")
+        self.stdout.write(f"clients:     {options['clients']} x {options['size_kb']}KB"
+                          f"{' at %dKB/s' % options['rate_kbps'] if options['rate_kbps'] else ''}")
+        self.stdout.write(f"wall time:   {results['elapsed']:.2f}s")
+        self.stdout.write(f"uploads/s:   {len(latencies) / results['elapsed']:.1f}")
+        if latencies:
+            self.stdout.write(
+                f'latency:     p50 {statistics.median(latencies):.2f}s  '
+                f'p95 {latencies[int(len(latencies) * 0.95) - 1 if len(latencies) > 1 else 0]:.2f}s  '
+                f'max {latencies[-1]:.2f}s'
+            )
+        message = f'{len(latencies)} succeeded, {failed} failed'
+        self.stdout.write(self.style.SUCCESS(message) if not failed else self.style.WARNING(message))
+
+    async def run_clients(self, host, port, options):
+        start = time.perf_counter()
+        requests = await asyncio.gather(*[
+            self.upload(host, port, options) for _ in range(options['clients'])
+        ])
+        return {'requests': requests, 'elapsed': time.perf_counter() - start}
+
+    async def upload(self, host, port, options):
+        """Send one upload; return (succeeded, seconds)."""
+        # Fresh random content so every upload takes the new-content path
+        data = os.urandom(options['size_kb'] * 1024)
+        filename = f'load-{uuid.uuid4().hex}.bin'
+        if options['mode'] == 'async':
+            path = f'/api/async/files/?filename={filename}'
+            content_type = 'application/octet-stream'
+            body = data
+        else:
+            boundary = uuid.uuid4().hex
+            path = '/api/files/'
+            content_type = f'multipart/form-data; boundary={boundary}'
+            body = (
+                f'--{boundary}\r\n'
+                f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                f'Content-Type: application/octet-stream\r\n\r\n'
+            ).encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+
+        head = (
+            f'POST {path} HTTP/1.1\r\n'
+            f'Host: {host}:{port}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: close\r\n\r\n'
+        ).encode()
+
+        start = time.perf_counter()
+        try:
+            status = await asyncio.wait_for(
+                self.exchange(host, port, head, body, options['rate_kbps']),
+                options['timeout'],
+            )
+        except (OSError, asyncio.TimeoutError):
+            return False, time.perf_counter() - start
+        return status == 201, time.perf_counter() - start
+
+    async def exchange(self, host, port, head, body, rate_kbps):
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            writer.write(head)
+            if rate_kbps:
+                # Trickle the body out in 10 pieces per second
+                piece = max(1, rate_kbps * 1024 // 10)
+                for offset in range(0, len(body), piece):
+                    writer.write(body[offset:offset + piece])
+                    await writer.drain()
+                    await asyncio.sleep(0.1)
+            else:
+                writer.write(body)
+            await writer.drain()
+            status_line = await reader.readline()
+            await reader.read()
+        finally:
+            writer.close()
+        parts = status_line.split()
+        return int(parts[1]) if len(parts) > 1 else 0
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from files.events import process_batch, queue_metrics
+
+
+class Command(BaseCommand):
+    help = 'Apply queued deduplication events and summary updates (FILES_EVENT_QUEUE_ENABLED)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Jobs applied per transaction')
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the queue is empty (default: 1)',
+        )
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+        parser.add_argument('--stats', action='store_true', help='Print queue depth and lag and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self._write_metrics()
+            return
+
+        batch_size = options['batch_size']
+        applied = 0
+        isolate = False
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    # After a failure, go one job at a time so a bad job cannot hold up the rest
+                    count = process_batch(1 if isolate else batch_size)
+                    isolate = False
+                except Exception as exc:
+                    self.stderr.write(self.style.WARNING(f'Batch failed, retrying jobs singly: {exc!r}'))
+                    isolate = True
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                if count:
+                    applied += count
+                    metrics = queue_metrics()
+                    self.stdout.write(
+                        f"  applied {count} (pending {metrics['pending']}, lag {metrics['lag_seconds']:.1f}s)"
+                    )
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Applied {applied} queued events.'))
+        self._write_metrics()
+
+    def _write_metrics(self):
+        metrics = queue_metrics()
+        style = self.style.WARNING if metrics['failed'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"Queue depth: {metrics['pending']} pending, {metrics['failed']} failed; "
+            f"lag: {metrics['lag_seconds']:.1f}s"
+        ))
@@ -0,0 +1,74 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from files.models import FileContent
+from files.presence import PresenceFilter, build_filter, filter_size
+
+
+class Command(BaseCommand):
+    help = 'Build the shared presence filter of content hashes from the FileContent table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--capacity',
+            type=int,
+            help=(
+                'Number of hashes to size the filter for (default: twice the current number of '
+                'contents, at least FILES_PRESENCE_FILTER_CAPACITY)'
+            ),
+        )
+        parser.add_argument(
+            '--fp-rate',
+            type=float,
+            default=settings.FILES_PRESENCE_FILTER_FP_RATE,
+            help=f'False-positive rate at capacity (default: {settings.FILES_PRESENCE_FILTER_FP_RATE})',
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Report on the current filter without rebuilding it',
+        )
+
+    def handle(self, *args, **options):
+        path = settings.FILES_PRESENCE_FILTER_PATH
+        if options['stats']:
+            if not os.path.exists(path):
+                raise CommandError(f'No presence filter at {path}')
+            self.report(PresenceFilter.open(path))
+            return
+
+        if not 0 < options['fp_rate'] < 1:
+            raise CommandError('--fp-rate must be between 0 and 1')
+        count = FileContent.objects.count()
+        capacity = options['capacity'] or max(settings.FILES_PRESENCE_FILTER_CAPACITY, 2 * count)
+        num_bits, num_hashes = filter_size(capacity, options['fp_rate'])
+        self.stdout.write(
+            f'Building a filter for {capacity} hashes: {num_bits // 8} bytes, {num_hashes} hash functions'
+        )
+
+        started = timezone.now()
+        timer = time.monotonic()
+        hashes = FileContent.objects.order_by().values_list('content_hash', flat=True).iterator(chunk_size=10_000)
+        presence, added = build_filter(path, hashes, capacity, options['fp_rate'])
+        # Content created during the scan may have gone into the old file only
+        late = FileContent.objects.filter(created_at__gte=started - timedelta(seconds=1))
+        for content_hash in late.values_list('content_hash', flat=True):
+            presence.add(content_hash)
+
+        self.report(presence)
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully built the presence filter from {added} contents in '
+            f'{time.monotonic() - timer:.1f}s at {path}'
+        ))
+
+    def report(self, presence):
+        self.stdout.write(
+            f'Capacity {presence.capacity}, {presence.num_bits // 8} bytes, {presence.num_hashes} hash functions, '
+            f'{presence.fill_ratio():.1%} of bits set, estimated false-positive rate '
+            f'{presence.estimated_fp_rate():.4%}'
+        )
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from files.models import StorageSavingsSummary
+
+
+class Command(BaseCommand):
+    help = 'Rebuild storage savings summaries and their counters from DeduplicationEvent records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recalculate every stored summary instead of only the current week and year',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show which summaries would be recalculated without changing them',
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            summaries = list(StorageSavingsSummary.objects.all())
+        else:
+            summaries = StorageSavingsSummary._current_summaries()
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'DRY RUN: Would recalculate {len(summaries)} summaries:'))
+            for summary in summaries:
+                self.stdout.write(f'  - {summary.period_start} to {summary.period_end}')
+            return
+
+        for summary in summaries:
+            before = (summary.total_duplicates_detected, summary.unique_files_shared)
+            summary.recalculate()
+            after = (summary.total_duplicates_detected, summary.unique_files_shared)
+            note = '' if before == after else f' (was {before[0]} duplicates, {before[1]} shared)'
+            self.stdout.write(
+                f'  {summary.period_start} to {summary.period_end}: '
+                f'{after[0]} duplicates, {after[1]} shared{note}'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Recalculated {len(summaries)} summaries.'))
@@ -0,0 +1,117 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from files.models import ChunkSignature, ContentChunkRef, DeduplicationEvent, File, FileContent, SimilarityFeature
+from files.storage import link_blob
+from files.utils import HASH_ALGORITHMS, new_hasher, READ_BUFFER_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Re-key existing FileContent under a different hash algorithm'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--algorithm',
+            required=True,
+            choices=sorted(HASH_ALGORITHMS),
+            help='Algorithm to convert content to',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Stop after converting this many contents (the command can be re-run)',
+        )
+
+    def handle(self, *args, **options):
+        algorithm = options['algorithm']
+        pending = FileContent.objects.exclude(hash_algorithm=algorithm).order_by('content_hash')
+        if options['limit']:
+            pending = pending[:options['limit']]
+
+        converted = merged = 0
+        # Rows are re-keyed as we go, so iterate over a snapshot of the keys
+        for content_hash in list(pending.values_list('content_hash', flat=True)):
+            file_content = FileContent.objects.filter(pk=content_hash).first()
+            if file_content is None:
+                continue
+            new_hash = self._hash_content(file_content, algorithm)
+            if self._rekey(file_content, new_hash, algorithm):
+                merged += 1
+            converted += 1
+            self.stdout.write(f'  {content_hash[:16]}... -> {new_hash[:16]}...')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Converted {converted} contents to {algorithm} ({merged} merged into existing content).'
+            )
+        )
+
+    def _hash_content(self, file_content, algorithm):
+        hasher = new_hasher(algorithm)
+        with file_content.open_stream() as stream:
+            while True:
+                data = stream.read(READ_BUFFER_SIZE)
+                if not data:
+                    break
+                hasher.update(data)
+        return hasher.hexdigest()
+
+    def _rekey(self, old, new_hash, algorithm):
+        """
+        Move every reference from old to a FileContent keyed by new_hash.
+
+        Returns True if content with new_hash already existed and old was
+        merged into it.
+        """
+        storage = old.file.storage
+        linked_path = None
+        with transaction.atomic():
+            target = FileContent.objects.select_for_update().filter(pk=new_hash).first()
+            merged = target is not None
+            if not merged:
+                target = FileContent.objects.create(
+                    content_hash=new_hash,
+                    hash_algorithm=algorithm,
+                    size=old.size,
+                    reference_count=0,
+                    storage_format=old.storage_format,
+                    chunk_bytes_saved=old.chunk_bytes_saved,
+                    codec=old.codec,
+                    stored_size=old.stored_size,
+                    pack=old.pack,
+                    pack_offset=old.pack_offset,
+                    delta_base_id=old.delta_base_id,
+                    delta_depth=old.delta_depth,
+                )
+                if old.file.name:
+                    target.file.name = target.file.field.generate_filename(target, new_hash)
+                    try:
+                        link_blob(storage, old.file.name, target.file.name)
+                    except OSError as exc:
+                        raise CommandError(f'Could not link {old.file.name} to {target.file.name}: {exc}')
+                    linked_path = target.file.name
+                    target.save(update_fields=['file'])
+                ContentChunkRef.objects.filter(file_content=old).update(file_content=target)
+                SimilarityFeature.objects.filter(file_content=old).update(file_content=target)
+                ChunkSignature.objects.filter(file_content=old).update(file_content=target)
+                if old.is_delta:
+                    # The base reference moves to target along with the delta
+                    FileContent.objects.filter(pk=old.pk).update(delta_base=None, storage_format=old.FORMAT_FILE)
+                    old.storage_format = old.FORMAT_FILE
+
+            File.objects.filter(file_content=old).update(file_content=target)
+            FileContent.objects.filter(delta_base=old).update(delta_base=target)
+            DeduplicationEvent.objects.filter(file_content=old).update(file_content=target)
+            FileContent.objects.filter(pk=target.pk).update(
+                reference_count=F('reference_count') + old.reference_count
+            )
+            if merged or linked_path is None:
+                # The old row's bytes are no longer referenced by anything
+                old.delete_stored_content()
+            else:
+                # The blob now lives at the new path; only drop the old name
+                FileContent.objects.filter(pk=old.pk).delete()
+                transaction.on_commit(lambda: storage.delete(old.file.name))
+        return merged
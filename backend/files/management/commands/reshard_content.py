@@ -0,0 +1,196 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, CharField, Value, When
+
+from files.management.checkpoint import CheckpointMixin
+from files.models import ContentChunk, FileContent, chunk_blob_name, content_blob_name
+from files.storage import MAX_SHARD_DEPTH, link_blob, touch_blob
+
+
+def stored_content_name(content_hash, codec, storage_format, depth):
+    return content_blob_name(content_hash, codec, depth, delta=storage_format == FileContent.FORMAT_DELTA)
+
+
+# (name, model, fields after the primary key, storage name of a row given those fields and a depth)
+STORES = [
+    ('content', FileContent, ('file', 'codec', 'storage_format'), stored_content_name),
+    ('chunks', ContentChunk, ('file',), chunk_blob_name),
+]
+
+
+class Command(CheckpointMixin, BaseCommand):
+    help = (
+        'Move content and chunk blobs into the shard layout of FILES_CONTENT_SHARD_DEPTH '
+        'while the site keeps running'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--depth',
+            type=int,
+            default=None,
+            help='Shard levels to move blobs into (default: FILES_CONTENT_SHARD_DEPTH)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Blobs moved per transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Threads linking and removing blobs (default: 4)',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording progress; an interrupted run given the same file resumes where it stopped',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count the blobs that would move without moving them',
+        )
+
+    def handle(self, *args, **options):
+        depth = settings.FILES_CONTENT_SHARD_DEPTH if options['depth'] is None else options['depth']
+        if not 0 <= depth <= MAX_SHARD_DEPTH:
+            raise CommandError(f'--depth must be between 0 and {MAX_SHARD_DEPTH}')
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be at least 1')
+        self.storage = FileContent._meta.get_field('file').storage
+        if not isinstance(self.storage, FileSystemStorage):
+            raise CommandError('Resharding needs a storage backend with local paths')
+        if depth != settings.FILES_CONTENT_SHARD_DEPTH:
+            self.stdout.write(self.style.WARNING(
+                f'FILES_CONTENT_SHARD_DEPTH is {settings.FILES_CONTENT_SHARD_DEPTH}: '
+                f'new uploads will keep using that layout'
+            ))
+
+        checkpoint = options['checkpoint']
+        position = self.load_checkpoint(checkpoint)
+        if position:
+            self.stdout.write(f"Resuming {position['store']} after {position['after']}")
+
+        totals = {'checked': 0, 'moved': 0, 'missing': 0}
+        self.started = self.last_report = time.monotonic()
+        names = [name for name, *_ in STORES]
+        with ThreadPoolExecutor(max_workers=options['workers']) as self.pool:
+            for name, model, fields, target_name in STORES:
+                after = None
+                if position:
+                    if names.index(name) < names.index(position['store']):
+                        continue
+                    if name == position['store']:
+                        after = position['after']
+                while True:
+                    queryset = model.objects.order_by('pk')
+                    if after is not None:
+                        queryset = queryset.filter(pk__gt=after)
+                    rows = list(queryset.values_list('pk', *fields)[:options['batch_size']])
+                    if not rows:
+                        break
+                    moves = [
+                        (pk, old_name, target_name(pk, *rest, depth))
+                        for pk, old_name, *rest in rows
+                        if old_name and old_name != target_name(pk, *rest, depth)
+                    ]
+                    totals['checked'] += len(rows)
+                    if options['dry_run']:
+                        totals['moved'] += len(moves)
+                    elif moves:
+                        moved, missing = self.move_batch(model, moves)
+                        totals['moved'] += moved
+                        totals['missing'] += missing
+                    after = rows[-1][0]
+                    self.save_checkpoint(checkpoint, {'store': name, 'after': after})
+                    self.report_progress(totals)
+                    if len(rows) < options['batch_size']:
+                        break
+        self.clear_checkpoint(checkpoint)
+
+        if totals['missing']:
+            self.stdout.write(self.style.WARNING(
+                f"{totals['missing']} blobs were missing and left where their records point"
+            ))
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f"DRY RUN: Would move {totals['moved']} of {totals['checked']} blobs to depth {depth}"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Moved {totals['moved']} of {totals['checked']} blobs to depth {depth} "
+                f"in {time.monotonic() - self.started:.1f}s"
+            ))
+
+    def move_batch(self, model, moves):
+        """
+        Move one batch of blobs to their new names.
+
+        Each blob is hard-linked at its new name first, so it is readable
+        under both until the rows are switched in one transaction; only then
+        is the old name removed. Rows that were deleted or changed meanwhile
+        keep their blob where it was.
+
+        Returns:
+            Tuple of (moved, missing)
+        """
+        linked = [move for move, ok in zip(moves, self.pool.map(self.link, moves)) if ok]
+        with transaction.atomic():
+            current = dict(model.objects.filter(pk__in=[pk for pk, _, _ in linked]).values_list('pk', 'file'))
+            switched = [(pk, old, new) for pk, old, new in linked if current.get(pk) == old]
+            if switched:
+                model.objects.filter(pk__in=[pk for pk, _, _ in switched]).update(file=Case(
+                    *[When(pk=pk, then=Value(new)) for pk, _, new in switched],
+                    output_field=CharField()
+                ))
+        # Readers that still hold an old name fall back to the new layout (storage.open_blob)
+        leftovers = []
+        for pk, old, new in linked:
+            if current.get(pk) == old:
+                leftovers.append(old)
+            elif current.get(pk) != new:
+                # The row went away or moved elsewhere meanwhile: drop our link
+                leftovers.append(new)
+        list(self.pool.map(self.unlink, leftovers))
+        return len(switched), len(moves) - len(linked)
+
+    def link(self, move):
+        _, old_name, new_name = move
+        try:
+            link_blob(self.storage, old_name, new_name)
+        except FileNotFoundError:
+            return False
+        # Both names share the inode: a fresh mtime keeps the GC off the new one until it is switched
+        touch_blob(self.storage.path(new_name))
+        return True
+
+    def unlink(self, name):
+        path = self.storage.path(name)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        try:
+            # Leave no empty shard directories behind when moving to a shallower layout
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            pass
+
+    def report_progress(self, totals):
+        now = time.monotonic()
+        if now - self.last_report < 10:
+            return
+        self.last_report = now
+        elapsed = now - self.started
+        self.stdout.write(
+            f"  {totals['checked']} checked, {totals['moved']} moved in {elapsed:.1f}s "
+            f"({totals['checked'] / elapsed:.0f}/s)"
+        )
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0003_alter_storagesavingssummary_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkedUpload',
+            fields=[
+                ('upload_id', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('original_filename', models.CharField(max_length=255)),
+                ('file_type', models.CharField(max_length=100)),
+                ('total_chunks', models.IntegerField()),
+                ('received_chunks', models.IntegerField(default=0)),
+                ('received_bytes', models.BigIntegerField(default=0)),
+                ('is_assembling', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
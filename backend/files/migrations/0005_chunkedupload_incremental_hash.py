@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0004_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='hashed_bytes',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='next_chunk_index',
+            field=models.IntegerField(default=0),
+        ),
+    ]
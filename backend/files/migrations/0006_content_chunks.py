@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+import files.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0005_chunkedupload_incremental_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentChunk',
+            fields=[
+                ('chunk_hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('file', models.FileField(upload_to=files.models.chunk_upload_path)),
+                ('size', models.IntegerField()),
+                ('reference_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='filecontent',
+            name='chunk_bytes_saved',
+            field=models.BigIntegerField(default=0, help_text='Bytes of this content stored in chunks that already existed'),
+        ),
+        migrations.AddField(
+            model_name='filecontent',
+            name='storage_format',
+            field=models.CharField(choices=[('file', 'Single file'), ('chunked', 'Content-defined chunks')], default='file', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='storagesavingssummary',
+            name='total_chunk_bytes_saved',
+            field=models.BigIntegerField(default=0, help_text='Bytes saved by sharing chunks between non-identical files'),
+        ),
+        migrations.AlterField(
+            model_name='filecontent',
+            name='file',
+            field=models.FileField(blank=True, upload_to=files.models.content_upload_path),
+        ),
+        migrations.CreateModel(
+            name='ContentChunkRef',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField(help_text='Index of the chunk within the content')),
+                ('offset', models.BigIntegerField(help_text='Byte offset of the chunk within the content')),
+                ('chunk', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='refs', to='files.contentchunk')),
+                ('file_content', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunk_refs', to='files.filecontent')),
+            ],
+            options={
+                'ordering': ['file_content', 'position'],
+                'indexes': [models.Index(fields=['file_content', 'offset'], name='files_conte_file_co_8aa4f9_idx')],
+                'unique_together': {('file_content', 'position')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0006_content_chunks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='hash_algorithm',
+            field=models.CharField(default='sha256', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='filecontent',
+            name='hash_algorithm',
+            field=models.CharField(default='sha256', max_length=16),
+        ),
+    ]
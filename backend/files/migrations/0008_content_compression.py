@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0007_hash_algorithm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filecontent',
+            name='codec',
+            field=models.CharField(blank=True, choices=[('', 'Uncompressed'), ('gzip', 'gzip'), ('xz', 'xz')], default='', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='filecontent',
+            name='stored_size',
+            field=models.BigIntegerField(blank=True, help_text='Size of the compressed blob in bytes; null when stored uncompressed', null=True),
+        ),
+        migrations.AddField(
+            model_name='storagesavingssummary',
+            name='total_compression_bytes_saved',
+            field=models.BigIntegerField(default=0, help_text='Bytes saved by compressing stored content'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_counters(apps, schema_editor):
+    """Build the counters of existing summaries from their events"""
+    from django.db.models import Count
+
+    StorageSavingsSummary = apps.get_model('files', 'StorageSavingsSummary')
+    SummaryTypeCount = apps.get_model('files', 'SummaryTypeCount')
+    SummarySharedContent = apps.get_model('files', 'SummarySharedContent')
+    DeduplicationEvent = apps.get_model('files', 'DeduplicationEvent')
+
+    for summary in StorageSavingsSummary.objects.all():
+        events = DeduplicationEvent.objects.filter(
+            detected_at__date__gte=summary.period_start,
+            detected_at__date__lte=summary.period_end
+        ).order_by()
+        SummaryTypeCount.objects.bulk_create([
+            SummaryTypeCount(summary=summary, file_type=row['file_type'], duplicates=row['count'])
+            for row in events.values('file_type').annotate(count=Count('id'))
+        ])
+        SummarySharedContent.objects.bulk_create([
+            SummarySharedContent(summary=summary, content_hash=content_hash)
+            for content_hash in events.values_list('file_content', flat=True).distinct()
+        ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0008_content_compression'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SummaryTypeCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_type', models.CharField(max_length=100)),
+                ('duplicates', models.IntegerField(default=0)),
+                ('summary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='type_counts', to='files.storagesavingssummary')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['summary', '-duplicates'], name='files_summa_summary_0dd880_idx')],
+                'unique_together': {('summary', 'file_type')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SummarySharedContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('summary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shared_contents', to='files.storagesavingssummary')),
+            ],
+            options={
+                'unique_together': {('summary', 'content_hash')},
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
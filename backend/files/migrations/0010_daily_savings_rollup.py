@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0009_incremental_summary_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySavingsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('file_type', models.CharField(max_length=100)),
+                ('duplicates', models.IntegerField(default=0)),
+                ('bytes_saved', models.BigIntegerField(default=0)),
+                ('distinct_contents', models.IntegerField(default=0, help_text='Distinct contents duplicated with this type on this day')),
+            ],
+            options={
+                'ordering': ['day', 'file_type'],
+                'unique_together': {('day', 'file_type')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRollupContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('file_type', models.CharField(max_length=100)),
+                ('content_hash', models.CharField(max_length=64)),
+            ],
+            options={
+                'unique_together': {('day', 'file_type', 'content_hash')},
+            },
+        ),
+    ]
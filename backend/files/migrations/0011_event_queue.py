@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0010_daily_savings_rollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deduplicationevent',
+            name='detected_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='EventJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_by', models.CharField(blank=True, max_length=64, null=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['claimed_at', 'id'], name='files_event_claimed_2705d3_idx')],
+            },
+        ),
+    ]
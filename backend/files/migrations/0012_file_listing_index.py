@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0011_event_queue'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='file',
+            options={'ordering': ['-uploaded_at', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='file_uploaded_id_idx'),
+        ),
+    ]
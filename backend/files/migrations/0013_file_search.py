@@ -0,0 +1,52 @@
+from django.db import migrations, models
+
+
+def backfill_sizes(apps, schema_editor):
+    """Copy each file's content size onto the file"""
+    from django.db.models import OuterRef, Subquery
+
+    File = apps.get_model('files', 'File')
+    FileContent = apps.get_model('files', 'FileContent')
+    File.objects.update(size=Subquery(
+        FileContent.objects.filter(pk=OuterRef('file_content')).values('size')[:1]
+    ))
+
+
+def install_filename_index(apps, schema_editor):
+    from files.search import ensure_filename_index
+
+    ensure_filename_index(schema_editor.connection)
+
+
+def remove_filename_index(apps, schema_editor):
+    from files.search import drop_filename_index
+
+    drop_filename_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0012_file_listing_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='size',
+            field=models.BigIntegerField(
+                default=0, help_text='Size of the content in bytes, copied from FileContent for filtering'
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_sizes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['file_type', '-uploaded_at', '-id'], name='file_type_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['size'], name='file_size_idx'),
+        ),
+        migrations.RunPython(install_filename_index, remove_filename_index),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0013_file_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filecontent',
+            name='pack',
+            field=models.CharField(blank=True, default='', help_text='Pack file holding the content, for packed storage', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='filecontent',
+            name='pack_offset',
+            field=models.BigIntegerField(blank=True, help_text='Byte offset of the content in its pack', null=True),
+        ),
+        migrations.AlterField(
+            model_name='filecontent',
+            name='storage_format',
+            field=models.CharField(choices=[('file', 'Single file'), ('chunked', 'Content-defined chunks'), ('packed', 'Pack file')], default='file', max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='filecontent',
+            index=models.Index(condition=models.Q(('pack', ''), _negated=True), fields=['pack', 'pack_offset'], name='filecontent_pack_idx'),
+        ),
+    ]
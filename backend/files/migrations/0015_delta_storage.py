@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0014_file_content_packs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filecontent',
+            name='delta_base',
+            field=models.ForeignKey(blank=True, help_text='Content this delta is applied to; holds one of its references', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='deltas', to='files.filecontent'),
+        ),
+        migrations.AddField(
+            model_name='filecontent',
+            name='delta_depth',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Number of deltas applied to reconstruct the content'),
+        ),
+        migrations.AddField(
+            model_name='storagesavingssummary',
+            name='total_delta_bytes_saved',
+            field=models.BigIntegerField(default=0, help_text='Bytes saved by storing near-duplicate content as deltas'),
+        ),
+        migrations.AlterField(
+            model_name='filecontent',
+            name='storage_format',
+            field=models.CharField(choices=[('file', 'Single file'), ('chunked', 'Content-defined chunks'), ('packed', 'Pack file'), ('delta', 'Delta against similar content')], default='file', max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='filecontent',
+            name='stored_size',
+            field=models.BigIntegerField(blank=True, help_text='Size of the compressed or delta blob in bytes; null when stored uncompressed', null=True),
+        ),
+        migrations.CreateModel(
+            name='SimilarityFeature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('value', models.BigIntegerField(help_text='Hash of the MinHash values in this band')),
+                ('file_content', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity_features', to='files.filecontent')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band', 'value'], name='files_simil_band_70edc4_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0015_delta_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkSignature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chunks', models.BinaryField(help_text='Digest and length of each chunk in content order (see files.delta)')),
+                ('file_content', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='chunk_signature', to='files.filecontent')),
+            ],
+        ),
+    ]
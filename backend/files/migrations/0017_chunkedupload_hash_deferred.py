@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0016_chunk_signatures'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='hash_deferred',
+            field=models.BooleanField(default=False),
+        ),
+    ]
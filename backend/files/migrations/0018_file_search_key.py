@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+def rekey_filename_index(apps, schema_editor):
+    """Give existing files a search_key and rebuild the filename index on it"""
+    from files.search import drop_filename_index, ensure_filename_index, uses_fts
+
+    if not uses_fts(schema_editor.connection):
+        return
+    drop_filename_index(schema_editor.connection)
+    # Current rowids are unique, which is all a starting key needs to be
+    schema_editor.execute('UPDATE files_file SET search_key = rowid')
+    ensure_filename_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0017_chunkedupload_hash_deferred'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='search_key',
+            field=models.BigIntegerField(
+                editable=False,
+                help_text='Key of the file in the filename search index, assigned on insert (see files/search.py)',
+                null=True,
+                unique=True,
+            ),
+        ),
+        migrations.RunPython(rekey_filename_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    SummaryCacheVersion = apps.get_model('files', 'SummaryCacheVersion')
+    SummaryCacheVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0018_file_search_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SummaryCacheVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
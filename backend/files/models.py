@@ -1,31 +1,179 @@
 from django.db import models
-from django.db.models import Sum
+from django.db.models import Q, Sum
+import io
 import uuid
 import os
 from django.db import transaction
-from django.db.models import F
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .compression import CODEC_NONE, CODEC_GZIP, CODEC_XZ, codec_suffix
+from .storage import open_blob, shard_dirs
+from .summary_cache import bump_version
+
+# Suffix of delta blobs (see delta.py)
+DELTA_SUFFIX = '.delta'
+
+
+def content_blob_name(content_hash, codec=CODEC_NONE, depth=None, delta=False):
+    """Storage name of a content blob in the layout for depth"""
+    # Compressed and delta blobs get a suffix so a path always names one format
+    suffix = DELTA_SUFFIX if delta else codec_suffix(codec)
+    return os.path.join('content', *shard_dirs(content_hash, depth), content_hash + suffix)
+
+
+def chunk_blob_name(chunk_hash, depth=None):
+    """Storage name of a chunk blob in the layout for depth"""
+    return os.path.join('chunks', *shard_dirs(chunk_hash, depth), chunk_hash)
+
 
 def content_upload_path(instance, filename):
     """Generate file path based on content hash"""
-    # Use first 2 chars of hash for directory sharding
-    prefix = instance.content_hash[:2]
-    return os.path.join('content', prefix, instance.content_hash)
+    return content_blob_name(instance.content_hash, instance.codec, delta=instance.is_delta)
+
+
+def chunk_upload_path(instance, filename):
+    """Generate chunk path based on chunk hash"""
+    return chunk_blob_name(instance.chunk_hash)
 
 
 class FileContent(models.Model):
     """Stores the actual file content, deduplicated by hash"""
+    FORMAT_FILE = 'file'
+    FORMAT_CHUNKED = 'chunked'
+    FORMAT_PACKED = 'packed'
+    FORMAT_DELTA = 'delta'
+    STORAGE_FORMAT_CHOICES = [
+        (FORMAT_FILE, 'Single file'),
+        (FORMAT_CHUNKED, 'Content-defined chunks'),
+        (FORMAT_PACKED, 'Pack file'),
+        (FORMAT_DELTA, 'Delta against similar content'),
+    ]
+    CODEC_CHOICES = [
+        (CODEC_NONE, 'Uncompressed'),
+        (CODEC_GZIP, 'gzip'),
+        (CODEC_XZ, 'xz'),
+    ]
+
     content_hash = models.CharField(max_length=64, unique=True, primary_key=True)
-    file = models.FileField(upload_to=content_upload_path)
+    hash_algorithm = models.CharField(max_length=16, default='sha256')
+    file = models.FileField(upload_to=content_upload_path, blank=True)
     size = models.BigIntegerField()
     reference_count = models.IntegerField(default=0)
+    storage_format = models.CharField(max_length=16, choices=STORAGE_FORMAT_CHOICES, default=FORMAT_FILE)
+    chunk_bytes_saved = models.BigIntegerField(
+        default=0,
+        help_text='Bytes of this content stored in chunks that already existed'
+    )
+    codec = models.CharField(max_length=16, choices=CODEC_CHOICES, default=CODEC_NONE, blank=True)
+    stored_size = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text='Size of the compressed or delta blob in bytes; null when stored uncompressed'
+    )
+    pack = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        help_text='Pack file holding the content, for packed storage'
+    )
+    pack_offset = models.BigIntegerField(null=True, blank=True, help_text='Byte offset of the content in its pack')
+    delta_base = models.ForeignKey(
+        'self',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='deltas',
+        help_text='Content this delta is applied to; holds one of its references'
+    )
+    delta_depth = models.PositiveSmallIntegerField(
+        default=0,
+        help_text='Number of deltas applied to reconstruct the content'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Per-pack live bytes and rewrites in compact_packs
+            models.Index(fields=['pack', 'pack_offset'], name='filecontent_pack_idx', condition=~Q(pack='')),
+        ]
 
     def __str__(self):
         return f"{self.content_hash[:8]}... ({self.reference_count} refs)"
 
+    @property
+    def is_chunked(self):
+        return self.storage_format == self.FORMAT_CHUNKED
+
+    @property
+    def is_packed(self):
+        return self.storage_format == self.FORMAT_PACKED
+
+    @property
+    def is_delta(self):
+        return self.storage_format == self.FORMAT_DELTA
+
+    @property
+    def is_compressed(self):
+        return self.codec != CODEC_NONE
+
+    @property
+    def compression_bytes_saved(self):
+        """Bytes saved on disk by compressing this content"""
+        return self.size - self.stored_size if self.is_compressed else 0
+
+    @property
+    def delta_bytes_saved(self):
+        """Bytes saved on disk by storing this content as a delta"""
+        return self.size - self.stored_size if self.is_delta else 0
+
+    def open_stream(self):
+        """Open the content for reading as a binary stream"""
+        if self.is_chunked:
+            from .chunking import ChunkedContentReader
+            return io.BufferedReader(ChunkedContentReader(self), buffer_size=1024 * 1024)
+        if self.is_packed:
+            from .packs import read_packed
+            try:
+                return read_packed(self.file.storage, self.pack, self.pack_offset, self.size)
+            except FileNotFoundError:
+                # Compacted into another pack since this row was read
+                self.refresh_from_db(fields=['pack', 'pack_offset'])
+                return read_packed(self.file.storage, self.pack, self.pack_offset, self.size)
+        if self.is_delta:
+            from .delta import DeltaReader
+            return io.BufferedReader(DeltaReader(self), buffer_size=1024 * 1024)
+        raw = open_blob(self.file.storage, self.file.name)
+        if self.is_compressed:
+            from .compression import DecompressedStream
+            return io.BufferedReader(DecompressedStream(raw, self.codec, self.size), buffer_size=1024 * 1024)
+        return raw
+
+    def delete_stored_content(self):
+        """Delete this row and its stored bytes; blobs are removed after commit"""
+        with transaction.atomic():
+            if self.is_chunked:
+                from .chunking import release_chunks
+                release_chunks(self)
+            if self.is_delta:
+                # The base is left for the collector once nothing else uses it
+                FileContent.objects.filter(pk=self.delta_base_id).update(reference_count=F('reference_count') - 1)
+            file_name = self.file.name
+            storage = self.file.storage
+            FileContent.objects.filter(pk=self.pk).delete()
+
+            def _delete_physical():
+                if not file_name:
+                    return
+                try:
+                    storage.delete(file_name)
+                except Exception:
+                    # swallow storage errors here; cleanup command can be used later
+                    pass
+
+            transaction.on_commit(_delete_physical)
+
     def increment_reference(self):
         """Increment reference count atomically to avoid race conditions."""
         # Use an F() update so concurrent increments are safe
@@ -44,21 +192,8 @@ class FileContent(models.Model):
             # Lock this row for update and get current value
             current = FileContent.objects.select_for_update().get(pk=self.pk)
             if current.reference_count <= 1:
-                # Capture filename and storage to delete the physical file after commit
-                file_name = current.file.name
-
-                def _delete_physical_and_row():
-                    try:
-                        # attempt to delete the physical file via storage backend
-                        storage = current.file.storage
-                        storage.delete(file_name)
-                    except Exception:
-                        # swallow storage errors here; cleanup command can be used later
-                        pass
-                    # remove DB row if still present
-                    FileContent.objects.filter(pk=self.pk).delete()
-
-                transaction.on_commit(_delete_physical_and_row)
+                # Delete the stored bytes and the row once the DB changes commit
+                transaction.on_commit(current.delete_stored_content)
             else:
                 # Safe decrement using F() expression
                 FileContent.objects.filter(pk=self.pk).update(reference_count=F('reference_count') - 1)
@@ -70,24 +205,90 @@ class FileContent(models.Model):
             pass
 
 
+class ContentChunk(models.Model):
+    """A content-defined chunk shared by chunked FileContent, deduplicated by hash"""
+    chunk_hash = models.CharField(max_length=64, primary_key=True)
+    file = models.FileField(upload_to=chunk_upload_path)
+    size = models.IntegerField()
+    reference_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.chunk_hash[:8]}... ({self.reference_count} refs)"
+
+
+class ContentChunkRef(models.Model):
+    """One entry in a chunked FileContent's manifest"""
+    file_content = models.ForeignKey(FileContent, on_delete=models.CASCADE, related_name='chunk_refs')
+    chunk = models.ForeignKey(ContentChunk, on_delete=models.PROTECT, related_name='refs')
+    position = models.IntegerField(help_text='Index of the chunk within the content')
+    offset = models.BigIntegerField(help_text='Byte offset of the chunk within the content')
+
+    class Meta:
+        ordering = ['file_content', 'position']
+        unique_together = [['file_content', 'position']]
+        indexes = [
+            models.Index(fields=['file_content', 'offset']),
+        ]
+
+    def __str__(self):
+        return f"{self.file_content_id[:8]}...#{self.position} -> {self.chunk_id[:8]}..."
+
+
+class SimilarityFeature(models.Model):
+    """One LSH band of a FileContent's similarity sketch, for finding delta bases"""
+    file_content = models.ForeignKey(FileContent, on_delete=models.CASCADE, related_name='similarity_features')
+    band = models.PositiveSmallIntegerField()
+    value = models.BigIntegerField(help_text='Hash of the MinHash values in this band')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['band', 'value']),
+        ]
+
+    def __str__(self):
+        return f"{self.file_content_id[:8]}... band {self.band}"
+
+
+class ChunkSignature(models.Model):
+    """The chunks of a FileContent indexed for delta storage, so it is never chunked again as a base"""
+    file_content = models.OneToOneField(FileContent, on_delete=models.CASCADE, related_name='chunk_signature')
+    chunks = models.BinaryField(help_text='Digest and length of each chunk in content order (see files.delta)')
+
+    def __str__(self):
+        return f"{self.file_content_id[:8]}... signature"
+
+
 class File(models.Model):
     """Stores file metadata and user references"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     file_content = models.ForeignKey(FileContent, on_delete=models.PROTECT, related_name='files')
     original_filename = models.CharField(max_length=255)
     file_type = models.CharField(max_length=100)
+    size = models.BigIntegerField(help_text='Size of the content in bytes, copied from FileContent for filtering')
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    search_key = models.BigIntegerField(
+        null=True, unique=True, editable=False,
+        help_text='Key of the file in the filename search index, assigned on insert (see files/search.py)'
+    )
 
     class Meta:
-        ordering = ['-uploaded_at']
+        ordering = ['-uploaded_at', '-id']
+        indexes = [
+            # Keyset pagination of the file listing (files/pagination.py)
+            models.Index(fields=['-uploaded_at', '-id'], name='file_uploaded_id_idx'),
+            # Listing filtered by type, in listing order
+            models.Index(fields=['file_type', '-uploaded_at', '-id'], name='file_type_uploaded_idx'),
+            models.Index(fields=['size'], name='file_size_idx'),
+        ]
 
     def __str__(self):
         return self.original_filename
 
-    @property
-    def size(self):
-        """Get file size from FileContent"""
-        return self.file_content.size
+    def save(self, *args, **kwargs):
+        if self.size is None:
+            self.size = self.file_content.size
+        super().save(*args, **kwargs)
 
     @property
     def file(self):
@@ -113,7 +314,8 @@ class DeduplicationEvent(models.Model):
     original_filename = models.CharField(max_length=255)
     file_size = models.BigIntegerField(help_text='Size of the duplicate file in bytes (storage saved)')
     file_type = models.CharField(max_length=100)
-    detected_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: events applied by the background worker keep their upload time
+    detected_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['-detected_at']
@@ -132,6 +334,18 @@ class StorageSavingsSummary(models.Model):
     period_end = models.DateField(help_text='End of tracking period')
     total_duplicates_detected = models.IntegerField(default=0)
     total_storage_saved_bytes = models.BigIntegerField(default=0)
+    total_chunk_bytes_saved = models.BigIntegerField(
+        default=0,
+        help_text='Bytes saved by sharing chunks between non-identical files'
+    )
+    total_compression_bytes_saved = models.BigIntegerField(
+        default=0,
+        help_text='Bytes saved by compressing stored content'
+    )
+    total_delta_bytes_saved = models.BigIntegerField(
+        default=0,
+        help_text='Bytes saved by storing near-duplicate content as deltas'
+    )
     unique_files_shared = models.IntegerField(default=0)
     most_duplicated_type = models.CharField(max_length=100, null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -155,6 +369,21 @@ class StorageSavingsSummary(models.Model):
         """Calculate GB from bytes"""
         return self.total_storage_saved_bytes / (1024 * 1024 * 1024)
 
+    @property
+    def chunk_storage_saved_mb(self):
+        """Calculate MB saved by chunk-level deduplication"""
+        return self.total_chunk_bytes_saved / (1024 * 1024)
+
+    @property
+    def compression_saved_mb(self):
+        """Calculate MB saved by compressing stored content"""
+        return self.total_compression_bytes_saved / (1024 * 1024)
+
+    @property
+    def delta_saved_mb(self):
+        """Calculate MB saved by storing near-duplicate content as deltas"""
+        return self.total_delta_bytes_saved / (1024 * 1024)
+
     @property
     def is_weekly_summary(self):
         """Check if this is a weekly summary (7 days)"""
@@ -167,24 +396,29 @@ class StorageSavingsSummary(models.Model):
         return (self.period_start.month == 1 and self.period_start.day == 1 and
                 self.period_end.month == 12 and self.period_end.day == 31)
 
-    def _update_statistics(self, period_start, period_end):
-        """Helper method to update statistics from events"""
+    def _rebuild_counters(self, events):
+        """Helper to rebuild the per-type counts and shared-content markers from events"""
         from django.db.models import Count
 
-        events = DeduplicationEvent.objects.filter(
-            detected_at__date__gte=period_start,
-            detected_at__date__lte=period_end
-        )
+        self.type_counts.all().delete()
+        SummaryTypeCount.objects.bulk_create([
+            SummaryTypeCount(summary=self, file_type=row['file_type'], duplicates=row['count'])
+            for row in events.order_by().values('file_type').annotate(count=Count('id'))
+        ])
 
-        # Calculate statistics
-        self.unique_files_shared = events.values('file_content').distinct().count()
+        self.shared_contents.all().delete()
+        shared = [
+            SummarySharedContent(summary=self, content_hash=content_hash)
+            for content_hash in events.order_by().values_list('file_content', flat=True).distinct()
+        ]
+        SummarySharedContent.objects.bulk_create(shared, batch_size=500)
 
-        type_stats = events.values('file_type').annotate(
-            count=Count('id')
-        ).order_by('-count').first()
+        self.unique_files_shared = len(shared)
+        self.most_duplicated_type = self._leading_type()
 
-        if type_stats:
-            self.most_duplicated_type = type_stats['file_type']
+    def _leading_type(self):
+        """Helper to get the file type with the most duplicates (index-backed top-1 query)"""
+        return self.type_counts.order_by('-duplicates', 'file_type').values_list('file_type', flat=True).first()
 
     @classmethod
     def get_weekly_summaries(cls, limit=10):
@@ -226,17 +460,30 @@ class StorageSavingsSummary(models.Model):
 
         self.total_duplicates_detected = stats['total_duplicates'] or 0
         self.total_storage_saved_bytes = stats['total_saved'] or 0
-
-        # Update statistics using helper method
-        self._update_statistics(self.period_start, self.period_end)
-        self.save()
+        new_content = FileContent.objects.filter(
+            created_at__date__gte=self.period_start,
+            created_at__date__lte=self.period_end
+        )
+        self.total_chunk_bytes_saved = new_content.aggregate(total=Sum('chunk_bytes_saved'))['total'] or 0
+        self.total_compression_bytes_saved = new_content.exclude(codec=CODEC_NONE).aggregate(
+            total=Sum(F('size') - F('stored_size'))
+        )['total'] or 0
+        self.total_delta_bytes_saved = new_content.filter(storage_format=FileContent.FORMAT_DELTA).aggregate(
+            total=Sum(F('size') - F('stored_size'))
+        )['total'] or 0
+
+        # Rebuild the incremental counters so later updates stay consistent
+        with transaction.atomic():
+            self._rebuild_counters(events)
+            self.save()
+            transaction.on_commit(bump_version)
 
     @classmethod
     def get_current_week_dates(cls):
         """Get the start and end dates for the current week (Monday to Sunday)"""
-        from datetime import date, timedelta
+        from datetime import timedelta
 
-        today = date.today()
+        today = timezone.localdate()
         # Get Monday of current week (0 = Monday, 6 = Sunday)
         days_since_monday = today.weekday()
         week_start = today - timedelta(days=days_since_monday)
@@ -244,12 +491,53 @@ class StorageSavingsSummary(models.Model):
 
         return week_start, week_end
 
-    def _increment_stats(self, file_size, period_start, period_end):
-        """Helper to increment stats for a summary"""
-        self.total_duplicates_detected += 1
-        self.total_storage_saved_bytes += file_size
-        self._update_statistics(period_start, period_end)
-        self.save()
+    def _increment_stats(self, file_size, duplicates, type_counts, content_hashes):
+        """
+        Helper to add deduplication events to this summary.
+
+        Runs a fixed number of queries however many events the period already
+        has: counters are bumped with F() expressions, per-type counts with one
+        grouped UPDATE and shared contents are tracked with marker rows.
+        """
+        updates = {
+            'total_duplicates_detected': F('total_duplicates_detected') + duplicates,
+            'total_storage_saved_bytes': F('total_storage_saved_bytes') + file_size,
+            'unique_files_shared': F('unique_files_shared') + self._mark_shared(content_hashes),
+            'updated_at': timezone.now(),
+        }
+        if type_counts:
+            self._add_type_counts(type_counts)
+            updates['most_duplicated_type'] = self._leading_type()
+        StorageSavingsSummary.objects.filter(pk=self.pk).update(**updates)
+        transaction.on_commit(bump_version)
+
+    def _mark_shared(self, content_hashes):
+        """Helper to record contents as shared in this period; returns how many are new"""
+        if not content_hashes:
+            return 0
+        seen = set(
+            self.shared_contents.filter(content_hash__in=content_hashes).values_list('content_hash', flat=True)
+        )
+        new = [content_hash for content_hash in content_hashes if content_hash not in seen]
+        SummarySharedContent.objects.bulk_create(
+            [SummarySharedContent(summary=self, content_hash=content_hash) for content_hash in new],
+            ignore_conflicts=True
+        )
+        return len(new)
+
+    def _add_type_counts(self, type_counts):
+        """Helper to add {file_type: duplicates} to this period's per-type counts"""
+        SummaryTypeCount.objects.bulk_create(
+            [SummaryTypeCount(summary=self, file_type=file_type) for file_type in type_counts],
+            ignore_conflicts=True
+        )
+        self.type_counts.filter(file_type__in=list(type_counts)).update(
+            duplicates=F('duplicates') + Case(
+                *[When(file_type=file_type, then=Value(count)) for file_type, count in type_counts.items()],
+                default=Value(0),
+                output_field=models.IntegerField()
+            )
+        )
 
     @classmethod
     def _get_or_create_summary(cls, period_start, period_end):
@@ -265,19 +553,361 @@ class StorageSavingsSummary(models.Model):
         return summary
 
     @classmethod
-    def update_current_summary(cls, file_size, file_type):
-        """Update weekly and yearly summaries with new deduplication event"""
-        from datetime import date
-
-        today = date.today()
-
-        # Update weekly summary
-        week_start, week_end = cls.get_current_week_dates()
-        weekly_summary = cls._get_or_create_summary(week_start, week_end)
-        weekly_summary._increment_stats(file_size, week_start, week_end)
-
-        # Update yearly summary
-        year_start = date(today.year, 1, 1)
-        year_end = date(today.year, 12, 31)
-        yearly_summary = cls._get_or_create_summary(year_start, year_end)
-        yearly_summary._increment_stats(file_size, year_start, year_end)
+    def _current_summaries(cls):
+        """Helper to get or create the current weekly and yearly summaries"""
+        return cls._summaries_for(timezone.localdate())
+
+    @classmethod
+    def _summaries_for(cls, day):
+        """Helper to get or create the weekly and yearly summaries containing day"""
+        from datetime import date, timedelta
+
+        week_start = day - timedelta(days=day.weekday())
+        return [
+            cls._get_or_create_summary(week_start, week_start + timedelta(days=6)),
+            cls._get_or_create_summary(date(day.year, 1, 1), date(day.year, 12, 31)),
+        ]
+
+    @classmethod
+    def update_current_summary(cls, file_size, file_type, duplicates=1, content_hash=None):
+        """Update weekly and yearly summaries with a new deduplication event
+
+        content_hash identifies the reused content for unique_files_shared.
+        For batches of events use record_events.
+        """
+        type_counts = {file_type: duplicates} if file_type else {}
+        content_hashes = {content_hash} if content_hash else set()
+        for summary in cls._current_summaries():
+            summary._increment_stats(file_size, duplicates, type_counts, content_hashes)
+        if file_type:
+            DailySavingsRollup.record(timezone.localdate(), [(file_type, content_hash, file_size)])
+
+    @classmethod
+    def record_events(cls, events):
+        """Update the summaries and daily rollups of the days a batch of DeduplicationEvents was detected"""
+        from collections import Counter, defaultdict
+
+        by_day = defaultdict(list)
+        for event in events:
+            by_day[timezone.localdate(event.detected_at)].append(event)
+
+        for day, day_events in by_day.items():
+            type_counts = Counter(event.file_type for event in day_events)
+            content_hashes = {event.file_content_id for event in day_events}
+            file_size = sum(event.file_size for event in day_events)
+            for summary in cls._summaries_for(day):
+                summary._increment_stats(file_size, len(day_events), type_counts, content_hashes)
+            DailySavingsRollup.record(
+                day,
+                [(event.file_type, event.file_content_id, event.file_size) for event in day_events]
+            )
+
+    @classmethod
+    def record_chunk_savings(cls, bytes_saved):
+        """Add chunk-level savings of newly stored content to the current summaries"""
+        cls._add_to_current_summaries('total_chunk_bytes_saved', bytes_saved)
+
+    @classmethod
+    def record_compression_savings(cls, bytes_saved):
+        """Add compression savings of newly stored content to the current summaries"""
+        cls._add_to_current_summaries('total_compression_bytes_saved', bytes_saved)
+
+    @classmethod
+    def record_delta_savings(cls, bytes_saved):
+        """Add savings of newly stored delta content to the current summaries"""
+        cls._add_to_current_summaries('total_delta_bytes_saved', bytes_saved)
+
+    @classmethod
+    def _add_to_current_summaries(cls, field, amount):
+        """Helper to atomically add to a counter on the current weekly and yearly summaries"""
+        for summary in cls._current_summaries():
+            cls.objects.filter(pk=summary.pk).update(**{field: F(field) + amount})
+        transaction.on_commit(bump_version)
+
+
+class SummaryTypeCount(models.Model):
+    """Duplicates of one file type within a summary's period"""
+    summary = models.ForeignKey(StorageSavingsSummary, on_delete=models.CASCADE, related_name='type_counts')
+    file_type = models.CharField(max_length=100)
+    duplicates = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [['summary', 'file_type']]
+        indexes = [
+            models.Index(fields=['summary', '-duplicates']),
+        ]
+
+    def __str__(self):
+        return f"{self.file_type}: {self.duplicates}"
+
+
+class SummarySharedContent(models.Model):
+    """Marks content as already counted in a summary's unique_files_shared"""
+    summary = models.ForeignKey(StorageSavingsSummary, on_delete=models.CASCADE, related_name='shared_contents')
+    content_hash = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = [['summary', 'content_hash']]
+
+    def __str__(self):
+        return f"{self.content_hash[:8]}..."
+
+
+class DailySavingsRollup(models.Model):
+    """Deduplication savings of one file type on one day, maintained as events are recorded"""
+    GRANULARITIES = ['day', 'week', 'month']
+
+    day = models.DateField()
+    file_type = models.CharField(max_length=100)
+    duplicates = models.IntegerField(default=0)
+    bytes_saved = models.BigIntegerField(default=0)
+    distinct_contents = models.IntegerField(
+        default=0,
+        help_text='Distinct contents duplicated with this type on this day'
+    )
+
+    class Meta:
+        ordering = ['day', 'file_type']
+        unique_together = [['day', 'file_type']]
+
+    def __str__(self):
+        return f"{self.day} {self.file_type}: {self.duplicates} duplicates"
+
+    @classmethod
+    def record(cls, day, entries):
+        """
+        Add deduplication events to the rollups of a day.
+
+        Runs a fixed number of queries for any number of entries.
+
+        Args:
+            day: Date of the events
+            entries: Iterable of (file_type, content_hash, file_size); a
+                content_hash of None is counted as a duplicate only
+        """
+        from collections import Counter
+
+        entries = list(entries)
+        if not entries:
+            return
+        duplicates = Counter(file_type for file_type, _, _ in entries)
+        bytes_saved = Counter()
+        for file_type, _, file_size in entries:
+            bytes_saved[file_type] += file_size
+        distinct = DailyRollupContent.mark(
+            day, {(file_type, content_hash) for file_type, content_hash, _ in entries if content_hash}
+        )
+
+        def per_type(values):
+            return Case(
+                *[When(file_type=file_type, then=Value(values[file_type])) for file_type in duplicates],
+                default=Value(0),
+                output_field=models.BigIntegerField()
+            )
+
+        cls.objects.bulk_create(
+            [cls(day=day, file_type=file_type) for file_type in duplicates],
+            ignore_conflicts=True
+        )
+        cls.objects.filter(day=day, file_type__in=list(duplicates)).update(
+            duplicates=F('duplicates') + per_type(duplicates),
+            bytes_saved=F('bytes_saved') + per_type(bytes_saved),
+            distinct_contents=F('distinct_contents') + per_type(distinct),
+        )
+
+    @classmethod
+    def rebuild(cls, start, end):
+        """
+        Rebuild the rollups of days start..end (inclusive) from DeduplicationEvent records.
+
+        Returns:
+            Int: Number of rollup rows written
+        """
+        from django.db.models import Count
+        from django.db.models.functions import TruncDate
+
+        events = DeduplicationEvent.objects.filter(
+            detected_at__date__gte=start,
+            detected_at__date__lte=end
+        ).order_by().annotate(day=TruncDate('detected_at'))
+
+        with transaction.atomic():
+            cls.objects.filter(day__gte=start, day__lte=end).delete()
+            DailyRollupContent.objects.filter(day__gte=start, day__lte=end).delete()
+            rollups = [
+                cls(
+                    day=row['day'],
+                    file_type=row['file_type'],
+                    duplicates=row['duplicates'],
+                    bytes_saved=row['bytes_saved'] or 0,
+                    distinct_contents=row['distinct_contents'],
+                )
+                for row in events.values('day', 'file_type').annotate(
+                    duplicates=Count('id'),
+                    bytes_saved=Sum('file_size'),
+                    distinct_contents=Count('file_content', distinct=True),
+                )
+            ]
+            cls.objects.bulk_create(rollups, batch_size=500)
+            DailyRollupContent.objects.bulk_create(
+                [
+                    DailyRollupContent(day=row['day'], file_type=row['file_type'], content_hash=row['file_content'])
+                    for row in events.values('day', 'file_type', 'file_content').distinct()
+                ],
+                batch_size=500
+            )
+            transaction.on_commit(bump_version)
+        return len(rollups)
+
+    @classmethod
+    def time_series(cls, start, end, granularity='day', file_type=None):
+        """
+        Sum the rollups of days start..end into day, week or month buckets.
+
+        Reads at most one row per day and file type, so the cost depends on
+        the length of the range rather than the number of events. Every
+        bucket in the range is present, including empty ones. Buckets are
+        clipped to the range. distinct_contents of a multi-day bucket is the
+        sum of the daily counts: content duplicated on several days counts
+        once per day.
+
+        Returns:
+            List of dicts with period_start, period_end, duplicates,
+            bytes_saved and distinct_contents
+        """
+        from datetime import timedelta
+
+        if granularity not in cls.GRANULARITIES:
+            raise ValueError(f'Unsupported granularity: {granularity}')
+
+        def bucket_start(day):
+            if granularity == 'week':
+                return max(start, day - timedelta(days=day.weekday()))
+            if granularity == 'month':
+                return max(start, day.replace(day=1))
+            return day
+
+        buckets = {}
+        day = start
+        while day <= end:
+            key = bucket_start(day)
+            bucket = buckets.setdefault(key, {
+                'period_start': key,
+                'period_end': day,
+                'duplicates': 0,
+                'bytes_saved': 0,
+                'distinct_contents': 0,
+            })
+            bucket['period_end'] = day
+            day += timedelta(days=1)
+
+        rows = cls.objects.filter(day__gte=start, day__lte=end)
+        if file_type:
+            rows = rows.filter(file_type=file_type)
+        for row in rows.order_by().values('day').annotate(
+            duplicates_sum=Sum('duplicates'),
+            bytes_sum=Sum('bytes_saved'),
+            distinct_sum=Sum('distinct_contents'),
+        ):
+            bucket = buckets[bucket_start(row['day'])]
+            bucket['duplicates'] += row['duplicates_sum']
+            bucket['bytes_saved'] += row['bytes_sum']
+            bucket['distinct_contents'] += row['distinct_sum']
+        return list(buckets.values())
+
+
+class DailyRollupContent(models.Model):
+    """Marks content as already counted in a daily rollup's distinct_contents"""
+    day = models.DateField()
+    file_type = models.CharField(max_length=100)
+    content_hash = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = [['day', 'file_type', 'content_hash']]
+
+    def __str__(self):
+        return f"{self.day} {self.file_type}: {self.content_hash[:8]}..."
+
+    @classmethod
+    def mark(cls, day, pairs):
+        """
+        Record (file_type, content_hash) pairs as seen on day.
+
+        Returns:
+            Counter of newly marked contents per file type
+        """
+        from collections import Counter
+
+        if not pairs:
+            return Counter()
+        seen = set(
+            cls.objects.filter(
+                day=day,
+                content_hash__in={content_hash for _, content_hash in pairs}
+            ).values_list('file_type', 'content_hash')
+        )
+        new = [pair for pair in pairs if pair not in seen]
+        cls.objects.bulk_create(
+            [cls(day=day, file_type=file_type, content_hash=content_hash) for file_type, content_hash in new],
+            ignore_conflicts=True
+        )
+        return Counter(file_type for file_type, _ in new)
+
+
+class SummaryCacheVersion(models.Model):
+    """The version of the cached summaries (see summary_cache.py), a single row shared by every worker"""
+    version = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"Summary cache version {self.version}"
+
+
+class EventJob(models.Model):
+    """
+    A queued deduplication event awaiting the background worker.
+
+    Jobs are written in the upload's transaction (an outbox), so the worker
+    only ever sees jobs of committed uploads. A worker applies a batch and
+    deletes its jobs in one transaction, so each job takes effect exactly
+    once even if a worker dies mid-batch.
+    """
+    payload = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=64, null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['claimed_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Job {self.pk} ({self.attempts} attempts)"
+
+
+class ChunkedUpload(models.Model):
+    """Tracks an in-progress chunked upload whose chunks are staged on disk"""
+    upload_id = models.CharField(max_length=100, primary_key=True)
+    original_filename = models.CharField(max_length=255)
+    file_type = models.CharField(max_length=100)
+    total_chunks = models.IntegerField()
+    hash_algorithm = models.CharField(max_length=16, default='sha256')
+    received_chunks = models.IntegerField(default=0)
+    received_bytes = models.BigIntegerField(default=0)
+    # Chunks before next_chunk_index have been appended to the assembled file and hashed
+    next_chunk_index = models.IntegerField(default=0)
+    hashed_bytes = models.BigIntegerField(default=0)
+    # Set once a chunk was appended by a process without the running hash; finish hashes the file instead
+    hash_deferred = models.BooleanField(default=False)
+    is_assembling = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.original_filename} ({self.received_chunks}/{self.total_chunks} chunks)"
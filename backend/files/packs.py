@@ -0,0 +1,259 @@
+"""
+Pack files for small content.
+
+With FILES_PACK_ENABLED, new content of at most FILES_PACK_MAX_BLOB_SIZE bytes
+is appended to a shared pack file under ``packs/`` instead of getting a file
+of its own, so millions of tiny uploads cost a few large files rather than
+an inode and a filesystem block each. FileContent.pack and pack_offset
+locate the bytes (the length is the content size); FileContent.file stays
+empty, so nothing that deletes loose blobs ever touches a pack.
+
+Appends from every process go to the pack named in ``packs/CURRENT`` under
+an exclusive lock, and a new pack is started once the current one reaches
+FILES_PACK_TARGET_SIZE. Bytes are appended before the upload's transaction,
+so a failed upload leaves dead bytes behind, as does releasing packed
+content; ``manage.py compact_packs`` copies the live content out of packs
+that are mostly dead and deletes them.
+
+Reads slice a read-only mmap of the pack, kept open per process.
+"""
+import fcntl
+import io
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Sum, Value, When
+
+PACK_DIR = 'packs'
+CURRENT_FILE = 'CURRENT'
+LOCK_FILE = 'LOCK'
+
+# Live content copied out of a pack per transaction in compact_pack
+COMPACT_BATCH_SIZE = 500
+
+# Pack mmaps kept open by this process, most recently used last
+MAX_OPEN_PACKS = 64
+_maps = OrderedDict()
+_maps_lock = threading.Lock()
+
+
+def should_pack(size):
+    """Whether new content of this size goes into a pack."""
+    return settings.FILES_PACK_ENABLED and size <= settings.FILES_PACK_MAX_BLOB_SIZE
+
+
+def pack_dir(storage=None):
+    """Absolute path of the pack directory, created if missing."""
+    path = (storage or default_storage).path(PACK_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def pack_name(number):
+    return f'{PACK_DIR}/pack-{number:08d}.pack'
+
+
+def pack_number(name):
+    return int(os.path.basename(name)[len('pack-'):-len('.pack')])
+
+
+@contextmanager
+def pack_lock(storage=None):
+    """Hold the exclusive lock under which packs are appended to, started and retired."""
+    with open(os.path.join(pack_dir(storage), LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def current_pack(storage=None):
+    """Name of the pack being appended to, or None before the first append."""
+    try:
+        with open(os.path.join(pack_dir(storage), CURRENT_FILE)) as current:
+            return current.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _set_current_pack(storage, name):
+    path = os.path.join(pack_dir(storage), CURRENT_FILE)
+    with open(f'{path}.tmp', 'w') as current:
+        current.write(name)
+    os.replace(f'{path}.tmp', path)
+
+
+def append_blobs(blobs, storage=None):
+    """
+    Append blobs to the current pack, all to the same pack.
+
+    Args:
+        blobs: List of bytes objects
+        storage: Storage the packs live in (default: default_storage)
+
+    Returns:
+        Tuple of (pack name, list of offsets in the order of blobs)
+    """
+    storage = storage or default_storage
+    total = sum(len(data) for data in blobs)
+    with pack_lock(storage):
+        name = current_pack(storage)
+        offset = os.path.getsize(storage.path(name)) if name and storage.exists(name) else 0
+        if name is None or (offset and offset + total > settings.FILES_PACK_TARGET_SIZE):
+            name = pack_name(pack_number(name) + 1 if name else 1)
+            offset = 0
+            _set_current_pack(storage, name)
+        offsets = []
+        with open(storage.path(name), 'ab') as pack:
+            for data in blobs:
+                offsets.append(offset)
+                pack.write(data)
+                offset += len(data)
+    return name, offsets
+
+
+def place_in_pack(file_content, uploaded_file):
+    """
+    Append an upload to the current pack and point file_content at it.
+
+    Sets ``storage_format``, ``pack`` and ``pack_offset`` but does not save the row.
+    """
+    uploaded_file.seek(0)
+    data = uploaded_file.read()
+    file_content.pack, (file_content.pack_offset,) = append_blobs([data], file_content.file.storage)
+    file_content.storage_format = file_content.FORMAT_PACKED
+    if getattr(uploaded_file, 'in_content_store', False):
+        os.remove(uploaded_file.temporary_file_path())
+
+
+def _pack_map(storage, name, end):
+    """Return an mmap of a pack covering at least the first end bytes."""
+    path = storage.path(name)
+    with _maps_lock:
+        mapped = _maps.get(path)
+        if mapped is not None and len(mapped) >= end:
+            _maps.move_to_end(path)
+            return mapped
+    # Not mapped yet, or appended to since: map the whole file as it is now
+    with open(path, 'rb') as pack:
+        mapped = mmap.mmap(pack.fileno(), 0, access=mmap.ACCESS_READ)
+    with _maps_lock:
+        _maps[path] = mapped
+        _maps.move_to_end(path)
+        while len(_maps) > MAX_OPEN_PACKS:
+            # Not closed explicitly: a reader may still be slicing it
+            _maps.popitem(last=False)
+    return mapped
+
+
+def forget_pack(storage, name):
+    """Drop this process's mapping of a pack, e.g. once it has been deleted."""
+    with _maps_lock:
+        _maps.pop(storage.path(name), None)
+
+
+def read_packed(storage, name, offset, length):
+    """
+    Read one blob out of a pack.
+
+    Returns:
+        Seekable binary stream of the blob
+
+    Raises:
+        FileNotFoundError: the pack is gone (compacted away)
+    """
+    if not length:
+        return io.BytesIO()
+    mapped = _pack_map(storage, name, offset + length)
+    return io.BytesIO(mapped[offset:offset + length])
+
+
+def pack_usage(storage=None):
+    """
+    Describe every pack on disk.
+
+    Returns:
+        List of dicts with the pack's 'name', 'size' and 'mtime' on disk, and
+        the 'live' bytes and 'count' of content stored in it, in pack order
+    """
+    from .models import FileContent
+
+    storage = storage or default_storage
+    live = {
+        pack: (live_bytes, count)
+        for pack, live_bytes, count in FileContent.objects.exclude(pack='').order_by()
+        .values('pack').annotate(live=Sum('size'), count=Count('pk')).values_list('pack', 'live', 'count')
+    }
+    usage = []
+    with os.scandir(pack_dir(storage)) as entries:
+        for entry in entries:
+            if not (entry.name.startswith('pack-') and entry.name.endswith('.pack')):
+                continue
+            name = f'{PACK_DIR}/{entry.name}'
+            stat = entry.stat()
+            live_bytes, count = live.get(name, (0, 0))
+            usage.append({
+                'name': name,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'live': live_bytes,
+                'count': count,
+            })
+    return sorted(usage, key=lambda pack: pack['name'])
+
+
+def compact_pack(name, grace_seconds, storage=None):
+    """
+    Copy the live content of a pack into the current pack and delete it.
+
+    The current pack and packs written to within grace_seconds are left
+    alone: an upload may have appended to them and not committed yet.
+
+    Args:
+        name: Pack to compact
+        grace_seconds: Minimum time since the pack was last written
+        storage: Storage the packs live in (default: default_storage)
+
+    Returns:
+        Tuple of (content moved, bytes reclaimed), or None if the pack was skipped
+    """
+    from .models import FileContent
+
+    storage = storage or default_storage
+    path = storage.path(name)
+    if name == current_pack(storage) or os.path.getmtime(path) > time.time() - grace_seconds:
+        return None
+    size = os.path.getsize(path)
+    moved = copied_bytes = 0
+    while True:
+        rows = list(
+            FileContent.objects.filter(pack=name).order_by('pack_offset')
+            .values_list('pk', 'pack_offset', 'size')[:COMPACT_BATCH_SIZE]
+        )
+        if not rows:
+            break
+        blobs = [read_packed(storage, name, offset, length).getvalue() for _, offset, length in rows]
+        new_name, offsets = append_blobs(blobs, storage)
+        with transaction.atomic():
+            # Rows released meanwhile stay deleted; their copies are dead bytes in the new pack
+            moved += FileContent.objects.filter(pk__in=[pk for pk, _, _ in rows], pack=name).update(
+                pack=Value(new_name),
+                pack_offset=Case(
+                    *[When(pk=pk, then=Value(offset)) for (pk, _, _), offset in zip(rows, offsets)],
+                    output_field=IntegerField()
+                )
+            )
+        copied_bytes += sum(length for _, _, length in rows)
+    with pack_lock(storage):
+        if not FileContent.objects.filter(pack=name).exists():
+            os.remove(path)
+    forget_pack(storage, name)
+    return moved, size - copied_bytes
@@ -0,0 +1,103 @@
+"""
+Keyset pagination for the file listing.
+
+Pages are ordered newest first on (uploaded_at, id) and the cursor is the
+last row's key, so fetching a page is an index range scan whatever its depth
+(no OFFSET), and files uploaded while a client is paging only ever appear
+before its cursor instead of shifting later pages.
+"""
+import base64
+import json
+import uuid
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(uploaded_at, pk):
+    raw = json.dumps([uploaded_at.isoformat(), str(pk)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Args:
+        cursor: Value of the cursor query parameter
+
+    Returns:
+        Tuple of (uploaded_at, UUID)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        uploaded_at, pk = json.loads(raw)
+        parsed = parse_datetime(uploaded_at)
+        pk = uuid.UUID(pk)
+    except (TypeError, ValueError, AttributeError) as exc:
+        raise ValueError('Malformed cursor') from exc
+    if parsed is None:
+        raise ValueError('Malformed cursor')
+    return parsed, pk
+
+
+class FileCursorPagination(BasePagination):
+    """Forward-only keyset pagination on (-uploaded_at, -id)"""
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering = ('-uploaded_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            try:
+                uploaded_at, pk = decode_cursor(cursor)
+            except ValueError:
+                raise NotFound('Invalid cursor')
+            # (uploaded_at, id) < cursor, phrased as a range on the index's leading column
+            queryset = queryset.filter(uploaded_at__lte=uploaded_at).exclude(uploaded_at=uploaded_at, id__gte=pk)
+
+        # One extra row tells whether there is a next page
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        page = rows[:self.page_size]
+        self.next_cursor = encode_cursor(page[-1].uploaded_at, page[-1].pk) if self.has_next else None
+        return page
+
+    def get_page_size(self, request):
+        size = settings.FILES_LIST_PAGE_SIZE
+        value = request.query_params.get(self.page_size_query_param)
+        if value:
+            try:
+                size = int(value)
+            except ValueError:
+                pass
+        return max(1, min(size, settings.FILES_LIST_MAX_PAGE_SIZE))
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
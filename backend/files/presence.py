@@ -0,0 +1,193 @@
+"""
+Presence filter of stored content hashes.
+
+With FILES_PRESENCE_FILTER_ENABLED, uploads consult a Bloom filter of every
+FileContent hash before looking the hash up in the database. Most uploads of
+unique content are definite misses, which skip the read and go straight to
+the insert; only possible hits pay for the primary-key lookup.
+
+The filter lives in a file (FILES_PRESENCE_FILTER_PATH) that every worker
+maps shared, so a hash added by one worker is seen by all of them at once.
+``manage.py rebuild_presence_filter`` builds it from the table, sized for
+FILES_PRESENCE_FILTER_FP_RATE false positives at the given capacity, and
+swaps it in with a rename; workers pick the new file up within
+FILTER_RECHECK_SECONDS. Without a filter file every hash counts as possibly
+present, so uploads behave as if the filter were disabled.
+
+A Bloom filter cannot forget: deleted content stays in the filter until the
+next rebuild, which costs a lookup that finds nothing, never a wrong answer.
+Nor is the filter authoritative the other way round. Bits set concurrently
+by two workers, or added to the old file while a rebuild swaps it out, can
+be lost. A missing hash only sends its upload down the insert path, where the
+unique primary key turns it into a duplicate exactly as for two concurrent
+uploads of the same content (see services.store_upload).
+"""
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+MAGIC = b'FCPF0001'
+# Magic, number of bits, number of hash functions, capacity sized for
+HEADER = struct.Struct('<8sQQQ')
+HEADER_SIZE = 64
+
+# How often a worker checks whether the filter file has been replaced
+FILTER_RECHECK_SECONDS = 5
+
+_state = {'filter': None, 'path': None, 'inode': None, 'checked': 0.0}
+_state_lock = threading.Lock()
+
+
+def filter_size(capacity, fp_rate):
+    """
+    Size a Bloom filter.
+
+    Args:
+        capacity: Number of hashes the filter is expected to hold
+        fp_rate: Acceptable false-positive rate at that capacity, e.g. 0.01
+
+    Returns:
+        Tuple of (number of bits, number of hash functions)
+    """
+    capacity = max(capacity, 1)
+    num_bits = math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2)
+    num_bits = max(64, (num_bits + 63) // 64 * 64)
+    num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+    return num_bits, num_hashes
+
+
+class PresenceFilter:
+    """A Bloom filter over a mapped filter file."""
+
+    def __init__(self, mapped):
+        magic, self.num_bits, self.num_hashes, self.capacity = HEADER.unpack_from(mapped)
+        if magic != MAGIC or len(mapped) < HEADER_SIZE + self.num_bits // 8:
+            raise ValueError('Not a presence filter file')
+        self.mapped = mapped
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'r+b') as filter_file:
+            return cls(mmap.mmap(filter_file.fileno(), 0))
+
+    def _positions(self, content_hash):
+        # Double hashing over a digest of the hash, so positions do not depend
+        # on how uniform the content hashes themselves are
+        digest = hashlib.blake2b(content_hash.encode(), digest_size=16).digest()
+        first, step = struct.unpack('<QQ', digest)
+        step |= 1
+        return [(first + i * step) % self.num_bits for i in range(self.num_hashes)]
+
+    def might_contain(self, content_hash):
+        mapped = self.mapped
+        for position in self._positions(content_hash):
+            if not mapped[HEADER_SIZE + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, content_hash):
+        mapped = self.mapped
+        for position in self._positions(content_hash):
+            index = HEADER_SIZE + (position >> 3)
+            mapped[index] |= 1 << (position & 7)
+
+    def fill_ratio(self):
+        """Fraction of bits set."""
+        bits = int.from_bytes(self.mapped[HEADER_SIZE:HEADER_SIZE + self.num_bits // 8], 'little')
+        return bits.bit_count() / self.num_bits
+
+    def estimated_fp_rate(self):
+        return self.fill_ratio() ** self.num_hashes
+
+
+def build_filter(path, content_hashes, capacity, fp_rate=None):
+    """
+    Write a filter holding content_hashes to path, replacing any filter there.
+
+    The filter is built in a temporary file next to path and renamed into
+    place, so workers never map a partial filter.
+
+    Args:
+        path: Filter file to write
+        content_hashes: Iterable of hex content hashes
+        capacity: Number of hashes to size the filter for
+        fp_rate: False-positive rate at capacity (default: FILES_PRESENCE_FILTER_FP_RATE)
+
+    Returns:
+        Tuple of (the new PresenceFilter, number of hashes added)
+    """
+    num_bits, num_hashes = filter_size(capacity, fp_rate or settings.FILES_PRESENCE_FILTER_FP_RATE)
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.presence-')
+    try:
+        with os.fdopen(fd, 'r+b') as filter_file:
+            filter_file.truncate(HEADER_SIZE + num_bits // 8)
+            mapped = mmap.mmap(filter_file.fileno(), 0)
+        HEADER.pack_into(mapped, 0, MAGIC, num_bits, num_hashes, capacity)
+        presence = PresenceFilter(mapped)
+        added = 0
+        for content_hash in content_hashes:
+            presence.add(content_hash)
+            added += 1
+        mapped.flush()
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return presence, added
+
+
+def get_filter():
+    """
+    Return this process's mapping of the shared filter, or None.
+
+    None means the filter is disabled or has not been built, and every
+    hash must be treated as possibly present.
+    """
+    if not settings.FILES_PRESENCE_FILTER_ENABLED:
+        return None
+    path = settings.FILES_PRESENCE_FILTER_PATH
+    now = time.monotonic()
+    if path == _state['path'] and now - _state['checked'] < FILTER_RECHECK_SECONDS:
+        return _state['filter']
+    with _state_lock:
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            inode = None
+        if path != _state['path'] or inode != _state['inode']:
+            try:
+                _state['filter'] = PresenceFilter.open(path) if inode is not None else None
+            except (OSError, ValueError):
+                _state['filter'] = None
+        _state.update(path=path, inode=inode, checked=now)
+        return _state['filter']
+
+
+def reset():
+    """Forget this process's mapping, so the next lookup reopens the file."""
+    with _state_lock:
+        _state.update(filter=None, path=None, inode=None, checked=0.0)
+
+
+def might_exist(content_hash):
+    """False only if no FileContent with this hash exists."""
+    presence = get_filter()
+    return presence is None or presence.might_contain(content_hash)
+
+
+def record_contents(content_hashes):
+    """Add newly stored content hashes to the filter."""
+    presence = get_filter()
+    if presence is not None:
+        for content_hash in content_hashes:
+            presence.add(content_hash)
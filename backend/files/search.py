@@ -0,0 +1,139 @@
+"""
+Search and filtering for the file listing.
+
+Filename search uses an FTS5 table with the trigram tokenizer over
+File.original_filename, so a fragment anywhere in the name is an index
+lookup rather than a LIKE scan. The table is external-content (it stores only
+the index) and triggers keep it in step with inserts, renames and deletes.
+
+It is keyed by File.search_key rather than the files_file rowid: File has a
+UUID primary key, so its rowid is implicit and VACUUM may renumber it. The
+insert trigger assigns the key (one past the largest, found on its unique
+index), and a further trigger puts it back if a save of an instance that
+never read it writes NULL over it.
+
+Django's SQLite schema editor rebuilds a table to alter it, which drops its
+triggers. ensure_filename_index() runs after every migrate and reinstalls and
+repopulates the index when that has happened.
+"""
+from django.db import connection as default_connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'files_file_fts'
+FTS_TRIGGERS = ('files_file_fts_ai', 'files_file_fts_ad', 'files_file_fts_au', 'files_file_search_key_keep')
+# The trigram tokenizer cannot match anything shorter
+MIN_FTS_LENGTH = 3
+
+_FTS_SQL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"original_filename, content='files_file', content_rowid='search_key', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS files_file_fts_ai AFTER INSERT ON files_file BEGIN "
+    f"UPDATE files_file SET search_key = (SELECT COALESCE(MAX(search_key), 0) + 1 FROM files_file) "
+    f"WHERE id = new.id AND search_key IS NULL; "
+    f"INSERT INTO {FTS_TABLE}(rowid, original_filename) "
+    f"SELECT search_key, original_filename FROM files_file WHERE id = new.id; END",
+    f"CREATE TRIGGER IF NOT EXISTS files_file_fts_ad AFTER DELETE ON files_file BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, original_filename) "
+    f"VALUES ('delete', old.search_key, old.original_filename); END",
+    f"CREATE TRIGGER IF NOT EXISTS files_file_fts_au AFTER UPDATE OF original_filename ON files_file BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, original_filename) "
+    f"VALUES ('delete', old.search_key, old.original_filename); "
+    f"INSERT INTO {FTS_TABLE}(rowid, original_filename) "
+    f"VALUES (COALESCE(new.search_key, old.search_key), new.original_filename); END",
+    "CREATE TRIGGER IF NOT EXISTS files_file_search_key_keep AFTER UPDATE OF search_key ON files_file "
+    "WHEN new.search_key IS NULL BEGIN "
+    "UPDATE files_file SET search_key = old.search_key WHERE id = new.id; END",
+]
+
+
+def uses_fts(connection=default_connection):
+    return connection.vendor == 'sqlite'
+
+
+def ensure_filename_index(connection=default_connection):
+    """
+    Create the filename index and its triggers if missing, rebuilding its contents when they were.
+
+    Returns:
+        Bool: True if anything had to be (re)installed
+    """
+    if not uses_fts(connection):
+        return False
+    with connection.cursor() as cursor:
+        if 'search_key' not in {column.name for column in connection.introspection.get_table_description(
+                cursor, 'files_file')}:
+            # Migrated only partway; 0018_file_search_key installs the index
+            return False
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE (type = 'trigger' AND name IN (%s)) "
+            "OR (type = 'table' AND name = %%s)" % ', '.join(['%s'] * len(FTS_TRIGGERS)),
+            [*FTS_TRIGGERS, FTS_TABLE]
+        )
+        if len(cursor.fetchall()) == len(FTS_TRIGGERS) + 1:
+            return False
+        for statement in _FTS_SQL:
+            cursor.execute(statement)
+        # Re-read every filename, since files may have changed while the triggers were gone
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def drop_filename_index(connection=default_connection):
+    """Drop the filename index and its triggers."""
+    if not uses_fts(connection):
+        return
+    with connection.cursor() as cursor:
+        for trigger in FTS_TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def search_filenames(queryset, fragment):
+    """
+    Restrict a File queryset to names containing fragment, case-insensitively.
+
+    Args:
+        queryset: File queryset
+        fragment: Text to look for anywhere in original_filename
+
+    Returns:
+        Filtered queryset
+    """
+    if len(fragment) < MIN_FTS_LENGTH or not uses_fts():
+        return queryset.filter(original_filename__icontains=fragment)
+    # A quoted phrase of trigrams matches the fragment as a substring
+    phrase = '"%s"' % fragment.replace('"', '""')
+    return queryset.filter(RawSQL(
+        f"files_file.search_key IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)",
+        [phrase],
+        output_field=BooleanField()
+    ))
+
+
+def filter_files(queryset, params):
+    """
+    Apply validated FileFilterSerializer data to a File queryset.
+
+    A file_type ending in '/' (e.g. 'image/') matches the whole family. That
+    is deliberately a LIKE: it cannot use the type index, so SQLite walks the
+    listing index in order and stops after a page, where a range on the type
+    index would sort every file in the family first.
+    """
+    if params.get('search'):
+        queryset = search_filenames(queryset, params['search'])
+    file_type = params.get('file_type')
+    if file_type:
+        if file_type.endswith('/'):
+            queryset = queryset.filter(file_type__startswith=file_type)
+        else:
+            queryset = queryset.filter(file_type=file_type)
+    if params.get('min_size') is not None:
+        queryset = queryset.filter(size__gte=params['min_size'])
+    if params.get('max_size') is not None:
+        queryset = queryset.filter(size__lte=params['max_size'])
+    if params.get('uploaded_after'):
+        queryset = queryset.filter(uploaded_at__gte=params['uploaded_after'])
+    if params.get('uploaded_before'):
+        queryset = queryset.filter(uploaded_at__lt=params['uploaded_before'])
+    return queryset
@@ -1,13 +1,15 @@
+from django.urls import reverse
 from rest_framework import serializers
 from .models import File, FileContent
-from .models import StorageSavingsSummary
+from .models import DailySavingsRollup, StorageSavingsSummary
+from .utils import HASH_ALGORITHMS
 
 
 class FileContentSerializer(serializers.ModelSerializer):
     class Meta:
         model = FileContent
-        fields = ['content_hash', 'file', 'size', 'reference_count', 'created_at']
-        read_only_fields = ['content_hash', 'reference_count', 'created_at']
+        fields = ['content_hash', 'hash_algorithm', 'file', 'size', 'codec', 'stored_size', 'reference_count', 'created_at']
+        read_only_fields = ['content_hash', 'hash_algorithm', 'codec', 'stored_size', 'reference_count', 'created_at']
 
 
 class FileSerializer(serializers.ModelSerializer):
@@ -21,16 +23,53 @@ class FileSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'uploaded_at', 'size']
 
     def get_file(self, obj):
-        """Return the file URL from FileContent"""
+        """Return the URL of the file's download action"""
         request = self.context.get('request')
-        if request and obj.file_content.file:
-            return request.build_absolute_uri(obj.file_content.file.url)
-        return obj.file_content.file.url if obj.file_content.file else None 
+        url = reverse('file-download', args=[obj.pk])
+        return request.build_absolute_uri(url) if request else url
+
+
+class FileFilterSerializer(serializers.Serializer):
+    """Query parameters of the file listing"""
+    search = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    file_type = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    min_size = serializers.IntegerField(min_value=0, required=False)
+    max_size = serializers.IntegerField(min_value=0, required=False)
+    uploaded_after = serializers.DateTimeField(required=False)
+    uploaded_before = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get('min_size') is not None and attrs.get('max_size') is not None \
+                and attrs['min_size'] > attrs['max_size']:
+            raise serializers.ValidationError('min_size must not be greater than max_size')
+        if attrs.get('uploaded_after') and attrs.get('uploaded_before') \
+                and attrs['uploaded_after'] > attrs['uploaded_before']:
+            raise serializers.ValidationError('uploaded_after must not be after uploaded_before')
+        return attrs
+
+
+class FileBulkDeleteSerializer(serializers.Serializer):
+    """Body of the bulk delete endpoint: explicit ids, or a listing filter"""
+    MAX_IDS = 10000
+
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=MAX_IDS, required=False)
+    filter = FileFilterSerializer(required=False)
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError('Provide either ids or filter')
+        if 'filter' in attrs and not any(value not in (None, '') for value in attrs['filter'].values()):
+            # Deleting everything must not be one empty object away
+            raise serializers.ValidationError('filter must set at least one criterion')
+        return attrs
 
 
 class StorageSavingsSummarySerializer(serializers.ModelSerializer):
     storage_saved_mb = serializers.FloatField(read_only=True)
     storage_saved_gb = serializers.FloatField(read_only=True)
+    chunk_storage_saved_mb = serializers.FloatField(read_only=True)
+    compression_saved_mb = serializers.FloatField(read_only=True)
+    delta_saved_mb = serializers.FloatField(read_only=True)
     storage_saved_mb_display = serializers.SerializerMethodField()
     storage_saved_gb_display = serializers.SerializerMethodField()
 
@@ -44,6 +83,9 @@ class StorageSavingsSummarySerializer(serializers.ModelSerializer):
             'storage_saved_gb',
             'storage_saved_mb_display',
             'storage_saved_gb_display',
+            'chunk_storage_saved_mb',
+            'compression_saved_mb',
+            'delta_saved_mb',
             'unique_files_shared',
             'most_duplicated_type',
             'updated_at',
@@ -54,4 +96,30 @@ class StorageSavingsSummarySerializer(serializers.ModelSerializer):
         return f"{obj.storage_saved_mb:.2f} MB"
 
     def get_storage_saved_gb_display(self, obj):
-        return f"{obj.storage_saved_gb:.2f} GB"
\ No newline at end of file
+        return f"{obj.storage_saved_gb:.2f} GB"
+
+class UploadNegotiationSerializer(serializers.Serializer):
+    """A file the client wants to upload, announced by its hash before sending the body"""
+    content_hash = serializers.RegexField(r'^[0-9a-f]{64}$')
+    hash_algorithm = serializers.ChoiceField(choices=sorted(HASH_ALGORITHMS), default='sha256')
+    size = serializers.IntegerField(min_value=0)
+    filename = serializers.CharField(max_length=255)
+    file_type = serializers.CharField(max_length=100, default='application/octet-stream')
+
+
+class SummaryRangeSerializer(serializers.Serializer):
+    """Query parameters of the summary time-series endpoint"""
+    MAX_DAYS = 3660
+
+    start = serializers.DateField()
+    end = serializers.DateField()
+    granularity = serializers.ChoiceField(choices=DailySavingsRollup.GRANULARITIES, default='day')
+    file_type = serializers.CharField(max_length=100, required=False)
+
+    def validate(self, attrs):
+        days = (attrs['end'] - attrs['start']).days + 1
+        if days < 1:
+            raise serializers.ValidationError('start must not be after end')
+        if days > self.MAX_DAYS:
+            raise serializers.ValidationError(f'Range is limited to {self.MAX_DAYS} days')
+        return attrs
@@ -0,0 +1,366 @@
+from collections import Counter
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import Case, Count, Exists, F, IntegerField, OuterRef, Value, When
+
+from .chunking import release_chunks_for
+from .delta import release_base, request_budget
+from .events import record_duplicates
+from .models import ChunkSignature, File, FileContent, DeduplicationEvent, SimilarityFeature, StorageSavingsSummary
+from .presence import might_exist, record_contents
+from .storage import place_in_content_store, save_chunk_manifest, save_similarity_features
+from .utils import hash_algorithm
+
+# Files per transaction in delete_files
+DELETE_BATCH_SIZE = 1000
+
+
+def store_upload(uploaded_file, content_hash, filename, file_type):
+    """
+    Create a File for an upload, reusing existing content with the same hash.
+
+    New content is written to the content store before any database write,
+    then the upload's rows (content, file, reference count, savings) are
+    written in one transaction, so each upload holds the database's write
+    lock once and only briefly. Content the presence filter rules out is
+    not looked up first (see presence.py).
+
+    Args:
+        uploaded_file: File object holding the upload's bytes
+        content_hash: Hex digest of the upload
+        filename: Original filename to record
+        file_type: MIME type to record
+
+    Returns:
+        Tuple of (File, created) where created is False for duplicates
+    """
+    file_content = None
+    if might_exist(content_hash):
+        file_content = FileContent.objects.filter(content_hash=content_hash).first()
+    if file_content is None:
+        file_content = FileContent(
+            content_hash=content_hash,
+            size=uploaded_file.size,
+            hash_algorithm=hash_algorithm(getattr(uploaded_file, 'hash_algorithm', None)),
+            reference_count=0
+        )
+        # New content - move the upload into the content store
+        place_in_content_store(file_content, uploaded_file, file_type)
+        try:
+            with transaction.atomic():
+                file_content.save(force_insert=True)
+                save_chunk_manifest(file_content)
+                save_similarity_features(file_content)
+                if file_content.chunk_bytes_saved:
+                    StorageSavingsSummary.record_chunk_savings(file_content.chunk_bytes_saved)
+                if file_content.is_compressed:
+                    StorageSavingsSummary.record_compression_savings(file_content.compression_bytes_saved)
+                if file_content.is_delta:
+                    StorageSavingsSummary.record_delta_savings(file_content.delta_bytes_saved)
+                file_record = add_reference(file_content, filename, file_type, is_duplicate=False)
+            record_contents([content_hash])
+            return file_record, True
+        except IntegrityError:
+            # Race: another request stored the same content since our lookup, so this is a duplicate.
+            # Content-addressed blobs of the same hash hold the same bytes, so nothing is lost.
+            if file_content.is_delta:
+                release_base(file_content.delta_base_id)
+            file_content = FileContent.objects.get(content_hash=content_hash)
+            record_contents([content_hash])
+
+    return add_reference(file_content, filename, file_type), False
+
+
+def add_reference(file_content, filename, file_type, is_duplicate=True):
+    """
+    Create a File pointing at existing content.
+
+    Duplicates also record a DeduplicationEvent and update the savings
+    summaries, or queue that for the background worker (see events.py).
+
+    Returns:
+        The new File
+    """
+    with transaction.atomic():
+        # Increment reference count
+        file_content.increment_reference()
+
+        # Create File metadata record
+        file_record = File.objects.create(
+            file_content=file_content,
+            original_filename=filename,
+            file_type=file_type,
+            size=file_content.size
+        )
+
+        # If duplicate detected, record the deduplication event (or queue it for the worker)
+        if is_duplicate:
+            record_duplicates([DeduplicationEvent(
+                file_content=file_content,
+                file_reference=file_record,
+                original_filename=filename,
+                file_size=file_content.size,
+                file_type=file_type
+            )])
+
+    return file_record
+
+
+def negotiate_uploads(entries):
+    """
+    Link announced uploads to existing content without receiving their bodies.
+
+    Args:
+        entries: Dicts with content_hash, hash_algorithm, size, filename and file_type
+
+    Returns:
+        List of (entry, File or None); None means the client must upload the body
+    """
+    hashes = [entry['content_hash'] for entry in entries if might_exist(entry['content_hash'])]
+    known = FileContent.objects.in_bulk(hashes) if hashes else {}
+
+    results = []
+    for entry in entries:
+        file_content = known.get(entry['content_hash'])
+        # A size or algorithm mismatch means the hash was not computed over the same bytes
+        if (file_content is None or file_content.size != entry['size']
+                or file_content.hash_algorithm != entry['hash_algorithm']):
+            results.append((entry, None))
+            continue
+        file_record = add_reference(file_content, entry['filename'], entry['file_type'])
+        results.append((entry, file_record))
+    return results
+
+
+def store_uploads_batch(uploads):
+    """
+    Store many uploads with a fixed number of queries per batch.
+
+    Existing content is found with one IN query, new FileContent, File and
+    DeduplicationEvent rows are bulk inserted, reference counts of existing
+    content are bumped with one grouped UPDATE, and the savings summaries are
+    updated once. Blobs are written before the transaction opens, so a
+    failed batch leaves only unreferenced blobs behind. The batch shares one
+    request's budget of delta work (see delta.request_budget).
+
+    Args:
+        uploads: List of (uploaded_file, content_hash, filename, file_type)
+
+    Returns:
+        List of (File, created) in the same order as uploads
+    """
+    references = Counter(content_hash for _, content_hash, _, _ in uploads)
+    candidates = [content_hash for content_hash in references if might_exist(content_hash)]
+    existing = FileContent.objects.in_bulk(candidates) if candidates else {}
+
+    # One new FileContent per unseen hash; later uploads of it in the batch are duplicates
+    new_contents = {}
+    with request_budget():
+        for uploaded_file, content_hash, _, file_type in uploads:
+            if content_hash in existing or content_hash in new_contents:
+                continue
+            file_content = FileContent(
+                content_hash=content_hash,
+                size=uploaded_file.size,
+                hash_algorithm=hash_algorithm(getattr(uploaded_file, 'hash_algorithm', None)),
+                reference_count=references[content_hash]
+            )
+            place_in_content_store(file_content, uploaded_file, file_type)
+            new_contents[content_hash] = file_content
+
+    try:
+        with transaction.atomic():
+            results = _insert_batch(uploads, references, existing, new_contents)
+    except IntegrityError:
+        # Another request created some of the same content since our lookup
+        raced = FileContent.objects.in_bulk(list(new_contents))
+        existing.update(raced)
+        for content_hash in raced:
+            if new_contents[content_hash].is_delta:
+                release_base(new_contents[content_hash].delta_base_id)
+            del new_contents[content_hash]
+        record_contents(raced)
+        with transaction.atomic():
+            results = _insert_batch(uploads, references, existing, new_contents)
+    record_contents(new_contents)
+    return results
+
+
+def _insert_batch(uploads, references, existing, new_contents):
+    FileContent.objects.bulk_create(new_contents.values())
+    for file_content in new_contents.values():
+        save_chunk_manifest(file_content)
+        save_similarity_features(file_content)
+    chunk_bytes_saved = sum(file_content.chunk_bytes_saved for file_content in new_contents.values())
+    if chunk_bytes_saved:
+        StorageSavingsSummary.record_chunk_savings(chunk_bytes_saved)
+    compression_bytes_saved = sum(file_content.compression_bytes_saved for file_content in new_contents.values())
+    if compression_bytes_saved:
+        StorageSavingsSummary.record_compression_savings(compression_bytes_saved)
+    delta_bytes_saved = sum(file_content.delta_bytes_saved for file_content in new_contents.values())
+    if delta_bytes_saved:
+        StorageSavingsSummary.record_delta_savings(delta_bytes_saved)
+
+    if existing:
+        # Apply every existing content's reference delta in one UPDATE
+        FileContent.objects.filter(pk__in=list(existing)).update(
+            reference_count=F('reference_count') + Case(
+                *[When(pk=content_hash, then=Value(references[content_hash])) for content_hash in existing],
+                default=Value(0),
+                output_field=IntegerField()
+            )
+        )
+
+    results = []
+    seen = set()
+    for uploaded_file, content_hash, filename, file_type in uploads:
+        file_content = existing.get(content_hash) or new_contents[content_hash]
+        created = content_hash in new_contents and content_hash not in seen
+        seen.add(content_hash)
+        file_record = File(
+            file_content=file_content, original_filename=filename, file_type=file_type, size=file_content.size
+        )
+        results.append((file_record, created))
+    File.objects.bulk_create([file_record for file_record, _ in results])
+
+    events = [
+        DeduplicationEvent(
+            file_content=file_record.file_content,
+            file_reference=file_record,
+            original_filename=file_record.original_filename,
+            file_size=file_record.file_content.size,
+            file_type=file_record.file_type
+        )
+        for file_record, created in results if not created
+    ]
+    if events:
+        record_duplicates(events)
+
+    for file_content in existing.values():
+        file_content.reference_count += references[file_content.content_hash]
+    return results
+
+
+def delete_files(queryset, batch_size=DELETE_BATCH_SIZE):
+    """
+    Delete the Files of a queryset in batches, releasing their content.
+
+    Each batch runs in one transaction with a fixed number of statements:
+    one grouped query for the per-content reference deltas, the File (and
+    DeduplicationEvent) deletes, one CASE update of the reference counts, and
+    one delete of the contents left without references. Their blobs are
+    removed together once the batch commits.
+
+    Args:
+        queryset: File queryset selecting the files to delete
+        batch_size: Files deleted per transaction
+
+    Returns:
+        Tuple of (files deleted, contents deleted)
+    """
+    files_deleted = contents_deleted = 0
+    last_pk = None
+    while True:
+        # Walk the selection in primary key order so each batch is an index range
+        batch = queryset.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        ids = list(batch.values_list('pk', flat=True)[:batch_size])
+        if ids:
+            last_pk = ids[-1]
+            with transaction.atomic():
+                deleted, released = _delete_file_batch(ids)
+            files_deleted += deleted
+            contents_deleted += released
+        if len(ids) < batch_size:
+            return files_deleted, contents_deleted
+
+
+def _delete_file_batch(ids):
+    deltas = dict(
+        File.objects.filter(pk__in=ids).order_by().values('file_content')
+        .annotate(count=Count('pk')).values_list('file_content', 'count')
+    )
+    if not deltas:
+        return 0, 0
+    files_deleted = sum(deltas.values())
+    # Direct DELETEs: the ORM's collector would load every row and delete in chunks of 100
+    DeduplicationEvent.objects.filter(file_reference__in=ids)._raw_delete(using=DEFAULT_DB_ALIAS)
+    File.objects.filter(pk__in=ids)._raw_delete(using=DEFAULT_DB_ALIAS)
+
+    FileContent.objects.filter(pk__in=list(deltas)).update(
+        reference_count=F('reference_count') - Case(
+            *[When(pk=content_hash, then=Value(count)) for content_hash, count in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField()
+        )
+    )
+
+    contents_deleted = release_contents(
+        FileContent.objects.filter(pk__in=list(deltas), reference_count__lte=0)
+    )
+    return files_deleted, contents_deleted
+
+
+def release_contents(queryset):
+    """
+    Delete the FileContents in queryset that no File references.
+
+    Chunked contents drop their chunk references and deltas give back their
+    base's reference, releasing bases left without references in turn; blobs
+    are removed after commit. Contents still referenced by a File or a delta
+    are left alone whatever their reference_count says.
+
+    Args:
+        queryset: FileContent queryset of candidates
+
+    Returns:
+        Int: number of contents deleted
+    """
+    released = list(
+        queryset
+        # Guard against a drifted counter: never release content a File still uses
+        .exclude(Exists(File.objects.filter(file_content=OuterRef('pk'))))
+        .exclude(Exists(FileContent.objects.filter(delta_base=OuterRef('pk'))))
+        .values_list('content_hash', 'file', 'storage_format', 'delta_base')
+    )
+    if not released:
+        return 0
+    with transaction.atomic():
+        chunked = [content_hash for content_hash, _, storage_format, _ in released
+                   if storage_format == FileContent.FORMAT_CHUNKED]
+        if chunked:
+            release_chunks_for(chunked)
+        released_hashes = [content_hash for content_hash, _, _, _ in released]
+        # Direct DELETEs, as in _delete_file_batch; no File points at these, so neither do its events
+        SimilarityFeature.objects.filter(file_content__in=released_hashes)._raw_delete(using=DEFAULT_DB_ALIAS)
+        ChunkSignature.objects.filter(file_content__in=released_hashes)._raw_delete(using=DEFAULT_DB_ALIAS)
+        FileContent.objects.filter(pk__in=released_hashes)._raw_delete(using=DEFAULT_DB_ALIAS)
+
+        bases = Counter(base for _, _, _, base in released if base)
+        if bases:
+            FileContent.objects.filter(pk__in=list(bases)).update(
+                reference_count=F('reference_count') - Case(
+                    *[When(pk=content_hash, then=Value(count)) for content_hash, count in bases.items()],
+                    default=Value(0),
+                    output_field=IntegerField()
+                )
+            )
+            # At most FILES_DELTA_MAX_CHAIN_DEPTH levels deep
+            released_bases = release_contents(FileContent.objects.filter(pk__in=list(bases), reference_count__lte=0))
+        else:
+            released_bases = 0
+
+        names = [name for _, name, _, _ in released if name]
+        storage = FileContent._meta.get_field('file').storage
+
+        def _delete_blobs():
+            for name in names:
+                try:
+                    storage.delete(name)
+                except Exception:
+                    # swallow storage errors here; cleanup command can be used later
+                    pass
+
+        transaction.on_commit(_delete_blobs)
+    return len(released) + released_bases
@@ -0,0 +1,235 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File as DjangoFile
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, default_storage
+
+# Uploads are spooled next to the blobs they become so that committing them
+# is a rename on the same filesystem rather than a copy.
+CONTENT_TEMP_DIR = os.path.join('content', 'tmp')
+
+# Deepest shard layout open_blob looks for a moved blob in
+MAX_SHARD_DEPTH = 4
+
+
+def content_temp_dir(storage=None):
+    """
+    Return the absolute path of the content store's temporary directory.
+
+    Returns None when the storage backend has no local filesystem path.
+    """
+    storage = storage or default_storage
+    try:
+        path = storage.path(CONTENT_TEMP_DIR)
+    except NotImplementedError:
+        return None
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def shard_dirs(blob_hash, depth=None):
+    """
+    Return the directories a blob is sharded into under its store directory.
+
+    Each level is the next two hex characters of the hash, so depth 2 puts
+    ``abcd...`` under ``ab/cd/``; depth defaults to FILES_CONTENT_SHARD_DEPTH.
+    """
+    if depth is None:
+        depth = settings.FILES_CONTENT_SHARD_DEPTH
+    return [blob_hash[level * 2:level * 2 + 2] for level in range(depth)]
+
+
+def layout_names(name):
+    """Yield the names a blob stored as name has in every shard layout, other than name itself."""
+    store = name.split('/', 1)[0]
+    base = os.path.basename(name)
+    blob_hash = base.split('.', 1)[0]
+    for depth in range(MAX_SHARD_DEPTH + 1):
+        candidate = os.path.join(store, *shard_dirs(blob_hash, depth), base)
+        if candidate != name:
+            yield candidate
+
+
+def open_blob(storage, name):
+    """
+    Open a blob for reading, following it into another shard layout if it has moved.
+
+    reshard_content renames blobs while the site is up, so a row read just
+    before its batch committed can name a path that is already gone.
+    """
+    try:
+        return storage.open(name, 'rb')
+    except FileNotFoundError:
+        for candidate in layout_names(name):
+            try:
+                return storage.open(candidate, 'rb')
+            except FileNotFoundError:
+                continue
+        raise
+
+
+def link_blob(storage, old_name, new_name):
+    """
+    Make the blob at old_name also available at new_name.
+
+    A hard link on local storage, so no bytes are copied; other backends get
+    a copy. Raises OSError if the link cannot be made.
+    """
+    if not isinstance(storage, FileSystemStorage):
+        with storage.open(old_name, 'rb') as blob:
+            storage.save(new_name, blob)
+        return
+    destination = storage.path(new_name)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    if not os.path.exists(destination):
+        os.link(storage.path(old_name), destination)
+
+
+def touch_blob(path):
+    """
+    Mark an existing blob as just written.
+
+    An upload that finds its blob already in place commits a row pointing at
+    it moments later; the new mtime keeps the garbage collector's grace
+    period (see files.gc) from sweeping the blob in between.
+    """
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def place_in_content_store(file_content, uploaded_file, file_type=None):
+    """
+    Write an upload to the content store in the first format that applies.
+
+    The order is: chunks if chunking is enabled for its size, a pack file for
+    small content, a delta against similar stored content, a compressed blob
+    for a compressible file_type (default: the upload's content type), and
+    otherwise a plain blob at the hash path, renamed into place so a path
+    never holds a partial file. Chunk manifests and similarity sketches stay
+    on the instance until save_chunk_manifest or save_similarity_features is
+    called. Sets the storage fields of file_content but does not save the row.
+    """
+    from .chunking import should_chunk, write_chunks
+    from .compression import choose_codec
+    from .delta import place_as_delta, should_delta
+    from .packs import place_in_pack, should_pack
+
+    if should_chunk(uploaded_file.size):
+        manifest, bytes_saved = write_chunks(uploaded_file)
+        file_content.storage_format = file_content.FORMAT_CHUNKED
+        file_content.chunk_bytes_saved = bytes_saved
+        file_content.chunk_manifest = manifest
+        file_content.chunk_source = uploaded_file
+        return
+
+    if should_pack(uploaded_file.size) and isinstance(file_content.file.storage, FileSystemStorage):
+        place_in_pack(file_content, uploaded_file)
+        return
+
+    if should_delta(uploaded_file.size) and place_as_delta(file_content, uploaded_file):
+        return
+
+    codec = choose_codec(file_type or getattr(uploaded_file, 'content_type', None), uploaded_file.size)
+    if codec and _place_compressed(file_content, uploaded_file, codec):
+        return
+
+    storage = file_content.file.storage
+    if not isinstance(storage, FileSystemStorage):
+        file_content.file.save(file_content.content_hash, uploaded_file, save=False)
+        return
+
+    name = file_content.file.field.generate_filename(file_content, file_content.content_hash)
+    destination = storage.path(name)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    in_content_store = getattr(uploaded_file, 'in_content_store', False)
+
+    if os.path.exists(destination):
+        # Content-addressed: an existing blob at this path has the same bytes
+        touch_blob(destination)
+        if in_content_store:
+            os.remove(uploaded_file.temporary_file_path())
+    else:
+        if in_content_store:
+            os.replace(uploaded_file.temporary_file_path(), destination)
+        elif hasattr(uploaded_file, 'temporary_file_path'):
+            # Spooled elsewhere: a rename if on the same filesystem, else a copy
+            fd, staged = tempfile.mkstemp(dir=content_temp_dir(storage))
+            os.close(fd)
+            file_move_safe(uploaded_file.temporary_file_path(), staged, allow_overwrite=True)
+            os.replace(staged, destination)
+        else:
+            with tempfile.NamedTemporaryFile(dir=content_temp_dir(storage), delete=False) as temp:
+                for chunk in uploaded_file.chunks():
+                    temp.write(chunk)
+            os.replace(temp.name, destination)
+        if storage.file_permissions_mode is not None:
+            os.chmod(destination, storage.file_permissions_mode)
+
+    file_content.file.name = name
+
+
+def _place_compressed(file_content, uploaded_file, codec):
+    """
+    Store a compressed copy of an upload at file_content's path for codec.
+
+    Returns False, leaving file_content untouched, if compression would not
+    save enough to be worth it.
+    """
+    from .compression import CODEC_NONE, compress_file, is_worth_storing
+
+    file_content.codec = codec
+    storage = file_content.file.storage
+    temp_dir = content_temp_dir(storage)
+    name = file_content.file.field.generate_filename(file_content, file_content.content_hash)
+    destination = storage.path(name) if temp_dir is not None else None
+
+    if destination is not None and os.path.exists(destination):
+        # Content-addressed: an existing blob at this path holds the same bytes in this codec
+        touch_blob(destination)
+        file_content.stored_size = os.path.getsize(destination)
+    else:
+        uploaded_file.seek(0)
+        with tempfile.NamedTemporaryFile(dir=temp_dir, delete=False) as temp:
+            stored_size = compress_file(uploaded_file, temp, codec)
+        if not is_worth_storing(uploaded_file.size, stored_size):
+            os.remove(temp.name)
+            uploaded_file.seek(0)
+            file_content.codec = CODEC_NONE
+            return False
+        file_content.stored_size = stored_size
+        if destination is None:
+            with open(temp.name, 'rb') as compressed:
+                file_content.file.save(file_content.content_hash, DjangoFile(compressed), save=False)
+            os.remove(temp.name)
+            return True
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(temp.name, destination)
+        if storage.file_permissions_mode is not None:
+            os.chmod(destination, storage.file_permissions_mode)
+
+    if getattr(uploaded_file, 'in_content_store', False):
+        # The raw upload is no longer needed
+        os.remove(uploaded_file.temporary_file_path())
+    file_content.file.name = name
+    return True
+
+
+def save_chunk_manifest(file_content):
+    """Record the chunk references of content placed in chunked mode, if any."""
+    manifest = getattr(file_content, 'chunk_manifest', None)
+    if manifest is not None:
+        from .chunking import save_manifest
+
+        save_manifest(file_content, manifest, getattr(file_content, 'chunk_source', None))
+
+
+def save_similarity_features(file_content):
+    """Index the similarity sketch of content placed with delta storage enabled, if any."""
+    if getattr(file_content, 'similarity_bands', None):
+        from .delta import save_features
+
+        save_features(file_content)
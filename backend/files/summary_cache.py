@@ -0,0 +1,66 @@
+"""
+Cached read path for the savings summaries.
+
+Serialized summaries are cached under a key that includes a version number.
+The version is bumped whenever a summary changes (new deduplication events,
+chunk or compression savings, recalculation), so the next read rebuilds the
+entry. The version is a database row rather than a cache key, so a bump is
+seen by every worker even when each has its own per-process cache; reading it
+costs one query per request. FILES_SUMMARY_CACHE_TTL only bounds how long an
+unused entry is kept.
+
+Each entry carries an ETag of its payload, so a poller revalidating with
+If-None-Match gets a 304 from the cache without building the summary.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.db.models import F
+
+VERSION_ID = 1
+
+
+def current_version():
+    from .models import SummaryCacheVersion
+
+    version = SummaryCacheVersion.objects.filter(pk=VERSION_ID).values_list('version', flat=True).first()
+    # Row missing (e.g. a flushed database): the first bump creates it
+    return 0 if version is None else version
+
+
+def bump_version():
+    """Invalidate every cached summary, in every worker."""
+    from .models import SummaryCacheVersion
+
+    if SummaryCacheVersion.objects.filter(pk=VERSION_ID).update(version=F('version') + 1):
+        return
+    try:
+        SummaryCacheVersion(pk=VERSION_ID).save(force_insert=True)
+    except IntegrityError:
+        # Created by a concurrent bump, which is as good as this one
+        pass
+
+
+def payload_etag(data):
+    digest = hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def get_cached_summary(period, build):
+    """
+    Return (etag, data) for a summary period, calling build() on a cache miss.
+
+    Args:
+        period: Name of the period, e.g. 'weekly'
+        build: Callable returning the serialized summary
+    """
+    key = f'files:summary:{period}:{current_version()}'
+    entry = cache.get(key)
+    if entry is None:
+        data = build()
+        entry = (payload_etag(data), data)
+        cache.set(key, entry, timeout=settings.FILES_SUMMARY_CACHE_TTL)
+    return entry
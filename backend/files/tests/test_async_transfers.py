@@ -0,0 +1,137 @@
+import hashlib
+import json
+import shutil
+import tempfile
+
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.test import TransactionTestCase, override_settings
+
+from ..asgi import FileTransferApp
+from ..models import ChunkedUpload, File, FileContent
+
+
+async def _not_django(scope, receive, send):
+    raise AssertionError('request should not reach Django')
+
+
+class AsyncTransferTest(TransactionTestCase):
+    # ORM calls run on worker threads, so tests cannot share a wrapping transaction
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.app = FileTransferApp(_not_django)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def request(self, method, path, query='', body=b'', headers=(), piece_size=1000):
+        """Send body in pieces and return (status, headers, body)."""
+        @async_to_sync
+        async def run():
+            communicator = ApplicationCommunicator(self.app, {
+                'type': 'http',
+                'method': method,
+                'path': path,
+                'query_string': query.encode(),
+                'headers': list(headers),
+            })
+            pieces = [body[i:i + piece_size] for i in range(0, len(body), piece_size)] or [b'']
+            for i, piece in enumerate(pieces):
+                await communicator.send_input({
+                    'type': 'http.request',
+                    'body': piece,
+                    'more_body': i < len(pieces) - 1,
+                })
+            start = await communicator.receive_output(timeout=10)
+            content = b''
+            while True:
+                message = await communicator.receive_output(timeout=10)
+                content += message.get('body', b'')
+                if not message.get('more_body', False):
+                    break
+            return start['status'], dict(start['headers']), content
+
+        return run()
+
+    def test_streamed_upload_is_hashed_and_deduplicated(self):
+        data = b'streamed ' * 5000
+        status, _, body = self.request(
+            'POST', '/api/async/files/', 'filename=a.txt', data, [(b'content-type', b'text/plain')]
+        )
+        self.assertEqual(status, 201)
+        body = json.loads(body)
+        self.assertFalse(body['is_duplicate'])
+        self.assertEqual(body['file_type'], 'text/plain')
+
+        fc = FileContent.objects.get(content_hash=hashlib.sha256(data).hexdigest())
+        with open(fc.file.path, 'rb') as stored:
+            self.assertEqual(stored.read(), data)
+
+        status, _, body = self.request('POST', '/api/async/files/', 'filename=b.txt', data)
+        self.assertEqual(status, 201)
+        self.assertTrue(json.loads(body)['is_duplicate'])
+        fc.refresh_from_db()
+        self.assertEqual(fc.reference_count, 2)
+
+    def test_chunked_upload_and_download(self):
+        chunks = [b'a' * 3000, b'b' * 3000, b'c' * 10]
+        for index in (1, 0, 2):
+            status, _, body = self.request(
+                'PUT', '/api/async/files/upload-chunk/',
+                f'upload_id=up-1&chunk_index={index}&total_chunks=3&filename=data.csv&file_type=text/csv',
+                chunks[index],
+            )
+        self.assertEqual(status, 201)
+        body = json.loads(body)
+        self.assertTrue(body['complete'])
+        self.assertFalse(ChunkedUpload.objects.filter(pk='up-1').exists())
+
+        file_record = File.objects.get(pk=body['file']['id'])
+        status, headers, content = self.request('GET', f'/api/async/files/{file_record.pk}/download/')
+        self.assertEqual(status, 200)
+        self.assertEqual(content, b''.join(chunks))
+        self.assertEqual(headers[b'content-length'], b'6010')
+        self.assertEqual(headers[b'content-type'], b'text/csv')
+
+        etag = headers[b'etag']
+        self.assertEqual(etag, f'"{file_record.file_content_id}"'.encode())
+        status, headers, content = self.request(
+            'GET', f'/api/async/files/{file_record.pk}/download/', headers=[(b'if-none-match', etag)]
+        )
+        self.assertEqual(status, 304)
+        self.assertEqual(content, b'')
+        self.assertEqual(headers[b'etag'], etag)
+
+    def test_invalid_requests(self):
+        status, _, _ = self.request('POST', '/api/async/files/', '', b'x')
+        self.assertEqual(status, 400)
+        status, _, _ = self.request('PUT', '/api/async/files/upload-chunk/', 'upload_id=../x', b'x')
+        self.assertEqual(status, 400)
+        status, _, _ = self.request('GET', '/api/async/files/00000000-0000-0000-0000-000000000000/download/')
+        self.assertEqual(status, 404)
+
+    def test_cross_origin_requests_get_cors_and_security_headers(self):
+        origin = (b'origin', b'http://localhost:3000')
+        status, headers, _ = self.request(
+            'POST', '/api/async/files/', 'filename=a.txt', b'cross-origin', headers=[origin]
+        )
+        self.assertEqual(status, 201)
+        self.assertEqual(headers[b'access-control-allow-origin'], b'http://localhost:3000')
+        self.assertEqual(headers[b'x-content-type-options'], b'nosniff')
+
+        status, headers, _ = self.request(
+            'OPTIONS', '/api/async/files/', headers=[origin, (b'access-control-request-method', b'POST')]
+        )
+        self.assertEqual(status, 200)
+        self.assertIn(b'POST', headers[b'access-control-allow-methods'])
+
+    @override_settings(ALLOWED_HOSTS=['files.example.com'])
+    def test_disallowed_host_is_rejected(self):
+        status, _, _ = self.request(
+            'POST', '/api/async/files/', 'filename=a.txt', b'x', headers=[(b'host', b'evil.test')]
+        )
+        self.assertEqual(status, 400)
+        self.assertFalse(File.objects.exists())
@@ -0,0 +1,67 @@
+import hashlib
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from ..models import FileContent, File, DeduplicationEvent, StorageSavingsSummary
+
+
+class BatchUploadTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.client = APIClient()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload_batch(self, contents):
+        files = [
+            SimpleUploadedFile(f'file{i}.txt', data, content_type='text/plain')
+            for i, data in enumerate(contents)
+        ]
+        return self.client.post('/api/files/batch/', {'files': files}, format='multipart')
+
+    def test_batch_deduplicates_within_and_across_batches(self):
+        existing_hash = hashlib.sha256(b'existing').hexdigest()
+        self.upload_batch([b'existing'])
+
+        resp = self.upload_batch([b'new', b'existing', b'new', b'other'])
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual([item['is_duplicate'] for item in resp.json()], [False, True, True, False])
+
+        self.assertEqual(File.objects.count(), 5)
+        self.assertEqual(FileContent.objects.count(), 3)
+        self.assertEqual(FileContent.objects.get(pk=existing_hash).reference_count, 2)
+        self.assertEqual(FileContent.objects.get(pk=hashlib.sha256(b'new').hexdigest()).reference_count, 2)
+        self.assertEqual(DeduplicationEvent.objects.count(), 2)
+
+        week_start, week_end = StorageSavingsSummary.get_current_week_dates()
+        summary = StorageSavingsSummary.objects.get(period_start=week_start, period_end=week_end)
+        self.assertEqual(summary.total_duplicates_detected, 2)
+        self.assertEqual(summary.total_storage_saved_bytes, len(b'existing') + len(b'new'))
+
+    def test_query_count_independent_of_batch_size(self):
+        # Warm up so the summaries for this period exist and every seed is already counted as shared
+        seeds = [b'seed-%d' % i for i in range(5)]
+        self.upload_batch(seeds + seeds)
+
+        def queries_for(contents):
+            with CaptureQueriesContext(connection) as captured:
+                self.upload_batch(contents)
+            return len(captured)
+
+        small = queries_for([b'seed-0', b'a-1'])
+        large = queries_for([b'seed-%d' % i for i in range(5)] + [b'b-%d' % i for i in range(20)])
+        self.assertEqual(small, large)
+
+    def test_empty_batch_rejected(self):
+        resp = self.client.post('/api/files/batch/', {}, format='multipart')
+        self.assertEqual(resp.status_code, 400)
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from ..models import DeduplicationEvent, File, FileContent
+from ..services import delete_files
+
+
+class BulkDeleteTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.client = APIClient()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload_batch(self, contents, name='file'):
+        files = [
+            SimpleUploadedFile(f'{name}{i}.txt', data, content_type='text/plain')
+            for i, data in enumerate(contents)
+        ]
+        resp = self.client.post('/api/files/batch/', {'files': files}, format='multipart')
+        self.assertEqual(resp.status_code, 201)
+        return [item['id'] for item in resp.json()]
+
+    def blob_path(self, content_hash):
+        return os.path.join(self.media_root, FileContent.objects.get(pk=content_hash).file.name)
+
+    def test_releases_contents_whose_last_reference_goes(self):
+        ids = self.upload_batch([b'shared', b'shared', b'shared', b'alone'])
+        shared, alone = File.objects.get(pk=ids[0]).file_content_id, File.objects.get(pk=ids[3]).file_content_id
+        shared_blob, alone_blob = self.blob_path(shared), self.blob_path(alone)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post('/api/files/bulk-delete/', {'ids': ids[1:]}, format='json')
+        self.assertEqual(resp.json(), {'deleted': 3, 'contents_deleted': 1})
+
+        self.assertEqual(FileContent.objects.get(pk=shared).reference_count, 1)
+        self.assertTrue(os.path.exists(shared_blob))
+        self.assertFalse(FileContent.objects.filter(pk=alone).exists())
+        self.assertFalse(os.path.exists(alone_blob))
+        self.assertEqual(DeduplicationEvent.objects.count(), 0)
+
+    def test_delete_by_filter(self):
+        self.upload_batch([b'a', b'b'], name='keep')
+        self.upload_batch([b'c', b'a'], name='drop')
+        resp = self.client.post('/api/files/bulk-delete/', {'filter': {'search': 'drop'}}, format='json')
+        self.assertEqual(resp.json(), {'deleted': 2, 'contents_deleted': 1})
+        self.assertEqual(
+            sorted(File.objects.values_list('original_filename', flat=True)), ['keep0.txt', 'keep1.txt']
+        )
+
+    def test_statements_per_batch_do_not_grow_with_files(self):
+        self.upload_batch([b'x%d' % i for i in range(5)])
+        with CaptureQueriesContext(connection) as small:
+            delete_files(File.objects.all())
+        self.upload_batch([b'y%d' % (i % 40) for i in range(200)])
+        with CaptureQueriesContext(connection) as large:
+            delete_files(File.objects.all())
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(File.objects.count(), 0)
+        self.assertEqual(FileContent.objects.count(), 0)
+
+    def test_rejects_ambiguous_or_unrestricted_requests(self):
+        for body in ({}, {'ids': [], 'filter': {'search': 'a'}}, {'filter': {}}, {'filter': {'search': ''}}):
+            resp = self.client.post('/api/files/bulk-delete/', body, format='json')
+            self.assertEqual(resp.status_code, 400, body)
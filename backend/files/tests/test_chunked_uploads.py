@@ -0,0 +1,95 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .. import chunk_store
+from ..models import ChunkedUpload, FileContent
+
+
+class ChunkedUploadTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.client = APIClient()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def send_chunk(self, upload_id, chunks, index):
+        return self.client.post('/api/files/upload-chunk/', {
+            'chunk': SimpleUploadedFile('blob', chunks[index]),
+            'chunk_index': index,
+            'total_chunks': len(chunks),
+            'upload_id': upload_id,
+            'filename': 'data.csv',
+            'file_type': 'text/csv',
+        }, format='multipart')
+
+    def test_chunks_assembled_in_index_order(self):
+        chunks = [b'a' * 1000, b'b' * 1000, b'c' * 10]
+        data = b''.join(chunks)
+
+        for index in (2, 0):
+            resp = self.send_chunk('up-1', chunks, index)
+            self.assertEqual(resp.status_code, 200)
+            self.assertFalse(resp.json()['complete'])
+        # Chunks are staged on disk and tracked in the database
+        upload = ChunkedUpload.objects.get(pk='up-1')
+        self.assertEqual(upload.received_chunks, 2)
+        self.assertEqual(upload.received_bytes, 1010)
+        # Chunk 0 was hashed on arrival; chunk 2 waits for chunk 1
+        self.assertEqual(upload.next_chunk_index, 1)
+        self.assertEqual(upload.hashed_bytes, 1000)
+        self.assertTrue(os.path.exists(chunk_store.chunk_path('up-1', 2)))
+
+        resp = self.send_chunk('up-1', chunks, 1)
+        self.assertEqual(resp.status_code, 201)
+        body = resp.json()
+        self.assertTrue(body['complete'])
+        self.assertFalse(body['is_duplicate'])
+
+        fc = FileContent.objects.get(content_hash=hashlib.sha256(data).hexdigest())
+        with open(fc.file.path, 'rb') as stored:
+            self.assertEqual(stored.read(), data)
+        self.assertFalse(ChunkedUpload.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'content', 'tmp', 'chunks')), [])
+
+    def test_cache_miss_defers_hashing_to_one_pass(self):
+        chunks = [b'first' * 100, b'second' * 100, b'third' * 100, b'last']
+        data = b''.join(chunks)
+
+        self.send_chunk('up-3', chunks, 0)
+        # Simulate the following chunks landing on a worker without the running hasher
+        chunk_store._hashers.clear()
+        with mock.patch.object(chunk_store, '_hash_assembled', wraps=chunk_store._hash_assembled) as hash_assembled:
+            self.send_chunk('up-3', chunks, 1)
+            self.assertTrue(ChunkedUpload.objects.get(pk='up-3').hash_deferred)
+            self.send_chunk('up-3', chunks, 2)
+            self.assertFalse(hash_assembled.called)
+            resp = self.send_chunk('up-3', chunks, 3)
+
+        # The assembled prefix is read once, when the upload finishes, not per chunk
+        self.assertEqual(hash_assembled.call_count, 1)
+        self.assertEqual(resp.status_code, 201)
+        self.assertTrue(FileContent.objects.filter(content_hash=hashlib.sha256(data).hexdigest()).exists())
+
+    def test_resent_chunk_counted_once(self):
+        chunks = [b'x' * 10, b'y' * 10, b'z' * 10]
+        for index in (0, 0, 2, 2):
+            resp = self.send_chunk('up-2', chunks, index)
+            self.assertFalse(resp.json()['complete'])
+        upload = ChunkedUpload.objects.get(pk='up-2')
+        self.assertEqual(upload.received_chunks, 2)
+        self.assertEqual(upload.hashed_bytes, 10)
+
+    def test_rejects_unsafe_upload_id(self):
+        resp = self.send_chunk('../../etc', [b'x'], 0)
+        self.assertEqual(resp.status_code, 400)
@@ -0,0 +1,137 @@
+import os
+import random
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .. import chunking
+from ..chunking import iter_chunks
+from ..models import ContentChunk, ContentChunkRef, FileContent, StorageSavingsSummary
+
+CDC_SETTINGS = {
+    'FILES_CDC_ENABLED': True,
+    'FILES_CDC_MIN_FILE_SIZE': 1024,
+    'FILES_CDC_MIN_CHUNK_SIZE': 256,
+    'FILES_CDC_AVG_CHUNK_SIZE': 1024,
+    'FILES_CDC_MAX_CHUNK_SIZE': 4096,
+}
+
+
+def random_bytes(size, seed):
+    return random.Random(seed).randbytes(size)
+
+
+@override_settings(**CDC_SETTINGS)
+class ChunkerTest(TestCase):
+    def test_chunks_cover_content_within_bounds(self):
+        data = random_bytes(100_000, seed=1)
+        chunks = list(iter_chunks(BytesIO(data)))
+        self.assertEqual(b''.join(chunks), data)
+        self.assertTrue(all(len(chunk) <= 4096 for chunk in chunks))
+        self.assertTrue(all(len(chunk) >= 256 for chunk in chunks[:-1]))
+
+    def test_boundaries_survive_insertion(self):
+        data = random_bytes(100_000, seed=2)
+        edited = data[:500] + b'inserted bytes' + data[500:]
+        original = set(iter_chunks(BytesIO(data)))
+        shifted = list(iter_chunks(BytesIO(edited)))
+        # Only the chunks around the edit should differ
+        self.assertLessEqual(sum(chunk not in original for chunk in shifted), 3)
+        self.assertGreater(len(shifted), 30)
+
+    def test_boundaries_do_not_depend_on_read_size(self):
+        data = random_bytes(100_000, seed=7)
+        whole = list(iter_chunks(BytesIO(data)))
+        # Many reads, each shorter than several chunks, so cuts fall near every buffer end
+        with mock.patch.object(chunking, 'READ_SIZE', 5_000):
+            buffered = list(iter_chunks(BytesIO(data)))
+        self.assertEqual(buffered, whole)
+        self.assertEqual(b''.join(buffered), data)
+        self.assertTrue(all(256 <= len(chunk) <= 4096 for chunk in buffered[:-1]))
+
+
+@override_settings(**CDC_SETTINGS)
+class ChunkedStorageTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.client = APIClient()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, data, name):
+        upload = SimpleUploadedFile(name, data, content_type='application/octet-stream')
+        return self.client.post('/api/files/', {'file': upload}, format='multipart').json()
+
+    def test_near_duplicates_share_chunks(self):
+        data = random_bytes(64_000, seed=3)
+        edited = data[:30_000] + b'a small edit' + data[30_000:]
+
+        first = self.upload(data, 'v1.bin')
+        second = self.upload(edited, 'v2.bin')
+        self.assertFalse(second['is_duplicate'])
+
+        v2 = FileContent.objects.get(size=len(edited))
+        self.assertTrue(v2.is_chunked)
+        self.assertEqual(v2.file.name, '')
+        self.assertGreater(v2.chunk_bytes_saved, len(data) // 2)
+        self.assertLess(sum(chunk.size for chunk in ContentChunk.objects.all()), len(data) + len(edited) // 2)
+
+        week_start, week_end = StorageSavingsSummary.get_current_week_dates()
+        summary = StorageSavingsSummary.objects.get(period_start=week_start, period_end=week_end)
+        self.assertEqual(summary.total_chunk_bytes_saved, v2.chunk_bytes_saved)
+
+        for file_data, expected in ((first, data), (second, edited)):
+            resp = self.client.get(f"/api/files/{file_data['id']}/download/")
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(b''.join(resp.streaming_content), expected)
+
+    def test_stream_reads_across_chunks_after_seek(self):
+        data = random_bytes(20_000, seed=4)
+        self.upload(data, 'seek.bin')
+        with FileContent.objects.get().open_stream() as stream:
+            stream.seek(12_345)
+            self.assertEqual(stream.read(5_000), data[12_345:17_345])
+
+    def test_deleting_last_reference_releases_chunks(self):
+        data = random_bytes(8_000, seed=5)
+        file_data = self.upload(data, 'gone.bin')
+        self.assertTrue(ContentChunk.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/files/{file_data['id']}/")
+
+        self.assertFalse(FileContent.objects.exists())
+        self.assertFalse(ContentChunkRef.objects.exists())
+        self.assertFalse(ContentChunk.objects.exists())
+        chunk_root = os.path.join(self.media_root, 'chunks')
+        self.assertEqual([name for _, _, names in os.walk(chunk_root) for name in names], [])
+
+    def test_chunk_released_during_upload_is_rewritten(self):
+        data = random_bytes(20_000, seed=6)
+        first = self.upload(data, 'first.bin')
+        write_chunks = chunking.write_chunks
+
+        def write_then_release(uploaded_file):
+            result = write_chunks(uploaded_file)
+            # The only other copy goes away after its chunks were found stored
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.delete(f"/api/files/{first['id']}/")
+            self.assertFalse(ContentChunk.objects.exists())
+            return result
+
+        with mock.patch.object(chunking, 'write_chunks', write_then_release):
+            second = self.upload(data + b'tail', 'second.bin')
+
+        storage = ContentChunk._meta.get_field('file').storage
+        self.assertTrue(all(storage.exists(chunk.file.name) for chunk in ContentChunk.objects.all()))
+        resp = self.client.get(f"/api/files/{second['id']}/download/")
+        self.assertEqual(b''.join(resp.streaming_content), data + b'tail')
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ..compression import CODEC_GZIP, CODEC_NONE, choose_codec
+from ..models import FileContent, StorageSavingsSummary
+
+CSV = b''.join(b'%d,widget,%d.99,in stock\n' % (i, i % 100) for i in range(5000))
+
+
+@override_settings(FILES_COMPRESSION_ENABLED=True)
+class CompressionTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.client = APIClient()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, name, data, content_type):
+        resp = self.client.post(
+            '/api/files/', {'file': SimpleUploadedFile(name, data, content_type=content_type)}, format='multipart'
+        )
+        self.assertEqual(resp.status_code, 201)
+        return resp.json()
+
+    def test_codec_choice(self):
+        self.assertEqual(choose_codec('text/csv', 100_000), CODEC_GZIP)
+        self.assertEqual(choose_codec('application/json; charset=utf-8', 100_000), CODEC_GZIP)
+        self.assertEqual(choose_codec('image/jpeg', 100_000), CODEC_NONE)
+        self.assertEqual(choose_codec('video/mp4', 100_000), CODEC_NONE)
+        # Too small to be worth it
+        self.assertEqual(choose_codec('text/csv', 100), CODEC_NONE)
+        with override_settings(FILES_COMPRESSION_ENABLED=False):
+            self.assertEqual(choose_codec('text/csv', 100_000), CODEC_NONE)
+
+    def test_text_is_stored_compressed_and_served_decompressed(self):
+        body = self.upload('stock.csv', CSV, 'text/csv')
+
+        fc = FileContent.objects.get()
+        self.assertEqual(fc.codec, CODEC_GZIP)
+        self.assertTrue(fc.file.name.endswith('.gz'))
+        self.assertEqual(os.path.getsize(fc.file.path), fc.stored_size)
+        self.assertLess(fc.stored_size * 5, fc.size)
+        # Compressed blobs are not served raw from MEDIA_URL
+        self.assertIn('/download/', body['file'])
+
+        resp = self.client.get(f"/api/files/{body['id']}/download/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(int(resp['Content-Length']), len(CSV))
+        self.assertEqual(b''.join(resp.streaming_content), CSV)
+
+        with fc.open_stream() as stream:
+            stream.seek(len(CSV) - 10)
+            self.assertEqual(stream.read(), CSV[-10:])
+
+    def test_incompressible_content_is_stored_raw(self):
+        self.upload('noise.bin', os.urandom(50_000), 'application/octet-stream')
+        self.upload('photo.jpg', CSV, 'image/jpeg')
+        for fc in FileContent.objects.all():
+            self.assertEqual(fc.codec, CODEC_NONE)
+            self.assertIsNone(fc.stored_size)
+            self.assertFalse(fc.file.name.endswith('.gz'))
+
+    def test_summary_reports_compression_separately(self):
+        self.upload('stock.csv', CSV, 'text/csv')
+        self.upload('copy.csv', CSV, 'text/csv')
+
+        fc = FileContent.objects.get()
+        week_start, week_end = StorageSavingsSummary.get_current_week_dates()
+        summary = StorageSavingsSummary.objects.get(period_start=week_start, period_end=week_end)
+        self.assertEqual(summary.total_compression_bytes_saved, fc.size - fc.stored_size)
+        self.assertEqual(summary.total_storage_saved_bytes, fc.size)
+
+        summary.recalculate()
+        self.assertEqual(summary.total_compression_bytes_saved, fc.size - fc.stored_size)
@@ -0,0 +1,44 @@
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ..services import store_upload
+
+
+class SQLiteProfileTest(TransactionTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_connections_get_the_profile_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 30000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_transactions_take_the_write_lock_up_front(self):
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                pass
+        self.assertEqual(queries.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+    def test_upload_writes_in_one_transaction(self):
+        for data in (b'new content', b'new content'):
+            upload = SimpleUploadedFile('a.txt', data, content_type='text/plain')
+            with CaptureQueriesContext(connection) as queries:
+                store_upload(upload, f'{len(data):064x}', 'a.txt', 'text/plain')
+            statements = [query['sql'].split()[0].upper() for query in queries.captured_queries]
+            self.assertEqual(statements.count('BEGIN'), 1)
+            begin = statements.index('BEGIN')
+            # Nothing is written outside the transaction
+            self.assertFalse({'INSERT', 'UPDATE', 'DELETE'} & set(statements[:begin]))
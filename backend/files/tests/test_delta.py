@@ -0,0 +1,144 @@
+import os
+import random
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ..models import ChunkSignature, File, FileContent, SimilarityFeature, StorageSavingsSummary
+
+DELTA_SETTINGS = {
+    'FILES_DELTA_ENABLED': True,
+    'FILES_DELTA_MIN_FILE_SIZE': 1024,
+    'FILES_DELTA_MAX_CHAIN_DEPTH': 2,
+}
+
+
+def edited(data, position, insert):
+    return data[:position] + insert + data[position + len(insert):]
+
+
+@override_settings(**DELTA_SETTINGS)
+class DeltaStorageTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.client = APIClient()
+        self.original = random.Random(25).randbytes(64 * 1024)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, data, name='a.bin'):
+        upload = SimpleUploadedFile(name, data, content_type='application/octet-stream')
+        resp = self.client.post('/api/files/', {'file': upload}, format='multipart')
+        self.assertEqual(resp.status_code, 201)
+        return resp.json()['id']
+
+    def download(self, file_id, **headers):
+        resp = self.client.get(f'/api/files/{file_id}/download/', **headers)
+        self.assertIn(resp.status_code, (200, 206))
+        return b''.join(resp.streaming_content)
+
+    def content_of(self, file_id):
+        return File.objects.get(pk=file_id).file_content
+
+    def test_near_duplicate_is_stored_as_a_delta(self):
+        base_id = self.upload(self.original)
+        version = edited(self.original, 30000, b'a small edit')
+        version_id = self.upload(version)
+
+        base = self.content_of(base_id)
+        delta = self.content_of(version_id)
+        self.assertEqual(base.storage_format, FileContent.FORMAT_FILE)
+        self.assertEqual(delta.storage_format, FileContent.FORMAT_DELTA)
+        self.assertEqual(delta.delta_base, base)
+        self.assertEqual(delta.delta_depth, 1)
+        self.assertTrue(delta.file.name.endswith('.delta'))
+        self.assertLess(delta.stored_size, len(version) // 10)
+        self.assertEqual(os.path.getsize(delta.file.path), delta.stored_size)
+        # The file holds one reference and the delta another
+        self.assertEqual(base.reference_count, 2)
+
+        self.assertEqual(self.download(version_id), version)
+        ranged = self.download(version_id, HTTP_RANGE='bytes=29000-31999')
+        self.assertEqual(ranged, version[29000:32000])
+        week_start, week_end = StorageSavingsSummary.get_current_week_dates()
+        summary = StorageSavingsSummary.objects.get(period_start=week_start, period_end=week_end)
+        self.assertEqual(summary.total_delta_bytes_saved, delta.size - delta.stored_size)
+        summary.recalculate()
+        self.assertEqual(summary.total_delta_bytes_saved, delta.size - delta.stored_size)
+
+        out = StringIO()
+        call_command('fsck_content', '--verify-blobs', stdout=out)
+        self.assertIn('No problems found.', out.getvalue())
+
+    def test_bases_are_matched_by_signature_without_reading_them(self):
+        base_id = self.upload(self.original)
+        self.assertTrue(ChunkSignature.objects.filter(file_content=self.content_of(base_id)).exists())
+
+        with mock.patch.object(FileContent, 'open_stream', side_effect=AssertionError('base was read')):
+            version_id = self.upload(edited(self.original, 5000, b'edit'))
+        self.assertEqual(self.content_of(version_id).storage_format, FileContent.FORMAT_DELTA)
+
+    @override_settings(FILES_DELTA_MAX_REQUEST_BYTES=100 * 1024)
+    def test_delta_work_per_request_is_capped(self):
+        self.upload(self.original)
+        versions = [edited(self.original, 1000 * (i + 1), b'version %d' % i) for i in range(2)]
+        uploads = [
+            SimpleUploadedFile(f'v{i}.bin', data, content_type='application/octet-stream')
+            for i, data in enumerate(versions)
+        ]
+        resp = self.client.post('/api/files/batch/', {'files': uploads}, format='multipart')
+        self.assertEqual(resp.status_code, 201)
+
+        formats = [self.content_of(entry['id']).storage_format for entry in resp.json()]
+        self.assertEqual(formats, [FileContent.FORMAT_DELTA, FileContent.FORMAT_FILE])
+
+    def test_unrelated_content_is_stored_whole(self):
+        self.upload(self.original)
+        other_id = self.upload(random.Random(1).randbytes(64 * 1024))
+        self.assertEqual(self.content_of(other_id).storage_format, FileContent.FORMAT_FILE)
+
+    def test_chain_depth_is_capped(self):
+        versions = [self.original]
+        for i in range(3):
+            versions.append(edited(versions[-1], 10000 * (i + 1), b'edit %d' % i))
+        ids = [self.upload(data) for data in versions]
+
+        depths = [self.content_of(file_id).delta_depth for file_id in ids]
+        self.assertTrue(all(depth <= 2 for depth in depths))
+        self.assertEqual(self.content_of(ids[-1]).storage_format, FileContent.FORMAT_DELTA)
+        # Content at the cap is not indexed as a base
+        at_cap = [self.content_of(file_id) for file_id, depth in zip(ids, depths) if depth == 2]
+        self.assertFalse(SimilarityFeature.objects.filter(file_content__in=at_cap).exists())
+        for file_id, data in zip(ids, versions):
+            self.assertEqual(self.download(file_id), data)
+
+    def test_base_outlives_its_files_until_the_delta_goes(self):
+        base_id = self.upload(self.original)
+        version = edited(self.original, 100, b'changed')
+        version_id = self.upload(version)
+        base_hash = self.content_of(base_id).content_hash
+
+        resp = self.client.delete(f'/api/files/{base_id}/')
+        self.assertEqual(resp.status_code, 204)
+        base = FileContent.objects.get(pk=base_hash)
+        self.assertEqual(base.reference_count, 1)
+        self.assertTrue(os.path.exists(base.file.path))
+        self.assertEqual(self.download(version_id), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.delete(f'/api/files/{version_id}/')
+        self.assertEqual(resp.status_code, 204)
+        self.assertFalse(FileContent.objects.exists())
+        self.assertFalse(SimilarityFeature.objects.exists())
+        self.assertFalse(ChunkSignature.objects.exists())
+        self.assertFalse(os.path.exists(base.file.path))
@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .. import hot_cache
+from ..downloads import RangeFile, RangeNotSatisfiable, parse_range
+from ..models import File, FileContent
+
+DATA = bytes(range(256)) * 40
+
+
+class DownloadTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.client = APIClient()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, data=DATA, content_type='application/octet-stream'):
+        resp = self.client.post(
+            '/api/files/', {'file': SimpleUploadedFile('data.bin', data, content_type=content_type)},
+            format='multipart'
+        )
+        self.assertEqual(resp.status_code, 201)
+        return resp.json()
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=990-5000', 1000), (990, 999))
+        # Unsupported forms fall back to the whole content
+        self.assertIsNone(parse_range(None, 1000))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 1000))
+        self.assertIsNone(parse_range('items=0-1', 1000))
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range('bytes=1000-', 1000)
+
+    def test_full_download_is_cacheable(self):
+        body = self.upload()
+        self.assertTrue(body['file'].endswith(f"/api/files/{body['id']}/download/"))
+
+        resp = self.client.get(body['file'])
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(b''.join(resp.streaming_content), DATA)
+        self.assertEqual(resp['ETag'], f'"{FileContent.objects.get().content_hash}"')
+        self.assertEqual(resp['Content-Length'], str(len(DATA)))
+        self.assertIn('immutable', resp['Cache-Control'])
+        self.assertEqual(resp['Accept-Ranges'], 'bytes')
+
+        resp = self.client.get(body['file'], HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+
+    def test_range_requests(self):
+        body = self.upload()
+        etag = f'"{FileContent.objects.get().content_hash}"'
+
+        resp = self.client.get(body['file'], HTTP_RANGE='bytes=100-199')
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp['Content-Range'], f'bytes 100-199/{len(DATA)}')
+        self.assertEqual(resp['Content-Length'], '100')
+        self.assertEqual(b''.join(resp.streaming_content), DATA[100:200])
+
+        resp = self.client.get(body['file'], HTTP_RANGE='bytes=-10', HTTP_IF_RANGE=etag)
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(b''.join(resp.streaming_content), DATA[-10:])
+
+        # A stale If-Range validator gets the whole content
+        resp = self.client.get(body['file'], HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(b''.join(resp.streaming_content), DATA)
+
+        resp = self.client.get(body['file'], HTTP_RANGE=f'bytes={len(DATA)}-')
+        self.assertEqual(resp.status_code, 416)
+        self.assertEqual(resp['Content-Range'], f'bytes */{len(DATA)}')
+
+    def test_range_file_exposes_positioned_descriptor(self):
+        self.upload()
+        stream = FileContent.objects.get().open_stream()
+        stream.seek(100)
+        range_file = RangeFile(stream, 50)
+        # sendfile starts at the descriptor's offset and stops after Content-Length bytes
+        self.assertEqual(os.lseek(range_file.fileno(), 0, os.SEEK_CUR), 100)
+        self.assertEqual(range_file.read(), DATA[100:150])
+        self.assertEqual(range_file.read(), b'')
+        range_file.close()
+
+    @override_settings(FILES_COMPRESSION_ENABLED=True)
+    def test_range_of_compressed_content(self):
+        data = b'line of text\n' * 2000
+        body = self.upload(data, 'text/plain')
+        self.assertTrue(FileContent.objects.get().is_compressed)
+
+        resp = self.client.get(body['file'], HTTP_RANGE='bytes=13000-13099')
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(b''.join(resp.streaming_content), data[13000:13100])
+
+    @override_settings(FILES_SENDFILE_BACKEND='nginx', FILES_SENDFILE_URL_PREFIX='/protected-media/')
+    def test_sendfile_handoff(self):
+        body = self.upload()
+        file_content = FileContent.objects.get()
+
+        resp = self.client.get(body['file'], HTTP_RANGE='bytes=0-9')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['X-Accel-Redirect'], f'/protected-media/{file_content.file.name}')
+        self.assertEqual(resp.content, b'')
+        self.assertEqual(resp['ETag'], f'"{file_content.content_hash}"')
+
+    @override_settings(FILES_HOT_CACHE_SIZE=2 * len(DATA), FILES_HOT_CACHE_MIN_REFERENCES=2)
+    def test_hot_content_is_served_from_memory(self):
+        unique = self.upload(b'only once')
+        hot = self.upload()
+        self.upload()
+        other = self.upload(DATA[::-1])
+        self.upload(DATA[::-1])
+
+        self.assertEqual(b''.join(self.client.get(unique['file']).streaming_content), b'only once')
+        self.assertEqual(b''.join(self.client.get(hot['file']).streaming_content), DATA)
+        # The blob is no longer read once cached
+        os.remove(File.objects.get(pk=hot['id']).file_content.file.path)
+        self.assertEqual(b''.join(self.client.get(hot['file']).streaming_content), DATA)
+        resp = self.client.get(hot['file'], HTTP_RANGE='bytes=10-19')
+        self.assertEqual(b''.join(resp.streaming_content), DATA[10:20])
+
+        # A third entry pushes the least recently used one out
+        self.client.get(other['file'])
+        self.upload(b'x' * len(DATA))
+        self.client.get(self.upload(b'x' * len(DATA))['file'])
+        self.assertEqual(self.client.get('/api/files/hot-cache/').json(), {
+            'enabled': True,
+            'pid': os.getpid(),
+            'entries': 2,
+            'bytes': 2 * len(DATA),
+            'max_bytes': 2 * len(DATA),
+            'hits': 2,
+            'misses': 3,
+            'hit_ratio': 0.4,
+            'evictions': 1,
+            'rejections': 1,
+        })
+        self.assertEqual(hot_cache.metrics()['entries'], 2)
@@ -0,0 +1,75 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import FileContent
+from ..services import store_upload
+
+
+class FsckTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.contents = []
+        for data, copies in ((b'one', 1), (b'two', 2), (b'three', 3)):
+            for _ in range(copies):
+                upload = SimpleUploadedFile('a.txt', data, content_type='text/plain')
+                file_record, _ = store_upload(upload, data.hex().rjust(64, '0'), 'a.txt', 'text/plain')
+            self.contents.append(file_record.file_content)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def fsck(self, *args):
+        out = StringIO()
+        call_command('fsck_content', '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_clean_store_passes(self):
+        self.assertIn('No problems found.', self.fsck('--verify-blobs'))
+
+    def test_reports_and_repairs_drift(self):
+        one, two, three = self.contents
+        FileContent.objects.filter(pk=one.pk).update(reference_count=0)
+        FileContent.objects.filter(pk=three.pk).update(reference_count=7)
+
+        out = self.fsck()
+        self.assertIn('2 drifted reference counts (0 repaired)', out)
+        self.assertIn('reference_count 7, actually 3', out)
+        self.assertEqual(FileContent.objects.get(pk=three.pk).reference_count, 7)
+
+        self.assertIn('(2 repaired)', self.fsck('--repair'))
+        self.assertEqual(
+            dict(FileContent.objects.values_list('pk', 'reference_count')),
+            {one.pk: 1, two.pk: 2, three.pk: 3}
+        )
+
+    def test_verifies_blobs(self):
+        one, two, _ = self.contents
+        os.remove(os.path.join(self.media_root, one.file.name))
+        with open(os.path.join(self.media_root, two.file.name), 'ab') as blob:
+            blob.write(b'!')
+
+        out = self.fsck('--verify-blobs')
+        self.assertIn(f'{one.file.name} is missing', out)
+        self.assertIn(f'{two.file.name} is 4 bytes, expected 3', out)
+
+    def test_resumes_from_checkpoint(self):
+        one, two, three = sorted(self.contents, key=lambda fc: fc.pk)
+        FileContent.objects.filter(pk__in=[one.pk, three.pk]).update(reference_count=0)
+        checkpoint = os.path.join(self.media_root, 'fsck.json')
+        with open(checkpoint, 'w') as f:
+            json.dump({'check': 'content', 'after': one.pk}, f)
+
+        out = self.fsck('--checkpoint', checkpoint)
+        self.assertIn('Checked 2 records', out)
+        self.assertIn('1 drifted reference counts', out)
+        self.assertFalse(os.path.exists(checkpoint))
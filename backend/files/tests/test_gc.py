@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..gc import GarbageCollector, merge
+from ..models import File, FileContent
+from ..services import store_upload
+
+
+class GarbageCollectorTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.old = time.time() - 2 * 3600
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, data):
+        upload = SimpleUploadedFile('a.txt', data, content_type='text/plain')
+        file_record, _ = store_upload(upload, f'{len(data):064x}', 'a.txt', 'text/plain')
+        return file_record.file_content
+
+    def write_blob(self, name, age=None):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as blob:
+            blob.write(b'leftover')
+        if age is not None:
+            os.utime(path, (age, age))
+        return path
+
+    def set_up_store(self):
+        kept = [self.upload(b'x' * size) for size in range(1, 6)]
+        for fc in kept:
+            os.utime(os.path.join(self.media_root, fc.file.name), (self.old, self.old))
+        # A row whose file is gone, long enough ago to be collected
+        unreferenced = self.upload(b'unreferenced')
+        File.objects.filter(file_content=unreferenced).delete()
+        FileContent.objects.filter(pk=unreferenced.pk).update(created_at=timezone.now() - timedelta(hours=2))
+        paths = {
+            'orphan': self.write_blob(f"content/ab/{'ab' * 32}", age=self.old),
+            'in_flight': self.write_blob(f"content/cd/{'cd' * 32}"),
+            'other_codec': self.write_blob(f'{kept[0].file.name}.gz', age=self.old),
+            'orphan_chunk': self.write_blob(f"chunks/ef/{'ef' * 32}", age=self.old),
+            'temp': self.write_blob('content/tmp/tmpabc', age=self.old),
+            'unreferenced': os.path.join(self.media_root, unreferenced.file.name),
+        }
+        # A row whose blob is gone
+        os.remove(os.path.join(self.media_root, kept[1].file.name))
+        return kept, unreferenced, paths
+
+    def test_merge_pairs_blobs_with_rows(self):
+        blobs = [('a', 'content/a'), ('b', 'content/b'), ('b', 'content/b.gz'), ('d', 'content/d')]
+        rows = [('b', 'content/b'), ('c', 'content/c')]
+        self.assertEqual(list(merge(blobs, rows)), [
+            ('a', ['content/a'], None),
+            ('b', ['content/b', 'content/b.gz'], ('b', 'content/b')),
+            ('c', [], ('c', 'content/c')),
+            ('d', ['content/d'], None),
+        ])
+
+    def test_collects_orphans_on_both_sides(self):
+        kept, unreferenced, paths = self.set_up_store()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = GarbageCollector(batch_size=2, workers=2).run()
+
+        self.assertEqual(stats['orphan_blobs'], 3)
+        self.assertEqual(stats['blobs_deleted'], 3)
+        self.assertEqual(stats['contents_deleted'], 1)
+        self.assertEqual(stats['missing_blobs'], 1)
+        self.assertEqual(stats['temp_files_deleted'], 1)
+        for name in ('orphan', 'other_codec', 'orphan_chunk', 'temp', 'unreferenced'):
+            self.assertFalse(os.path.exists(paths[name]), name)
+        self.assertTrue(os.path.exists(paths['in_flight']))
+        self.assertFalse(FileContent.objects.filter(pk=unreferenced.pk).exists())
+        self.assertEqual(FileContent.objects.count(), len(kept))
+        for fc in kept[2:]:
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, fc.file.name)))
+
+    def test_dry_run_deletes_nothing(self):
+        kept, unreferenced, paths = self.set_up_store()
+        out = StringIO()
+
+        call_command('cleanup_orphaned_files', '--dry-run', stdout=out)
+
+        self.assertIn('Would delete 3 orphaned blobs, 1 orphaned FileContent records', out.getvalue())
+        self.assertTrue(all(os.path.exists(path) for path in paths.values()))
+        self.assertTrue(FileContent.objects.filter(pk=unreferenced.pk).exists())
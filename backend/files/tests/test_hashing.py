@@ -0,0 +1,69 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ..models import File, FileContent
+from ..utils import calculate_file_hash
+
+
+def blake2b_hex(data):
+    return hashlib.blake2b(data, digest_size=32).hexdigest()
+
+
+class HashingEngineTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.client = APIClient()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, data, name='file.txt'):
+        upload = SimpleUploadedFile(name, data, content_type='text/plain')
+        return self.client.post('/api/files/', {'file': upload}, format='multipart')
+
+    def test_calculate_file_hash_algorithms(self):
+        data = b'x' * 100_000
+        upload = SimpleUploadedFile('x.bin', data)
+        self.assertEqual(calculate_file_hash(upload), hashlib.sha256(data).hexdigest())
+        self.assertEqual(calculate_file_hash(upload, algorithm='blake2b'), blake2b_hex(data))
+        with self.assertRaises(ValueError):
+            calculate_file_hash(upload, algorithm='md5')
+
+    @override_settings(FILES_HASH_ALGORITHM='blake2b', FILE_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_configured_algorithm_recorded_per_content(self):
+        data = os.urandom(10_000)
+        self.assertEqual(self.upload(data).status_code, 201)
+        fc = FileContent.objects.get()
+        self.assertEqual(fc.content_hash, blake2b_hex(data))
+        self.assertEqual(fc.hash_algorithm, 'blake2b')
+
+    def test_rehash_command_rekeys_and_merges(self):
+        shared = b'same bytes'
+        self.upload(shared, name='old.txt')
+        self.upload(b'only sha256', name='other.txt')
+        with override_settings(FILES_HASH_ALGORITHM='blake2b'):
+            self.upload(shared, name='new.txt')
+        self.assertEqual(FileContent.objects.count(), 3)
+
+        call_command('rehash_content', algorithm='blake2b', stdout=StringIO())
+
+        self.assertFalse(FileContent.objects.exclude(hash_algorithm='blake2b').exists())
+        merged = FileContent.objects.get(pk=blake2b_hex(shared))
+        self.assertEqual(merged.reference_count, 2)
+        self.assertEqual(File.objects.filter(file_content=merged).count(), 2)
+
+        moved = FileContent.objects.get(pk=blake2b_hex(b'only sha256'))
+        self.assertEqual(moved.file.name, os.path.join('content', moved.content_hash[:2], moved.content_hash[2:4], moved.content_hash))
+        with open(moved.file.path, 'rb') as blob:
+            self.assertEqual(blob.read(), b'only sha256')
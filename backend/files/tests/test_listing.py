@@ -0,0 +1,80 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import File, FileContent
+
+
+@override_settings(FILES_LIST_PAGE_SIZE=10)
+class FileListingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.now = timezone.now()
+
+    def create_files(self, count, offset=0):
+        contents = FileContent.objects.bulk_create([
+            FileContent(content_hash=f'{offset + i:064x}', size=offset + i) for i in range(count)
+        ])
+        files = File.objects.bulk_create([
+            File(file_content=fc, original_filename=f'f{offset + i}', file_type='text/plain', size=fc.size)
+            for i, fc in enumerate(contents)
+        ])
+        # Pairs of files share a timestamp so the id tiebreak is exercised
+        for i, f in enumerate(files):
+            File.objects.filter(pk=f.pk).update(uploaded_at=self.now - timedelta(seconds=(offset + i) // 2))
+        return files
+
+    def walk(self, url='/api/files/'):
+        names = []
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            names += [row['original_filename'] for row in resp.json()['results']]
+            url = resp.json()['next']
+        return names
+
+    def test_pages_cover_every_file_once_in_order(self):
+        self.create_files(25)
+        names = self.walk()
+        self.assertEqual(len(names), 25)
+        self.assertEqual(len(set(names)), 25)
+        expected = list(File.objects.order_by('-uploaded_at', '-id').values_list('original_filename', flat=True))
+        self.assertEqual(names, expected)
+
+    def test_query_count_per_page_is_constant(self):
+        self.create_files(15)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/files/')
+        self.create_files(200, offset=15)
+        with CaptureQueriesContext(connection) as large:
+            resp = self.client.get('/api/files/')
+        with CaptureQueriesContext(connection) as deep:
+            self.client.get(resp.json()['next'])
+
+        self.assertEqual(len(small), 1)
+        self.assertEqual(len(large), 1)
+        self.assertEqual(len(deep), 1)
+
+    def test_cursor_is_stable_under_inserts(self):
+        self.create_files(20)
+        first = self.client.get('/api/files/').json()
+        # Newer uploads land before the cursor and do not shift the next page
+        File.objects.create(
+            file_content=FileContent.objects.create(content_hash='f' * 64, size=1),
+            original_filename='new', file_type='text/plain'
+        )
+        second = self.client.get(first['next']).json()
+        names = [row['original_filename'] for row in first['results'] + second['results']]
+        self.assertNotIn('new', names)
+        self.assertEqual(len(set(names)), 20)
+
+    def test_page_size_and_invalid_cursor(self):
+        self.create_files(5)
+        resp = self.client.get('/api/files/?page_size=2')
+        self.assertEqual(len(resp.json()['results']), 2)
+        self.assertIn('page_size=2', resp.json()['next'])
+        self.assertEqual(self.client.get('/api/files/?cursor=bogus').status_code, 404)
@@ -0,0 +1,54 @@
+import hashlib
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from ..models import FileContent, File, DeduplicationEvent
+
+
+class NegotiateUploadTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.known_hash = hashlib.sha256(b'known').hexdigest()
+        self.fc = FileContent.objects.create(content_hash=self.known_hash, size=5, reference_count=1)
+        File.objects.create(file_content=self.fc, original_filename='first.txt', file_type='text/plain')
+
+    def negotiate(self, payload):
+        return self.client.post('/api/files/negotiate/', payload, format='json')
+
+    def test_known_hash_is_linked_without_body(self):
+        resp = self.negotiate({
+            'content_hash': self.known_hash,
+            'size': 5,
+            'filename': 'copy.txt',
+            'file_type': 'text/plain',
+        })
+        self.assertEqual(resp.status_code, 200)
+        [result] = resp.json()['results']
+        self.assertEqual(result['status'], 'linked')
+        self.assertEqual(result['file']['original_filename'], 'copy.txt')
+
+        self.fc.refresh_from_db()
+        self.assertEqual(self.fc.reference_count, 2)
+        self.assertEqual(File.objects.count(), 2)
+        self.assertEqual(DeduplicationEvent.objects.get().original_filename, 'copy.txt')
+
+    def test_batch_reports_unknown_and_mismatched_hashes(self):
+        unknown_hash = hashlib.sha256(b'unknown').hexdigest()
+        resp = self.negotiate({'files': [
+            {'content_hash': self.known_hash, 'size': 5, 'filename': 'a.txt'},
+            {'content_hash': unknown_hash, 'size': 7, 'filename': 'b.txt'},
+            {'content_hash': self.known_hash, 'size': 6, 'filename': 'c.txt'},
+        ]})
+        self.assertEqual(resp.status_code, 200)
+        statuses = [(r['content_hash'], r['status']) for r in resp.json()['results']]
+        self.assertEqual(statuses, [
+            (self.known_hash, 'linked'),
+            (unknown_hash, 'upload_required'),
+            (self.known_hash, 'upload_required'),
+        ])
+        self.assertEqual(DeduplicationEvent.objects.count(), 1)
+
+    def test_invalid_hash_rejected(self):
+        resp = self.negotiate({'content_hash': 'not-a-hash', 'size': 1, 'filename': 'x'})
+        self.assertEqual(resp.status_code, 400)
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ..models import File, FileContent
+from ..packs import current_pack
+
+PACK_SETTINGS = {
+    'FILES_PACK_ENABLED': True,
+    'FILES_PACK_MAX_BLOB_SIZE': 100,
+    'FILES_PACK_TARGET_SIZE': 64,
+}
+
+
+@override_settings(**PACK_SETTINGS)
+class PackStorageTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.client = APIClient()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, data, name='a.txt'):
+        upload = SimpleUploadedFile(name, data, content_type='text/plain')
+        resp = self.client.post('/api/files/', {'file': upload}, format='multipart')
+        self.assertEqual(resp.status_code, 201)
+        return resp.json()['id']
+
+    def download(self, file_id):
+        resp = self.client.get(f'/api/files/{file_id}/download/')
+        self.assertEqual(resp.status_code, 200)
+        return b''.join(resp.streaming_content)
+
+    def test_small_content_is_appended_to_packs(self):
+        blobs = [f'small blob {i}'.encode() * 2 for i in range(6)]
+        ids = [self.upload(data) for data in blobs]
+        large = self.upload(b'x' * 500)
+
+        packed = FileContent.objects.filter(storage_format=FileContent.FORMAT_PACKED)
+        self.assertEqual(packed.count(), 6)
+        self.assertFalse(packed.exclude(file='').exists())
+        # 24-byte blobs in packs of at most 64 bytes
+        self.assertEqual(packed.values('pack').distinct().count(), 3)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.media_root, 'packs'))),
+                         ['CURRENT', 'LOCK', 'pack-00000001.pack', 'pack-00000002.pack', 'pack-00000003.pack'])
+        self.assertTrue(File.objects.get(pk=large).file_content.file.name.startswith('content/'))
+
+        self.assertEqual([self.download(file_id) for file_id in ids], blobs)
+        resp = self.client.get(f'/api/files/{ids[1]}/download/', HTTP_RANGE='bytes=6-9')
+        self.assertEqual(b''.join(resp.streaming_content), blobs[1][6:10])
+        self.assertIn('No problems found.', self.call('fsck_content', '--verify-blobs'))
+
+    def test_compaction_moves_live_content_out_of_dead_packs(self):
+        blobs = [f'small blob {i}'.encode() * 2 for i in range(6)]
+        ids = [self.upload(data) for data in blobs]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/files/bulk-delete/', {'ids': ids[:3]}, format='json')
+        first = FileContent.objects.get(pk=File.objects.get(pk=ids[3]).file_content_id)
+        self.assertEqual(first.pack, 'packs/pack-00000002.pack')
+
+        out = self.call('compact_packs', '--grace-minutes', '0')
+
+        # Pack 1 held only released content; pack 2 was half dead; pack 3 is current
+        self.assertIn('Successfully compacted 2 packs, moving 1 blobs', out)
+        packs = os.listdir(os.path.join(self.media_root, 'packs'))
+        self.assertNotIn('pack-00000001.pack', packs)
+        self.assertNotIn('pack-00000002.pack', packs)
+        self.assertEqual(FileContent.objects.get(pk=first.pk).pack, current_pack())
+        self.assertEqual([self.download(file_id) for file_id in ids[3:]], blobs[3:])
+        # A row read before the compaction still finds its content
+        self.assertEqual(first.open_stream().read(), blobs[3])
+
+    def call(self, *args):
+        out = StringIO()
+        call_command(*args, stdout=out)
+        return out.getvalue()
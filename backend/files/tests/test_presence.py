@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .. import presence
+from ..models import File, FileContent
+from ..services import store_upload
+
+
+class PresenceFilterTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'presence.bloom')
+        self.override = override_settings(
+            MEDIA_ROOT=self.directory, FILES_PRESENCE_FILTER_ENABLED=True, FILES_PRESENCE_FILTER_PATH=self.path
+        )
+        self.override.enable()
+        presence.reset()
+
+    def tearDown(self):
+        self.override.disable()
+        presence.reset()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def upload(self, data, content_hash):
+        upload = SimpleUploadedFile('a.txt', data, content_type='text/plain')
+        return store_upload(upload, content_hash, 'a.txt', 'text/plain')
+
+    def content_lookups(self, queries):
+        # Full-row reads of FileContent, not the reference count refresh
+        return [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and '"files_filecontent"."storage_format"' in query['sql']
+        ]
+
+    def test_filter_has_no_false_negatives_and_few_false_positives(self):
+        stored = [f'{i:064x}' for i in range(2000)]
+        filter_, added = presence.build_filter(self.path, stored, capacity=2000, fp_rate=0.01)
+        self.assertEqual(added, 2000)
+        self.assertTrue(all(filter_.might_contain(content_hash) for content_hash in stored))
+        false_positives = sum(filter_.might_contain(f'{i:064x}') for i in range(2000, 12000))
+        self.assertLess(false_positives, 300)
+
+    def test_new_content_skips_the_lookup(self):
+        call_command('rebuild_presence_filter', stdout=StringIO())
+        with CaptureQueriesContext(connection) as queries:
+            _, created = self.upload(b'first', f'{1:064x}')
+        self.assertTrue(created)
+        self.assertEqual(self.content_lookups(queries.captured_queries), [])
+
+        # The new hash is in the filter, so a duplicate is looked up and found
+        with CaptureQueriesContext(connection) as queries:
+            _, created = self.upload(b'first', f'{1:064x}')
+        self.assertFalse(created)
+        self.assertEqual(len(self.content_lookups(queries.captured_queries)), 1)
+        self.assertEqual(FileContent.objects.get().reference_count, 2)
+
+    def test_content_missing_from_the_filter_is_still_deduplicated(self):
+        self.upload(b'first', f'{1:064x}')
+        # Built before the content existed, as after a lost update
+        presence.build_filter(self.path, [], capacity=100)
+        presence.reset()
+
+        _, created = self.upload(b'first', f'{1:064x}')
+        self.assertFalse(created)
+        self.assertEqual(File.objects.count(), 2)
+        self.assertEqual(FileContent.objects.get().reference_count, 2)
+        self.assertTrue(presence.might_exist(f'{1:064x}'))
+
+    def test_rebuild_command(self):
+        self.upload(b'first', f'{1:064x}')
+        self.upload(b'second', f'{2:064x}')
+        out = StringIO()
+        call_command('rebuild_presence_filter', '--capacity', '1000', stdout=out)
+        self.assertIn('Successfully built the presence filter from 2 contents', out.getvalue())
+
+        presence.reset()
+        self.assertTrue(presence.might_exist(f'{1:064x}'))
+        self.assertTrue(presence.might_exist(f'{2:064x}'))
+        out = StringIO()
+        call_command('rebuild_presence_filter', '--stats', stdout=out)
+        self.assertIn('Capacity 1000', out.getvalue())
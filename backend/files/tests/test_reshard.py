@@ -0,0 +1,85 @@
+import os
+import random
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..gc import iter_blobs
+from ..models import ContentChunk, File, FileContent
+from ..services import store_upload
+from .test_chunking import CDC_SETTINGS
+
+
+@override_settings(**CDC_SETTINGS)
+class ReshardTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, FILES_CONTENT_SHARD_DEPTH=1)
+        self.override.enable()
+        self.data = [b'small one', b'small two', random.Random(1).randbytes(20_000)]
+        for i, data in enumerate(self.data):
+            upload = SimpleUploadedFile(f'{i}.bin', data, content_type='application/octet-stream')
+            store_upload(upload, f'{i + 1:064x}', f'{i}.bin', upload.content_type)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def stored_names(self):
+        names = list(FileContent.objects.exclude(file='').values_list('file', flat=True))
+        return names + list(ContentChunk.objects.values_list('file', flat=True))
+
+    def read_all(self):
+        return [
+            File.objects.get(original_filename=f'{i}.bin').file_content.open_stream().read()
+            for i in range(len(self.data))
+        ]
+
+    def test_moves_blobs_into_the_new_layout(self):
+        stale = FileContent.objects.get(pk=f'{1:064x}')
+        self.assertEqual(len(stale.file.name.split('/')), 3)
+
+        with self.settings(FILES_CONTENT_SHARD_DEPTH=2):
+            out = StringIO()
+            call_command('reshard_content', '--batch-size', '2', stdout=out)
+            self.assertIn(f'Moved {len(self.stored_names())} of', out.getvalue())
+
+            for name in self.stored_names():
+                self.assertEqual(len(name.split('/')), 4, name)
+                self.assertTrue(os.path.exists(os.path.join(self.media_root, name)))
+            self.assertEqual(self.read_all(), self.data)
+            # A row read before the move still finds its blob
+            self.assertEqual(stale.open_stream().read(), self.data[0])
+
+            out = StringIO()
+            call_command('reshard_content', stdout=out)
+            self.assertIn('Moved 0 of', out.getvalue())
+
+        # Back again, leaving no empty shard directories behind
+        call_command('reshard_content', '--depth', '1', stdout=StringIO())
+        self.assertEqual(self.read_all(), self.data)
+        for store in ('content', 'chunks'):
+            for shard in os.listdir(os.path.join(self.media_root, store)):
+                for entry in os.scandir(os.path.join(self.media_root, store, shard)):
+                    self.assertTrue(entry.is_file(), entry.path)
+
+    def test_dry_run_moves_nothing(self):
+        before = self.stored_names()
+        out = StringIO()
+        call_command('reshard_content', '--depth', '2', '--dry-run', stdout=out)
+        self.assertIn(f'Would move {len(before)} of', out.getvalue())
+        self.assertEqual(self.stored_names(), before)
+
+    def test_gc_walks_mixed_layouts_in_hash_order(self):
+        call_command('reshard_content', '--depth', '2', '--batch-size', '1', stdout=StringIO())
+        old_layout = os.path.join(self.media_root, 'content', '00', f'{99:064x}')
+        with open(old_layout, 'wb') as blob:
+            blob.write(b'left in the old layout')
+
+        hashes = [blob_hash for blob_hash, _ in iter_blobs(self.media_root, 'content')]
+        self.assertEqual(hashes, sorted(hashes))
+        self.assertIn(f'{99:064x}', hashes)
@@ -0,0 +1,126 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import DailySavingsRollup, DeduplicationEvent, File, FileContent, StorageSavingsSummary
+
+
+class DailyRollupTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def duplicate(self, content_hash, file_type, size=100):
+        fc, _ = FileContent.objects.get_or_create(content_hash=content_hash, defaults={'size': size})
+        f = File.objects.create(file_content=fc, original_filename='dup', file_type=file_type)
+        DeduplicationEvent.objects.create(
+            file_content=fc, file_reference=f, original_filename='dup', file_size=size, file_type=file_type
+        )
+        StorageSavingsSummary.update_current_summary(file_size=size, file_type=file_type, content_hash=content_hash)
+
+    def rollups(self):
+        return {
+            row.file_type: (row.duplicates, row.bytes_saved, row.distinct_contents)
+            for row in DailySavingsRollup.objects.filter(day=timezone.localdate())
+        }
+
+    def test_incremental_rollups_match_backfill(self):
+        self.duplicate('a', 'text/plain')
+        self.duplicate('a', 'text/plain')
+        self.duplicate('b', 'text/plain', size=50)
+        self.duplicate('a', 'image/png')
+        expected = {'text/plain': (3, 250, 2), 'image/png': (1, 100, 1)}
+        self.assertEqual(self.rollups(), expected)
+
+        DailySavingsRollup.objects.all().delete()
+        call_command('backfill_daily_rollups', stdout=StringIO())
+        self.assertEqual(self.rollups(), expected)
+
+        # Markers were rebuilt too, so incremental updates continue correctly
+        self.duplicate('b', 'text/plain', size=50)
+        self.assertEqual(self.rollups()['text/plain'], (4, 300, 2))
+
+    def test_time_series_buckets(self):
+        monday = date(2024, 1, 1)
+        DailySavingsRollup.objects.bulk_create([
+            DailySavingsRollup(day=monday, file_type='text/plain', duplicates=1, bytes_saved=10, distinct_contents=1),
+            DailySavingsRollup(day=monday, file_type='image/png', duplicates=2, bytes_saved=20, distinct_contents=1),
+            DailySavingsRollup(day=monday + timedelta(days=8), file_type='text/plain', duplicates=4,
+                               bytes_saved=40, distinct_contents=2),
+        ])
+
+        days = DailySavingsRollup.time_series(monday, monday + timedelta(days=9))
+        self.assertEqual(len(days), 10)
+        self.assertEqual(days[0]['duplicates'], 3)
+        self.assertEqual(days[1]['duplicates'], 0)
+
+        weeks = DailySavingsRollup.time_series(monday + timedelta(days=2), monday + timedelta(days=9), 'week')
+        self.assertEqual([(w['period_start'], w['period_end']) for w in weeks], [
+            (monday + timedelta(days=2), monday + timedelta(days=6)),
+            (monday + timedelta(days=7), monday + timedelta(days=9)),
+        ])
+        self.assertEqual([w['bytes_saved'] for w in weeks], [0, 40])
+
+        months = DailySavingsRollup.time_series(monday, monday + timedelta(days=40), 'month', file_type='text/plain')
+        self.assertEqual([m['duplicates'] for m in months], [5, 0])
+
+    def test_range_endpoint(self):
+        self.duplicate('a', 'text/plain')
+        today = timezone.localdate()
+        url = f'/api/summaries/range/?start={today - timedelta(days=6)}&end={today}'
+
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(len(data['series']), 7)
+        self.assertEqual(data['series'][-1]['duplicates'], 1)
+        self.assertEqual(data['total_storage_saved_bytes'], 100)
+
+        # Only the cache version is read
+        with self.assertNumQueries(1):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+
+        resp = self.client.get(f'/api/summaries/range/?start={today}&end={today - timedelta(days=1)}')
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.get(f'/api/summaries/range/?start={today}&end={today}&granularity=hour')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_range_endpoint_filters_by_file_type(self):
+        self.duplicate('a', 'text/plain', size=100)
+        self.duplicate('b', 'image/png', size=30)
+        self.duplicate('b', 'image/png', size=30)
+        today = timezone.localdate()
+        url = f'/api/summaries/range/?start={today - timedelta(days=6)}&end={today}'
+
+        resp = self.client.get(f'{url}&file_type=image/png')
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data['file_type'], 'image/png')
+        self.assertEqual(data['series'][-1]['duplicates'], 2)
+        self.assertEqual(data['total_duplicates_detected'], 2)
+        self.assertEqual(data['total_storage_saved_bytes'], 60)
+
+        # Each file type is cached under its own key
+        data = self.client.get(f'{url}&file_type=text/plain').json()
+        self.assertEqual(data['total_storage_saved_bytes'], 100)
+        self.assertEqual(self.client.get(url).json()['total_storage_saved_bytes'], 160)
+
+    @override_settings(TIME_ZONE='Pacific/Kiritimati')
+    def test_summaries_use_the_same_local_day_as_rollups(self):
+        # 2026-12-31 12:00 UTC is already 2027-01-01 at UTC+14
+        now = datetime(2026, 12, 31, 12, tzinfo=dt_timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            self.duplicate('a', 'text/plain')
+            yearly = self.client.get('/api/summaries/yearly/').json()
+            rollup = DailySavingsRollup.objects.get()
+
+        self.assertEqual(rollup.day, date(2027, 1, 1))
+        self.assertEqual(yearly['period_start'], '2027-01-01')
+        self.assertEqual(yearly['total_duplicates_detected'], 1)
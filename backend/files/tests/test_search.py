@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import File, FileContent
+from ..search import FTS_TRIGGERS, ensure_filename_index, search_filenames
+
+
+class FileSearchTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.now = timezone.now()
+        for i, (name, file_type, size, age) in enumerate([
+            ('Quarterly Report.pdf', 'application/pdf', 2000, 1),
+            ('holiday-photo.JPG', 'image/jpeg', 500_000, 5),
+            ('report_draft.txt', 'text/plain', 10, 30),
+            ('logo.png', 'image/png', 40_000, 2),
+        ]):
+            fc = FileContent.objects.create(content_hash=f'{i:064x}', size=size)
+            f = File.objects.create(file_content=fc, original_filename=name, file_type=file_type)
+            File.objects.filter(pk=f.pk).update(uploaded_at=self.now - timedelta(days=age))
+
+    def names(self, query):
+        resp = self.client.get(f'/api/files/?{query}')
+        self.assertEqual(resp.status_code, 200, resp.content)
+        return sorted(row['original_filename'] for row in resp.json()['results'])
+
+    def test_search_matches_fragments_case_insensitively(self):
+        self.assertEqual(self.names('search=REPORT'), ['Quarterly Report.pdf', 'report_draft.txt'])
+        self.assertEqual(self.names('search=day-ph'), ['holiday-photo.JPG'])
+        # Shorter than a trigram falls back to a LIKE
+        self.assertEqual(self.names('search=go'), ['logo.png'])
+        self.assertEqual(self.names('search="'), [])
+
+    def test_index_follows_renames_and_deletes(self):
+        f = File.objects.get(original_filename='logo.png')
+        f.original_filename = 'brand-mark.png'
+        f.save()
+        self.assertEqual(self.names('search=logo'), [])
+        self.assertEqual(self.names('search=brand'), ['brand-mark.png'])
+        f.delete()
+        self.assertEqual(self.names('search=brand'), [])
+
+    def test_filters_combine(self):
+        self.assertEqual(self.names('file_type=image/'), ['holiday-photo.JPG', 'logo.png'])
+        self.assertEqual(self.names('file_type=image/png'), ['logo.png'])
+        self.assertEqual(self.names('min_size=1000&max_size=100000'), ['Quarterly Report.pdf', 'logo.png'])
+        after = (self.now - timedelta(days=3)).isoformat().replace('+', '%2B')
+        self.assertEqual(self.names(f'uploaded_after={after}'), ['Quarterly Report.pdf', 'logo.png'])
+        self.assertEqual(self.names('file_type=image/&max_size=100000&search=log'), ['logo.png'])
+
+    def test_invalid_filters_are_rejected(self):
+        self.assertEqual(self.client.get('/api/files/?min_size=-1').status_code, 400)
+        self.assertEqual(self.client.get('/api/files/?min_size=10&max_size=1').status_code, 400)
+
+    def test_missing_triggers_are_reinstalled(self):
+        with connection.cursor() as cursor:
+            for trigger in FTS_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER {trigger}')
+        self.assertTrue(ensure_filename_index())
+        self.assertFalse(ensure_filename_index())
+        self.assertEqual(self.names('search=report'), ['Quarterly Report.pdf', 'report_draft.txt'])
+
+
+class FileSearchKeyTest(TestCase):
+    def test_search_survives_renumbered_rowids(self):
+        fc = FileContent.objects.create(content_hash=f'{1:064x}', size=1)
+        files = [
+            File.objects.create(file_content=fc, original_filename=f'{name}.txt', file_type='text/plain')
+            for name in ('alpha', 'bravo', 'charlie', 'delta')
+        ]
+        File.objects.filter(pk__in=[files[0].pk, files[1].pk]).delete()
+        # As VACUUM or a table rebuild may: files_file has no INTEGER PRIMARY KEY to pin them
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE files_file SET rowid = rowid - 2')
+
+        self.assertEqual(search_filenames(File.objects.all(), 'charlie').get().pk, files[2].pk)
+        self.assertEqual(search_filenames(File.objects.all(), 'delta').get().pk, files[3].pk)
+
+    def test_saving_a_new_instance_keeps_its_key(self):
+        fc = FileContent.objects.create(content_hash=f'{1:064x}', size=1)
+        f = File.objects.create(file_content=fc, original_filename='first.txt', file_type='text/plain')
+        self.assertIsNone(f.search_key)
+        f.original_filename = 'renamed.txt'
+        f.save()
+
+        self.assertIsNotNone(File.objects.get(pk=f.pk).search_key)
+        self.assertEqual(search_filenames(File.objects.all(), 'renamed').get().pk, f.pk)
+        self.assertFalse(search_filenames(File.objects.all(), 'first').exists())
@@ -1,6 +1,7 @@
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
+from django.db.models import F
 from django.utils import timezone
 from datetime import date, timedelta
 
@@ -60,3 +61,100 @@ class SummariesAPITest(TestCase):
         self.assertEqual(resp.status_code, 200)
         data = resp.json()
         self.assertGreaterEqual(data['total_duplicates_detected'], 0)
+
+
+class IncrementalSummaryTest(TestCase):
+    def duplicate(self, content_hash, file_type):
+        fc, _ = FileContent.objects.get_or_create(content_hash=content_hash, defaults={'size': 100})
+        f = File.objects.create(file_content=fc, original_filename='dup', file_type=file_type)
+        DeduplicationEvent.objects.create(
+            file_content=fc, file_reference=f, original_filename='dup', file_size=100, file_type=file_type
+        )
+        StorageSavingsSummary.update_current_summary(file_size=100, file_type=file_type, content_hash=content_hash)
+
+    def weekly(self):
+        week_start, week_end = StorageSavingsSummary.get_current_week_dates()
+        return StorageSavingsSummary.objects.get(period_start=week_start, period_end=week_end)
+
+    def test_counters_match_recalculation(self):
+        for content_hash, file_type in [('a', 'text/plain'), ('a', 'text/plain'), ('b', 'image/png'),
+                                        ('c', 'image/png'), ('b', 'image/png')]:
+            self.duplicate(content_hash, file_type)
+
+        summary = self.weekly()
+        self.assertEqual(summary.total_duplicates_detected, 5)
+        self.assertEqual(summary.unique_files_shared, 3)
+        self.assertEqual(summary.most_duplicated_type, 'image/png')
+
+        summary.recalculate()
+        summary.refresh_from_db()
+        self.assertEqual(summary.total_duplicates_detected, 5)
+        self.assertEqual(summary.unique_files_shared, 3)
+        self.assertEqual(summary.most_duplicated_type, 'image/png')
+        self.assertEqual(
+            dict(summary.type_counts.values_list('file_type', 'duplicates')),
+            {'text/plain': 2, 'image/png': 3}
+        )
+
+    def test_update_cost_does_not_grow_with_history(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.duplicate('warm', 'text/plain')
+        with CaptureQueriesContext(connection) as first:
+            StorageSavingsSummary.update_current_summary(file_size=1, file_type='text/plain', content_hash='x0')
+        for i in range(50):
+            self.duplicate(f'h{i}', f'type/{i % 7}')
+        with CaptureQueriesContext(connection) as later:
+            StorageSavingsSummary.update_current_summary(file_size=1, file_type='text/plain', content_hash='x1')
+        self.assertEqual(len(first), len(later))
+        # No query scans the event table
+        self.assertFalse(any('files_deduplicationevent' in query['sql'] for query in later.captured_queries))
+
+
+class SummaryCacheTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.client = APIClient()
+
+    def test_reads_are_cached_and_revalidated_with_one_query(self):
+        resp = self.client.get('/api/summaries/weekly/')
+        self.assertEqual(resp.status_code, 200)
+        etag = resp['ETag']
+
+        # Only the cache version is read
+        with self.assertNumQueries(1):
+            resp = self.client.get('/api/summaries/weekly/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['ETag'], etag)
+
+        with self.assertNumQueries(1):
+            resp = self.client.get('/api/summaries/weekly/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+    def test_new_events_invalidate_cached_summaries(self):
+        etag = self.client.get('/api/summaries/yearly/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StorageSavingsSummary.update_current_summary(file_size=2048, file_type='text/plain', content_hash='a')
+
+        resp = self.client.get('/api/summaries/yearly/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag)
+        self.assertEqual(resp.json()['total_duplicates_detected'], 1)
+
+    def test_bumps_from_other_workers_invalidate_cached_summaries(self):
+        from ..models import SummaryCacheVersion
+
+        etag = self.client.get('/api/summaries/yearly/')['ETag']
+
+        # Another worker records an event and bumps the version; this process's cache is untouched
+        StorageSavingsSummary.update_current_summary(file_size=2048, file_type='text/plain', content_hash='b')
+        SummaryCacheVersion.objects.update(version=F('version') + 1)
+
+        resp = self.client.get('/api/summaries/yearly/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag)
+        self.assertEqual(resp.json()['total_duplicates_detected'], 1)
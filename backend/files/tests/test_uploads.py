@@ -0,0 +1,77 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ..models import FileContent, File, DeduplicationEvent
+
+
+class StreamingUploadTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.client = APIClient()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, data, name='test.txt'):
+        upload = SimpleUploadedFile(name, data, content_type='text/plain')
+        return self.client.post('/api/files/', {'file': upload}, format='multipart')
+
+    def temp_files(self):
+        temp_dir = os.path.join(self.media_root, 'content', 'tmp')
+        return os.listdir(temp_dir) if os.path.isdir(temp_dir) else []
+
+    def test_upload_stored_at_hash_path(self):
+        data = b'hello content store' * 1000
+        expected_hash = hashlib.sha256(data).hexdigest()
+
+        with mock.patch('files.views.calculate_file_hash') as rehash:
+            resp = self.upload(data)
+        self.assertEqual(resp.status_code, 201)
+        self.assertFalse(resp.json()['is_duplicate'])
+        # The hash comes from the upload handler, not a second read
+        rehash.assert_not_called()
+
+        fc = FileContent.objects.get(content_hash=expected_hash)
+        self.assertEqual(fc.file.name, os.path.join('content', expected_hash[:2], expected_hash[2:4], expected_hash))
+        self.assertEqual(fc.size, len(data))
+        with open(fc.file.path, 'rb') as stored:
+            self.assertEqual(stored.read(), data)
+        self.assertEqual(self.temp_files(), [])
+
+    def test_duplicate_upload_discards_temp_file(self):
+        data = b'duplicate me'
+        self.upload(data, name='a.txt')
+        resp = self.upload(data, name='b.txt')
+
+        self.assertEqual(resp.status_code, 201)
+        self.assertTrue(resp.json()['is_duplicate'])
+        self.assertEqual(FileContent.objects.count(), 1)
+        self.assertEqual(File.objects.count(), 2)
+        self.assertEqual(DeduplicationEvent.objects.count(), 1)
+        self.assertEqual(FileContent.objects.get().reference_count, 2)
+        self.assertEqual(self.temp_files(), [])
+
+    def test_existing_blob_is_reused(self):
+        data = b'orphaned blob left on disk'
+        content_hash = hashlib.sha256(data).hexdigest()
+        blob_dir = os.path.join(self.media_root, 'content', content_hash[:2], content_hash[2:4])
+        os.makedirs(blob_dir)
+        with open(os.path.join(blob_dir, content_hash), 'wb') as blob:
+            blob.write(data)
+
+        resp = self.upload(data)
+        self.assertEqual(resp.status_code, 201)
+        fc = FileContent.objects.get(content_hash=content_hash)
+        self.assertEqual(fc.file.name, os.path.join('content', content_hash[:2], content_hash[2:4], content_hash))
+        self.assertEqual(os.listdir(blob_dir), [content_hash])
+        self.assertEqual(self.temp_files(), [])
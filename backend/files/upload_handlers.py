@@ -0,0 +1,91 @@
+import os
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile, UploadedFile, TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+from .storage import content_temp_dir
+from .utils import StreamingHasher
+
+
+class HashedTemporaryUploadedFile(TemporaryUploadedFile):
+    """
+    A temporary upload spooled into the content store with its hash already computed.
+    """
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        temp_dir = content_temp_dir()
+        file = tempfile.NamedTemporaryFile(
+            suffix='.upload',
+            dir=temp_dir or settings.FILE_UPLOAD_TEMP_DIR,
+        )
+        # Skip TemporaryUploadedFile.__init__, which would open a second temp file
+        UploadedFile.__init__(self, file, name, content_type, size, charset, content_type_extra)
+        self.in_content_store = temp_dir is not None
+        self.content_hash = None
+        self.hash_algorithm = None
+
+
+class ContentHashUploadHandler(FileUploadHandler):
+    """
+    Stream an upload once into the content store while computing its hash.
+
+    The returned file carries ``content_hash`` so the view never has to re-read
+    the body. Files up to FILE_UPLOAD_MAX_MEMORY_SIZE stay in memory, which
+    keeps many-file requests from holding one open temp file per file. Larger
+    files roll over to a temp file on the same filesystem as the blobs, so
+    committing them is an atomic rename (see ``storage.place_in_content_store``).
+    Hashing of each chunk runs on the hashing pool while the chunk is written.
+    """
+
+    chunk_size = 256 * 2 ** 10
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = None
+        self.buffer = BytesIO()
+        self.hasher = StreamingHasher()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        if self.file is not None:
+            self.file.write(raw_data)
+            return
+        self.buffer.write(raw_data)
+        if self.buffer.tell() > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            # Too large to keep in memory: move what we have to disk
+            self.file = HashedTemporaryUploadedFile(
+                self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+            )
+            self.file.write(self.buffer.getvalue())
+            self.buffer = None
+
+    def file_complete(self, file_size):
+        if self.file is None:
+            self.buffer.seek(0)
+            self.file = InMemoryUploadedFile(
+                file=self.buffer,
+                field_name=self.field_name,
+                name=self.file_name,
+                content_type=self.content_type,
+                size=file_size,
+                charset=self.charset,
+                content_type_extra=self.content_type_extra,
+            )
+        else:
+            self.file.seek(0)
+            self.file.size = file_size
+        self.file.content_hash = self.hasher.hexdigest()
+        self.file.hash_algorithm = self.hasher.algorithm
+        return self.file
+
+    def upload_interrupted(self):
+        if getattr(self, 'file', None) is not None and hasattr(self.file, 'temporary_file_path'):
+            temp_location = self.file.temporary_file_path()
+            try:
+                self.file.close()
+                os.remove(temp_location)
+            except FileNotFoundError:
+                pass
@@ -1,18 +1,129 @@
 import hashlib
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
 
+from django.conf import settings
 
-def calculate_file_hash(file_obj, chunk_size=8192):
+# Every algorithm produces a 32-byte digest so hashes fit FileContent.content_hash
+HASH_ALGORITHMS = {
+    'sha256': hashlib.sha256,
+    'blake2b': lambda: hashlib.blake2b(digest_size=32),
+}
+
+READ_BUFFER_SIZE = 1024 * 1024
+
+# Updates smaller than this are cheaper to hash inline than to hand to the pool
+OFFLOAD_THRESHOLD = 64 * 1024
+
+_executor = None
+
+
+def hash_algorithm(algorithm=None):
+    """Return the algorithm name to use, defaulting to FILES_HASH_ALGORITHM."""
+    algorithm = algorithm or settings.FILES_HASH_ALGORITHM
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f'Unsupported hash algorithm: {algorithm}')
+    return algorithm
+
+
+def new_hasher(algorithm=None):
+    """Create a hashlib object for the given (or configured) algorithm."""
+    return HASH_ALGORITHMS[hash_algorithm(algorithm)]()
+
+
+def hashing_executor():
     """
-    Calculate SHA-256 hash of a file object.
+    Return the process-wide thread pool used for hashing.
+
+    hashlib releases the GIL while hashing large buffers, so hashes of
+    several uploads run in parallel on the pool's threads.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.FILES_HASH_WORKERS,
+            thread_name_prefix='file-hash',
+        )
+    return _executor
+
+
+class StreamingHasher:
+    """
+    Incremental hasher that runs large updates on the hashing pool.
+
+    Each update is hashed while the caller goes on to write the same data
+    to disk; the next update (or the digest) waits for it to finish, so
+    updates are still applied in order.
+    """
+
+    def __init__(self, algorithm=None):
+        self.algorithm = hash_algorithm(algorithm)
+        self._hasher = new_hasher(self.algorithm)
+        self._pending = None
+
+    def _wait(self):
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    def update(self, data):
+        self._wait()
+        if len(data) < OFFLOAD_THRESHOLD:
+            self._hasher.update(data)
+        else:
+            self._pending = hashing_executor().submit(self._hasher.update, data)
+
+    def hexdigest(self):
+        self._wait()
+        return self._hasher.hexdigest()
+
+
+def hash_path(path, algorithm=None):
+    """
+    Hash a file on disk, memory-mapping it to avoid copying it through Python.
+
+    Args:
+        path: Path of the file
+        algorithm: Hash algorithm name (default FILES_HASH_ALGORITHM)
+
+    Returns:
+        String: Hexadecimal hash digest
+    """
+    hasher = new_hasher(algorithm)
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap cannot map an empty file
+            return hasher.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            hasher.update(mapped)
+    return hasher.hexdigest()
+
+
+def calculate_file_hash(file_obj, chunk_size=READ_BUFFER_SIZE, algorithm=None):
+    """
+    Calculate the hash of a file object on the hashing pool.
+
+    Uploads spooled to a temporary file are memory-mapped; anything else is
+    read in chunk_size pieces.
 
     Args:
         file_obj: Django UploadedFile object
-        chunk_size: Size of chunks to read (default 8KB)
+        chunk_size: Size of chunks to read (default 1MB)
+        algorithm: Hash algorithm name (default FILES_HASH_ALGORITHM)
 
     Returns:
         String: Hexadecimal hash digest
     """
-    sha256 = hashlib.sha256()
+    algorithm = hash_algorithm(algorithm)
+    if hasattr(file_obj, 'temporary_file_path'):
+        file_obj.file.flush()
+        return hashing_executor().submit(hash_path, file_obj.temporary_file_path(), algorithm).result()
+    return hashing_executor().submit(_hash_stream, file_obj, chunk_size, algorithm).result()
+
+
+def _hash_stream(file_obj, chunk_size, algorithm):
+    hasher = new_hasher(algorithm)
 
     # Reset file pointer to beginning
     file_obj.seek(0)
@@ -22,24 +133,25 @@ def calculate_file_hash(file_obj, chunk_size=8192):
         chunk = file_obj.read(chunk_size)
         if not chunk:
             break
-        sha256.update(chunk)
+        hasher.update(chunk)
 
     # Reset file pointer for subsequent operations
     file_obj.seek(0)
 
-    return sha256.hexdigest()
+    return hasher.hexdigest()
 
 
-def calculate_chunk_hash(chunk_data):
+def calculate_chunk_hash(chunk_data, algorithm=None):
     """
-    Calculate SHA-256 hash of a single chunk.
+    Calculate the hash of a single chunk.
 
     Args:
         chunk_data: Bytes object
+        algorithm: Hash algorithm name (default FILES_HASH_ALGORITHM)
 
     Returns:
         String: Hexadecimal hash digest
     """
-    sha256 = hashlib.sha256()
-    sha256.update(chunk_data)
-    return sha256.hexdigest()
+    hasher = new_hasher(algorithm)
+    hasher.update(chunk_data)
+    return hasher.hexdigest()
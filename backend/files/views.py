@@ -1,18 +1,42 @@
-from django.core.files.base import ContentFile
+import os
+
+from django.utils import timezone
+from django.utils.http import parse_etags
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .models import File, FileContent, DeduplicationEvent, StorageSavingsSummary
-from django.db import IntegrityError
-from .serializers import FileSerializer, StorageSavingsSummarySerializer
-from .utils import calculate_file_hash
-import hashlib
+from . import chunk_store, hot_cache
+from .downloads import serve_content
+from .models import ChunkedUpload, DailySavingsRollup, File, StorageSavingsSummary
+from .pagination import FileCursorPagination
+from .search import filter_files
+from .serializers import (
+    FileBulkDeleteSerializer, FileFilterSerializer, FileSerializer, StorageSavingsSummarySerializer,
+    SummaryRangeSerializer, UploadNegotiationSerializer
+)
+from .services import delete_files, negotiate_uploads, store_upload, store_uploads_batch
+from .summary_cache import get_cached_summary
+from .upload_handlers import ContentHashUploadHandler
+from .utils import calculate_file_hash, hash_algorithm
 
 # Create your views here.
 
 class FileViewSet(viewsets.ModelViewSet):
-    queryset = File.objects.all()
+    # FileSerializer reads size from the content, so join it instead of a query per row
+    queryset = File.objects.select_related('file_content')
     serializer_class = FileSerializer
+    pagination_class = FileCursorPagination
+    # Handlers used for whole-file uploads; they hash the body while spooling it
+    upload_handler_classes = [ContentHashUploadHandler]
+
+    def get_queryset(self):
+        """Apply the listing's search and filter parameters"""
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            params = FileFilterSerializer(data=self.request.query_params)
+            params.is_valid(raise_exception=True)
+            queryset = filter_files(queryset, params.validated_data)
+        return queryset
 
     def get_serializer_context(self):
         """Add request to serializer context for building absolute URLs"""
@@ -22,57 +46,23 @@ class FileViewSet(viewsets.ModelViewSet):
 
     def create(self, request, *args, **kwargs):
         """Handle file upload with deduplication"""
+        # Must be set before the body is parsed
+        request.upload_handlers = [handler(request) for handler in self.upload_handler_classes]
+
         file_obj = request.FILES.get('file')
         if not file_obj:
             return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Calculate content hash
-        content_hash = calculate_file_hash(file_obj)
-
-        # Check if FileContent with this hash already exists
-        try:
-            file_content, created = FileContent.objects.get_or_create(
-                content_hash=content_hash,
-                defaults={
-                    'size': file_obj.size,
-                    'reference_count': 0
-                }
-            )
-        except IntegrityError:
-            # Race: another process created it between check and create — refetch
-            file_content = FileContent.objects.get(content_hash=content_hash)
-            created = False
-
-        if created:
-            # New content - save the file
-            file_content.file.save(content_hash, file_obj, save=True)
-
-        # Increment reference count
-        file_content.increment_reference()
-
-        # Create File metadata record
-        file_record = File.objects.create(
-            file_content=file_content,
-            original_filename=file_obj.name,
+        # Use the hash computed while streaming the upload, if available
+        content_hash = getattr(file_obj, 'content_hash', None) or calculate_file_hash(file_obj)
+
+        file_record, created = store_upload(
+            file_obj,
+            content_hash,
+            filename=file_obj.name,
             file_type=file_obj.content_type or 'application/octet-stream'
         )
 
-        # If duplicate detected, record the deduplication event
-        if not created:
-            DeduplicationEvent.objects.create(
-                file_content=file_content,
-                file_reference=file_record,
-                original_filename=file_obj.name,
-                file_size=file_obj.size,
-                file_type=file_obj.content_type or 'application/octet-stream'
-            )
-
-            # Update storage savings summary
-            StorageSavingsSummary.update_current_summary(
-                file_size=file_obj.size,
-                file_type=file_obj.content_type or 'application/octet-stream'
-            )
-
         serializer = self.get_serializer(file_record)
 
         headers = self.get_success_headers(serializer.data)
@@ -84,16 +74,37 @@ class FileViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         """Handle file deletion with reference counting"""
         instance = self.get_object()
-        file_content = instance.file_content
-
-        # Delete the File record
-        instance.delete()
 
-        # Decrement reference count (FileContent will auto-delete if count reaches 0)
-        file_content.decrement_reference()
+        # Releases the content (and its blob) along with its last reference
+        delete_files(File.objects.filter(pk=instance.pk))
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, methods=['post'], url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """Delete many files, by id or by the listing's filters"""
+        params = FileBulkDeleteSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+
+        if 'ids' in params.validated_data:
+            queryset = File.objects.filter(pk__in=params.validated_data['ids'])
+        else:
+            queryset = filter_files(File.objects.all(), params.validated_data['filter'])
+        deleted, contents_deleted = delete_files(queryset)
+
+        return Response({'deleted': deleted, 'contents_deleted': contents_deleted})
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Serve the file's content with Range, ETag and sendfile support"""
+        file_record = self.get_object()
+        return serve_content(
+            request,
+            file_record.file_content,
+            filename=file_record.original_filename,
+            content_type=file_record.file_type
+        )
+
     @action(detail=False, methods=['post'], url_path='upload-chunk')
     def upload_chunk(self, request):
         """Handle chunked file upload"""
@@ -107,86 +118,44 @@ class FileViewSet(viewsets.ModelViewSet):
         if not chunk or not upload_id:
             return Response({'error': 'Missing chunk or upload_id'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Store chunk temporarily using Django's cache or session
-        # For simplicity, we'll use session storage
-        session_key = f'upload_{upload_id}'
+        if not chunk_store.is_valid_upload_id(upload_id):
+            return Response({'error': 'Invalid upload_id'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 <= chunk_index < total_chunks:
+            return Response({'error': 'chunk_index out of range'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if session_key not in request.session:
-            request.session[session_key] = {
-                'chunks': {},
-                'filename': filename,
+        upload, _ = ChunkedUpload.objects.get_or_create(
+            upload_id=upload_id,
+            defaults={
+                'original_filename': filename or chunk.name,
                 'file_type': file_type,
-                'total_chunks': total_chunks
+                'total_chunks': total_chunks,
+                'hash_algorithm': hash_algorithm(),
             }
+        )
 
-        # Read and store chunk data
-        chunk_data = chunk.read()
-        request.session[session_key]['chunks'][chunk_index] = chunk_data
-        request.session.modified = True
-
-        # Check if all chunks received
-        upload_data = request.session[session_key]
-        if len(upload_data['chunks']) == total_chunks:
-            # Reassemble file
-            complete_data = b''
-            for i in range(total_chunks):
-                complete_data += upload_data['chunks'][i]
-
-            # Calculate hash of complete file
-            sha256 = hashlib.sha256()
-            sha256.update(complete_data)
-            content_hash = sha256.hexdigest()
-
-            # Check for deduplication
-            try:
-                file_content, created = FileContent.objects.get_or_create(
-                    content_hash=content_hash,
-                    defaults={
-                        'size': len(complete_data),
-                        'reference_count': 0
-                    }
-                )
-            except IntegrityError:
-                file_content = FileContent.objects.get(content_hash=content_hash)
-                created = False
-
-            if created:
-                # Save the complete file
-                file_content.file.save(
-                    content_hash,
-                    ContentFile(complete_data),
-                    save=True
-                )
-
-            # Increment reference count
-            file_content.increment_reference()
-
-            # Create File record
-            file_record = File.objects.create(
-                file_content=file_content,
-                original_filename=upload_data['filename'],
-                file_type=upload_data['file_type']
-            )
+        # Append in-order chunks to the running hash; park the rest on disk
+        chunk_store.receive_chunk(upload, chunk_index, chunk)
 
-            # If duplicate detected, record the deduplication event
-            if not created:
-                DeduplicationEvent.objects.create(
-                    file_content=file_content,
-                    file_reference=file_record,
-                    original_filename=upload_data['filename'],
-                    file_size=len(complete_data),
-                    file_type=upload_data['file_type']
-                )
-
-                # Update storage savings summary
-                StorageSavingsSummary.update_current_summary(
-                    file_size=len(complete_data),
-                    file_type=upload_data['file_type']
-                )
-
-            # Clean up session
-            del request.session[session_key]
-            request.session.modified = True
+        # Only one request may assemble the upload once every chunk is in
+        if upload.next_chunk_index >= upload.total_chunks and ChunkedUpload.objects.filter(
+            pk=upload_id, is_assembling=False
+        ).update(is_assembling=True):
+            try:
+                with chunk_store.finish(upload) as assembled:
+                    file_record, created = store_upload(
+                        assembled,
+                        assembled.content_hash,
+                        filename=upload.original_filename,
+                        file_type=upload.file_type
+                    )
+            except Exception:
+                # Let a retried chunk attempt the assembly again
+                ChunkedUpload.objects.filter(pk=upload_id).update(is_assembling=False)
+                raise
+
+            # Clean up staged chunks
+            chunk_store.discard(upload_id)
+            upload.delete()
 
             serializer = self.get_serializer(file_record)
             return Response({
@@ -198,10 +167,74 @@ class FileViewSet(viewsets.ModelViewSet):
         # More chunks expected
         return Response({
             'complete': False,
-            'received_chunks': len(upload_data['chunks']),
-            'total_chunks': total_chunks
+            'received_chunks': upload.received_chunks,
+            'total_chunks': upload.total_chunks
         }, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['post'], url_path='batch')
+    def batch(self, request):
+        """Upload many files in one request, sent as repeated 'files' fields"""
+        # Must be set before the body is parsed
+        request.upload_handlers = [handler(request) for handler in self.upload_handler_classes]
+
+        file_objs = request.FILES.getlist('files')
+        if not file_objs:
+            return Response({'error': 'No files provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+        uploads = [
+            (
+                file_obj,
+                getattr(file_obj, 'content_hash', None) or calculate_file_hash(file_obj),
+                file_obj.name,
+                file_obj.content_type or 'application/octet-stream',
+            )
+            for file_obj in file_objs
+        ]
+        results = store_uploads_batch(uploads)
+
+        response_data = []
+        for file_record, created in results:
+            data = self.get_serializer(file_record).data
+            data['is_duplicate'] = not created
+            response_data.append(data)
+
+        return Response(response_data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='negotiate')
+    def negotiate(self, request):
+        """
+        Hash-first upload: link files whose content is already stored.
+
+        Accepts one entry or {"files": [...]} with content_hash, size, filename
+        and file_type. Known content gets a File reference without the body
+        being sent; the rest are reported back as needing an upload.
+        """
+        many = 'files' in request.data
+        entries = UploadNegotiationSerializer(data=request.data['files'] if many else request.data, many=many)
+        entries.is_valid(raise_exception=True)
+        validated = entries.validated_data if many else [entries.validated_data]
+
+        results = []
+        for entry, file_record in negotiate_uploads(validated):
+            if file_record is None:
+                results.append({'content_hash': entry['content_hash'], 'status': 'upload_required'})
+            else:
+                results.append({
+                    'content_hash': entry['content_hash'],
+                    'status': 'linked',
+                    'file': self.get_serializer(file_record).data,
+                })
+
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='hot-cache')
+    def hot_cache_metrics(self, request):
+        """Report the answering worker's hot-content cache metrics"""
+        metrics = hot_cache.metrics()
+        if metrics is None:
+            return Response({'enabled': False})
+        return Response({'enabled': True, 'pid': os.getpid(), **metrics})
+
     # ...existing file-related actions...
 
 
@@ -214,18 +247,63 @@ class SummaryViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'], url_path='weekly')
     def weekly(self, request):
         week_start, week_end = StorageSavingsSummary.get_current_week_dates()
-        summary = StorageSavingsSummary._get_or_create_summary(week_start, week_end)
-        summary.recalculate()
-        serializer = StorageSavingsSummarySerializer(summary, context={'request': request})
-        return Response(serializer.data)
+        return self._summary_response(request, week_start, week_end)
 
     @action(detail=False, methods=['get'], url_path='yearly')
     def yearly(self, request):
         from datetime import date
-        today = date.today()
+        today = timezone.localdate()
         year_start = date(today.year, 1, 1)
         year_end = date(today.year, 12, 31)
-        summary = StorageSavingsSummary._get_or_create_summary(year_start, year_end)
-        summary.recalculate()
-        serializer = StorageSavingsSummarySerializer(summary, context={'request': request})
-        return Response(serializer.data)
+        return self._summary_response(request, year_start, year_end)
+
+    @action(detail=False, methods=['get'], url_path='range')
+    def date_range(self, request):
+        """
+        Savings over any date range as a day, week or month time series.
+
+        Query parameters: start, end (YYYY-MM-DD, inclusive), granularity
+        (day, week or month; default day) and an optional file_type.
+        """
+        params = SummaryRangeSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+
+        def build():
+            series = DailySavingsRollup.time_series(
+                query['start'], query['end'], query['granularity'], query.get('file_type')
+            )
+            total_saved = sum(bucket['bytes_saved'] for bucket in series)
+            return {
+                'start': query['start'].isoformat(),
+                'end': query['end'].isoformat(),
+                'granularity': query['granularity'],
+                'file_type': query.get('file_type'),
+                'total_duplicates_detected': sum(bucket['duplicates'] for bucket in series),
+                'total_storage_saved_bytes': total_saved,
+                'storage_saved_mb': total_saved / (1024 * 1024),
+                'series': [
+                    dict(bucket, period_start=bucket['period_start'].isoformat(),
+                         period_end=bucket['period_end'].isoformat())
+                    for bucket in series
+                ],
+            }
+
+        key = f"range:{query['start']}:{query['end']}:{query['granularity']}:{query.get('file_type', '')}"
+        return self._cached_response(request, key, build)
+
+    def _summary_response(self, request, period_start, period_end):
+        def build():
+            # Summaries are maintained incrementally; `manage.py recalculate_summaries` repairs them
+            summary = StorageSavingsSummary._get_or_create_summary(period_start, period_end)
+            return dict(StorageSavingsSummarySerializer(summary, context={'request': request}).data)
+
+        return self._cached_response(request, f'{period_start}:{period_end}', build)
+
+    def _cached_response(self, request, key, build):
+        """Serve a payload from the summary cache, answering matching If-None-Match with 304"""
+        etag, data = get_cached_summary(key, build)
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(data, headers=headers)
@@ -9,6 +9,22 @@ echo "Running migrations..."
 python manage.py makemigrations
 python manage.py migrate
 
+# Build the shared presence filter of content hashes before the workers start
+if [ "$FILES_PRESENCE_FILTER_ENABLED" = "True" ]; then
+    echo "Building presence filter..."
+    python manage.py rebuild_presence_filter
+fi
+
+# Start the event worker when deduplication bookkeeping is queued
+if [ "$FILES_EVENT_QUEUE_ENABLED" = "True" ]; then
+    echo "Starting event worker..."
+    python manage.py process_events &
+fi
+
 # Start server
 echo "Starting server..."
-gunicorn --bind 0.0.0.0:8000 core.wsgi:application 
\ No newline at end of file
+if [ "$SERVER_MODE" = "asgi" ]; then
+    gunicorn --bind 0.0.0.0:8000 -k uvicorn.workers.UvicornWorker core.asgi:application
+else
+    gunicorn --bind 0.0.0.0:8000 core.wsgi:application
+fi 
\ No newline at end of file
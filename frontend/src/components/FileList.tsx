@@ -1,8 +1,8 @@
-import React, { useCallback } from 'react';
+import React, { useCallback, useMemo } from 'react';
 import { FixedSizeList } from 'react-window';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { fileService } from '../services/fileService';
-import { filterFiles } from '../utils/fileFilters';
+import { filterFiles, toServerFilters } from '../utils/fileFilters';
 import { FileRow } from './FileRow';
 import { FileListLoading, FileListError, FileListEmpty } from './FileListStates';
 
@@ -19,6 +19,8 @@ interface FileListProps {
 const VIRTUAL_LIST_CONFIG = {
   HEIGHT: 600,
   ITEM_SIZE: 120,
+  // Fetch the next page when this many rows remain below the viewport
+  PREFETCH_ROWS: 20,
 } as const;
 
 /**
@@ -33,11 +35,17 @@ export const FileList: React.FC<FileListProps> = ({
 }) => {
   const queryClient = useQueryClient();
 
-  // Fetch files query
-  const { data: files, isLoading, error } = useQuery({
-    queryKey: ['files'],
-    queryFn: fileService.getFiles,
+  const filters = { searchQuery, fileTypeFilter, sizeRangeFilter, uploadDateFilter };
+  const serverFilters = toServerFilters(filters);
+
+  // Fetch files one cursor page at a time, filtered by the API where it can
+  const { data, isLoading, error, fetchNextPage, hasNextPage, isFetchingNextPage } = useInfiniteQuery({
+    queryKey: ['files', serverFilters],
+    queryFn: ({ pageParam }) => fileService.getFiles(pageParam, serverFilters),
+    initialPageParam: null as string | null,
+    getNextPageParam: (lastPage) => lastPage.next,
   });
+  const files = useMemo(() => data?.pages.flatMap((page) => page.results), [data]);
 
   // Delete file mutation
   const deleteMutation = useMutation({
@@ -54,12 +62,7 @@ export const FileList: React.FC<FileListProps> = ({
   });
 
   // Filter files based on all criteria
-  const filteredFiles = filterFiles(files, {
-    searchQuery,
-    fileTypeFilter,
-    sizeRangeFilter,
-    uploadDateFilter,
-  });
+  const filteredFiles = filterFiles(files, filters);
 
   // Event handlers
   const handleDelete = useCallback(
@@ -84,6 +87,19 @@ export const FileList: React.FC<FileListProps> = ({
     [downloadMutation]
   );
 
+  const handleItemsRendered = useCallback(
+    ({ visibleStopIndex }: { visibleStopIndex: number }) => {
+      if (
+        hasNextPage &&
+        !isFetchingNextPage &&
+        visibleStopIndex >= filteredFiles.length - VIRTUAL_LIST_CONFIG.PREFETCH_ROWS
+      ) {
+        fetchNextPage();
+      }
+    },
+    [hasNextPage, isFetchingNextPage, fetchNextPage, filteredFiles.length]
+  );
+
   // Check if any filters are active
   const hasActiveFilters =
     searchQuery !== '' ||
@@ -135,6 +151,7 @@ export const FileList: React.FC<FileListProps> = ({
             itemSize={VIRTUAL_LIST_CONFIG.ITEM_SIZE}
             width="100%"
             className="border border-gray-200 rounded-lg"
+            onItemsRendered={handleItemsRendered}
           >
             {renderFileRow}
           </FixedSizeList>
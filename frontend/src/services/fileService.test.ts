@@ -22,13 +22,31 @@ describe('fileService', () => {
   });
 
   test('getFiles - happy path', async () => {
-    const files = [{ id: '1' }];
-    mockedAxios.get.mockResolvedValueOnce({ data: files });
+    const page = { next: 'http://api/files/?cursor=abc', results: [{ id: '1' }] };
+    mockedAxios.get.mockResolvedValueOnce({ data: page });
 
     const result = await fileService.getFiles();
 
-    expect(mockedAxios.get).toHaveBeenCalledWith(expect.stringContaining('/files/'));
-    expect(result).toEqual(files);
+    expect(mockedAxios.get).toHaveBeenCalledWith(expect.stringContaining('/files/'), { params: {} });
+    expect(result).toEqual(page);
+  });
+
+  test('getFiles - sends filters', async () => {
+    mockedAxios.get.mockResolvedValueOnce({ data: { next: null, results: [] } });
+
+    await fileService.getFiles(null, { search: 'report' });
+
+    expect(mockedAxios.get).toHaveBeenCalledWith(expect.stringContaining('/files/'), {
+      params: { search: 'report' },
+    });
+  });
+
+  test('getFiles - follows the next cursor', async () => {
+    mockedAxios.get.mockResolvedValueOnce({ data: { next: null, results: [] } });
+
+    await fileService.getFiles('http://api/files/?cursor=abc');
+
+    expect(mockedAxios.get).toHaveBeenCalledWith('http://api/files/?cursor=abc');
   });
 
   test('deleteFile - happy path', async () => {
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { File as FileType, StorageSavingsSummary } from '../types/file';
+import { File as FileType, FilePage, StorageSavingsSummary } from '../types/file';
 
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
 
@@ -16,8 +16,12 @@ export const fileService = {
     return response.data;
   },
 
-  async getFiles(): Promise<FileType[]> {
-    const response = await axios.get(`${API_URL}/files/`);
+  // Fetch one page of files, newest first; pass the previous page's `next` URL to continue
+  // (it already carries the filters)
+  async getFiles(nextUrl?: string | null, filters: Record<string, string> = {}): Promise<FilePage> {
+    const response = nextUrl
+      ? await axios.get(nextUrl)
+      : await axios.get(`${API_URL}/files/`, { params: filters });
     return response.data;
   },
 
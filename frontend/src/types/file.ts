@@ -7,6 +7,11 @@ export interface File {
   file: string;
 }
 
+export interface FilePage {
+  next: string | null;
+  results: File[];
+}
+
 export interface StorageSavingsSummary {
   period_start: string;
   period_end: string;
@@ -108,3 +108,39 @@ export const filterFiles = (
     );
   });
 };
+
+/**
+ * Query parameters for the filters the files API can apply itself.
+ * Type families it cannot express ('document', 'other') are left to filterFiles.
+ */
+export const toServerFilters = (filters: {
+  searchQuery: string;
+  fileTypeFilter: string;
+  sizeRangeFilter: string;
+  uploadDateFilter: string;
+}): Record<string, string> => {
+  const params: Record<string, string> = {};
+
+  if (filters.searchQuery) params.search = filters.searchQuery;
+
+  if (filters.fileTypeFilter === 'image') params.file_type = 'image/';
+  if (filters.fileTypeFilter === 'video') params.file_type = 'video/';
+
+  if (filters.sizeRangeFilter === 'small') {
+    params.max_size = String(SIZE_RANGES.SMALL_MAX - 1);
+  } else if (filters.sizeRangeFilter === 'medium') {
+    params.min_size = String(SIZE_RANGES.SMALL_MAX);
+    params.max_size = String(SIZE_RANGES.MEDIUM_MAX);
+  } else if (filters.sizeRangeFilter === 'large') {
+    params.min_size = String(SIZE_RANGES.MEDIUM_MAX + 1);
+  }
+
+  if (filters.uploadDateFilter) {
+    const dayStart = new Date(`${filters.uploadDateFilter}T00:00:00Z`);
+    const nextDay = new Date(dayStart.getTime() + 24 * 60 * 60 * 1000);
+    params.uploaded_after = dayStart.toISOString();
+    params.uploaded_before = nextDay.toISOString();
+  }
+
+  return params;
+};